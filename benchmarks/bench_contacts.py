@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+بنچمارک جستجوی مخاطب: ایندکس فازی سه‌حرفی در برابر کوئری LIKE قبلی
+
+- تاخیر p50/p99 هر دو روش روی مخاطبین تصادفی
+- درصد پیدا شدن نام‌هایی که موتور گفتار با ي/ك یا بدون نیم‌فاصله برمی‌گرداند
+- نام با یک حرف جا افتاده و فقط نام کوچک (پرتکرارترین حالت، از کش کوتاه‌ترین نام‌های هر کلمه)
+
+استفاده:
+    python benchmarks/bench_contacts.py [--contacts 50000] [--queries 2000]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from persian_assistant_complete import ContactIndex, Database
+
+FIRST = ['علی', 'رضا', 'محمد', 'مهدی', 'حسین', 'سارا', 'مریم', 'زهرا', 'فاطمه', 'نگار',
+         'کیوان', 'یاسمن', 'پریسا', 'کامران', 'بیژن', 'شیرین', 'آرش', 'نیما', 'یگانه', 'کوثر',
+         'امیر', 'حمید', 'سعید', 'مجید', 'الهام', 'نازنین', 'کیمیا', 'پویا', 'سینا', 'بهاره',
+         'محمدرضا', 'علیرضا', 'امیرحسین', 'فرزانه', 'ترانه', 'شهرام', 'بهروز', 'ژاله', 'لیلا', 'یوسف']
+# نام خانوادگی از ترکیب ریشه و پسوند ساخته می‌شود تا تنوع دفترچه واقعی را داشته باشد
+ROOTS = ['احمد', 'کریم', 'رض', 'موسو', 'حسین', 'یزدان', 'کاظم', 'نیک‌نام', 'صادق', 'تهران',
+         'شکیب', 'کیان', 'میرزا', 'یوسف', 'ملک', 'عبداله', 'پاک‌نژاد', 'قاسم', 'اکبر', 'جعفر',
+         'رحیم', 'نور', 'فرهاد', 'بهرام', 'شیراز', 'اصفهان', 'کرمان', 'زند', 'گیلان', 'مازندران',
+         'خسرو', 'سهراب', 'کاو', 'بابای', 'طاهر', 'منصور', 'نصیر', 'فتح', 'امین', 'سلطان']
+SUFFIXES = ['ی', 'یان', 'ی‌پور', 'ی‌زاده', 'ی‌نیا', 'ی‌فر', 'لو', 'ی‌راد', 'ی‌مقدم', 'ی‌نژاد']
+PREFIXES = ['', '', '', 'میر', 'حاج', 'شاه', 'سید']
+
+
+def make_name(rnd):
+    """نام و نام خانوادگی تصادفی"""
+    last = rnd.choice(PREFIXES) + rnd.choice(ROOTS) + rnd.choice(SUFFIXES)
+    return f'{rnd.choice(FIRST)} {last}'
+
+
+def asr_variant(name):
+    """املای محتمل خروجی موتور گفتار: حروف عربی و حذف نیم‌فاصله"""
+    return name.replace('ی', 'ي').replace('ک', 'ك').replace('‌', '')
+
+
+def typo_variant(rnd, name):
+    """حذف یک حرف تصادفی (خطای تشخیص)"""
+    i = rnd.choice([i for i, ch in enumerate(name) if ch != ' '])
+    return name[:i] + name[i + 1:]
+
+
+def legacy_lookup(db, name):
+    """پیاده‌سازی قبلی execute_call"""
+    return db.query_one("SELECT phone FROM contacts WHERE name LIKE ?", (f'%{name}%',))
+
+
+def percentiles(latencies):
+    latencies.sort()
+    return (1000 * latencies[len(latencies) // 2],
+            1000 * latencies[int(len(latencies) * 0.99)])
+
+
+def measure(func, queries):
+    latencies, found = [], 0
+    for query in queries:
+        t0 = time.perf_counter()
+        found += bool(func(query))
+        latencies.append(time.perf_counter() - t0)
+    return percentiles(latencies), found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--contacts', type=int, default=50000)
+    parser.add_argument('--queries', type=int, default=2000)
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    db = Database(os.path.join(tmp.name, 'assistant.db'))
+    db.init_tables()
+
+    rnd = random.Random(3)
+    names = [make_name(rnd) for _ in range(args.contacts)]
+    db.executemany("INSERT INTO contacts (name, phone, category) VALUES (?, ?, ?)",
+                   [(name, f'0912{i:07d}', 'friend') for i, name in enumerate(names)])
+
+    index = ContactIndex(db)
+    t0 = time.perf_counter()
+    index.load()
+    print(f"ساخت ایندکس برای {args.contacts} مخاطب: {time.perf_counter() - t0:.2f} ثانیه "
+          f"({len(index.postings)} سه‌حرفی)")
+
+    # راه‌اندازی منتظر ساخت نمی‌ماند و جستجوی زودهنگام منتظر همان ساخت می‌ماند
+    fresh = ContactIndex(db)
+    t0 = time.perf_counter()
+    fresh.load_async()
+    started_ms = 1000 * (time.perf_counter() - t0)
+    early = fresh.search(names[0], k=1)
+    print(f"برگشت load_async: {started_ms:.2f}ms  جستجوی پیش از پایان ساخت: {early[0][2] if early else None}")
+    ok = started_ms < 50 and bool(early) and early[0][2] == names[0]
+    fresh.load_thread.join()
+
+    exact = rnd.sample(names, min(args.queries, len(names)))
+    spoken = [asr_variant(name) for name in exact]
+    scenarios = (
+        ('املای دقیق', exact, exact),
+        ('املای موتور گفتار', spoken, exact),
+        ('یک حرف جا افتاده', [typo_variant(rnd, name) for name in exact], exact),
+        ('فقط نام کوچک', [name.split()[0] for name in exact], exact),
+    )
+
+    for label, queries, targets in scenarios:
+        (old_p50, old_p99), old_found = measure(lambda q: legacy_lookup(db, q), queries)
+        (new_p50, new_p99), new_found = measure(lambda q: index.search(q, k=5), queries)
+        in_top = sum(any(r[2] == target for r in index.search(query, k=5))
+                     for query, target in zip(queries, targets))
+        print(f"[{label}]")
+        print(f"  LIKE : p50={old_p50:.3f}ms p99={old_p99:.3f}ms  پیدا شده={old_found}/{len(queries)}")
+        print(f"  index: p50={new_p50:.3f}ms p99={new_p99:.3f}ms  پیدا شده={new_found}/{len(queries)}  "
+              f"مخاطب درست در ۵ نتیجه اول={in_top}")
+        ok = ok and new_found == len(queries) and new_p99 < 1
+
+    # بهترین نتیجه باید هم‌نام خود مخاطب باشد
+    top_hits = sum(index.search(query, k=1)[0][2] == name for name, query in zip(exact, spoken))
+    print(f"رتبه اول درست: {top_hits}/{len(exact)}  "
+          f"(نام‌های یکتا: {len(index.names)} از {args.contacts})")
+    ok = ok and top_hits == len(exact)
+
+    # به‌روزرسانی افزایشی
+    t0 = time.perf_counter()
+    contact_id = index.add_contact('بهنام نیک‌پور', '09350000000')
+    index.update_contact(contact_id, 'بهنام نیک‌پور', '09350000001')
+    hit = index.search('بهنام نيكپور', k=1)
+    index.remove_contact(contact_id)
+    print(f"افزودن/ویرایش/جستجو/حذف افزایشی: {1000 * (time.perf_counter() - t0):.2f}ms "
+          f"نتیجه={hit[0][2:] if hit else None}")
+    ok = ok and bool(hit) and hit[0][3] == '09350000001'
+
+    db.close()
+    tmp.cleanup()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
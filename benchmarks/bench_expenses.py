@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+بنچمارک گزارش هزینه‌ها: جدول‌های تجمیعی در برابر جمع زدن همه ردیف‌ها
+
+یک دفتر هزینه ساختگی (چند دسته با توزیع لاگ‌نرمال مبلغ در دو سال اخیر) ساخته
+می‌شود و در چند اندازه، زمان گزارش «این ماه برای خوراک» و «امروز» با هر دو
+روش اندازه‌گیری و برابری نتیجه‌ها بررسی می‌شود. پیش از آن مبلغ چند جمله
+نمونه (با جداکننده‌های فارسی و عددهای حروفی) با parse_persian_amount خوانده می‌شود.
+
+استفاده:
+    python benchmarks/bench_expenses.py [--rows 1000000] [--db ledger.db]
+"""
+
+import os
+import sys
+import math
+import time
+import random
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from persian_assistant_complete import Database, ExpenseTracker, parse_persian_amount
+
+# دسته: (وزن، میانه مبلغ به تومان، توضیح‌ها)
+LEDGER_PROFILE = {
+    'food': (0.45, 80000, ['ناهار', 'نان', 'میوه', 'سوپرمارکت', 'قهوه']),
+    'transport': (0.2, 60000, ['تاکسی', 'بنزین', 'مترو']),
+    'bills': (0.08, 400000, ['قبض برق', 'قبض گاز', 'اینترنت', 'شارژ موبایل']),
+    'health': (0.05, 250000, ['دارو', 'دکتر']),
+    'shopping': (0.12, 600000, ['لباس', 'کفش', 'هدیه']),
+    'fun': (0.07, 200000, ['سینما', 'کتاب', 'کافه']),
+    'other': (0.03, 100000, ['متفرقه']),
+}
+
+# جمله: مبلغ مورد انتظار به تومان
+AMOUNT_CASES = {
+    'ثبت هزینه ۱۲۰،۰۰۰ تومان نان': 120000.0,
+    'ثبت هزینه ۱۲۰٬۰۰۰ تومان نان': 120000.0,
+    'ثبت هزینه 120,000 تومان نان': 120000.0,
+    'دو میلیون و پانصد هزار تومان اجاره': 2500000.0,
+    'سه صد هزار ریال تاکسی': 30000.0,
+    '۴۵٫۵ هزار تومان، قهوه': 45500.0,
+}
+
+
+def generate_ledger(rnd, count, end=None, days=730):
+    """تولید ردیف‌های (مبلغ، توضیح، دسته، زمان) برای دفتر هزینه ساختگی"""
+    end = end or datetime.now()
+    categories = list(LEDGER_PROFILE)
+    weights = [LEDGER_PROFILE[c][0] for c in categories]
+    for _ in range(count):
+        category = rnd.choices(categories, weights)[0]
+        weight, median, descriptions = LEDGER_PROFILE[category]
+        amount = round(rnd.lognormvariate(math.log(median), 0.6), -3)
+        when = end - timedelta(seconds=rnd.randint(0, days * 86400))
+        yield amount, rnd.choice(descriptions), category, when
+
+
+def aggregate(db, start, end, category=None):
+    """روش بدون جدول تجمیعی: جمع زدن ردیف‌های خام"""
+    sql = "SELECT COALESCE(SUM(amount), 0), COUNT(*) FROM expenses WHERE created_at >= ? AND created_at < ?"
+    params = [start, end]
+    if category:
+        sql += " AND category = ?"
+        params.append(category)
+    return db.query_one(sql, params)
+
+
+def timed(func, repeat=20):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return 1000 * (time.perf_counter() - t0) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--db', help='مسیر ذخیره دفتر ساخته شده (پیش‌فرض: پوشه موقت)')
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    db = Database(args.db or os.path.join(tmp.name, 'ledger.db'))
+    db.init_tables()
+    tracker = ExpenseTracker(db)
+
+    now = datetime.now()
+    today = now.date()
+    month_start = datetime(today.year, today.month, 1)
+    day_start = datetime(today.year, today.month, today.day)
+    label, days, months = tracker.period('این ماه', today)
+
+    ok = True
+    for text, expected in AMOUNT_CASES.items():
+        amount = parse_persian_amount(text)[0]
+        if not isinstance(amount, float) or amount != expected:
+            print(f"❌ مبلغ «{text}»: {amount!r} به جای {expected!r}")
+            ok = False
+
+    rnd = random.Random(11)
+    ledger = generate_ledger(rnd, args.rows, end=now)
+    checkpoints = [n for n in (10000, 100000, 1000000, 10000000) if n < args.rows] + [args.rows]
+    inserted = 0
+    insert_time = 0.0
+    for checkpoint in checkpoints:
+        while inserted < checkpoint:
+            batch = [next(ledger) for _ in range(min(10000, checkpoint - inserted))]
+            t0 = time.perf_counter()
+            db.executemany(
+                "INSERT INTO expenses (amount, description, category, created_at) VALUES (?, ?, ?, ?)",
+                batch
+            )
+            insert_time += time.perf_counter() - t0
+            inserted += len(batch)
+
+        print(f"[{inserted} ردیف] درج با تریگر: {inserted / insert_time:.0f} ردیف در ثانیه")
+        for name, rollup, raw in (
+            ('این ماه / خوراک', lambda: tracker.total(months=months, category='food'),
+             lambda: aggregate(db, month_start, now + timedelta(seconds=1), 'food')),
+            ('امروز', lambda: tracker.total(days=[today.isoformat()]),
+             lambda: aggregate(db, day_start, now + timedelta(seconds=1))),
+        ):
+            rollup_ms, rollup_result = timed(rollup)
+            raw_ms, raw_result = timed(raw, repeat=3)
+            same = abs(rollup_result[0] - raw_result[0]) < 1e-6 * max(1, raw_result[0]) and \
+                rollup_result[1] == raw_result[1]
+            ok = ok and same
+            print(f"  {name}: تجمیعی={rollup_ms:.3f}ms  جمع ردیف‌ها={raw_ms:.1f}ms  "
+                  f"{'برابر' if same else 'نابرابر!'} ({rollup_result[1]} مورد)")
+
+    db.close()
+    tmp.cleanup()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+بنچمارک تشخیص hedged در برابر حالت auto (اول آنلاین، بعد آفلاین)
+
+یک سرور HTTP محلی نقش سرویس آنلاین ناپایدار را بازی می‌کند و یک موتور آفلاین
+ساختگی با تاخیر ثابت جای مدل واقعی را می‌گیرد؛ نیازی به شبکه یا مدل نیست.
+
+استفاده:
+    python benchmarks/bench_hedged.py [--requests 200] [--slow-rate 0.15] [--fail-rate 0.05]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from persian_assistant_complete import ASR_BACKENDS, DEFAULT_CONFIG, RecognizerBackend, SpeechRecognizer
+
+
+class FlakyASRHandler(BaseHTTPRequestHandler):
+    """سرویس آنلاین ساختگی: معمولا سریع، گاهی کند، گاهی خطا"""
+
+    rnd = random.Random(1)
+    slow_rate = 0.15
+    fail_rate = 0.05
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        roll = self.rnd.random()
+        if roll < self.fail_rate:
+            self.send_response(503)
+            self.end_headers()
+            return
+        time.sleep(self.rnd.uniform(2.0, 6.0) if roll < self.fail_rate + self.slow_rate
+                   else self.rnd.lognormvariate(-1.4, 0.4))
+        body = json.dumps({'text': 'با علی تماس بگیر', 'confidence': 0.92}).encode('utf-8')
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+class FixtureBackend(RecognizerBackend):
+    """موتور آفلاین ساختگی با تاخیر و اطمینان ثابت"""
+
+    name = 'fixture'
+    latency = 0.45
+    confidence = 0.7
+
+    def recognize(self, audio):
+        return self.recognize_scored(audio)[0]
+
+    def recognize_scored(self, audio):
+        time.sleep(self.latency)
+        return 'با علی تماس بگیر', self.confidence
+
+
+def run(mode, url, count):
+    config = dict(DEFAULT_CONFIG, asr_mode=mode, asr_online='http', asr_offline='fixture', asr_http_url=url)
+    recognizer = SpeechRecognizer(config)
+    recognizer.offline.loaded.wait()
+    samples = np.zeros(16000, dtype=np.int16)
+
+    latencies = []
+    for _ in range(count):
+        t0 = time.perf_counter()
+        recognizer.recognize_buffer(samples, 16000)
+        latencies.append(time.perf_counter() - t0)
+    latencies.sort()
+    pct = lambda q: 1000 * latencies[min(len(latencies) - 1, int(len(latencies) * q))]
+    print(f"[{mode}] p50={pct(0.5):.0f}ms p95={pct(0.95):.0f}ms p99={pct(0.99):.0f}ms")
+    for name, data in recognizer.stats().items():
+        if data['attempts']:
+            print(f"    {name}: attempts={data['attempts']} win_rate={data['win_rate']:.2f} "
+                  f"p50={1000 * (data['latency_p50'] or 0):.0f}ms")
+    # درخواست آنلاین بازنده رها می‌شود و تا timeout خودش یک worker مشترک را نگه می‌دارد
+    jobs = recognizer.jobs.stats()
+    if jobs['processed']:
+        print(f"    asr-jobs: workers={jobs['workers']} busy={jobs['busy']} rejected={jobs['rejected']} "
+              f"wait_p99={jobs['wait_ms']['p99']}ms")
+    recognizer.jobs.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--slow-rate', type=float, default=0.15)
+    parser.add_argument('--fail-rate', type=float, default=0.05)
+    args = parser.parse_args()
+
+    FlakyASRHandler.slow_rate = args.slow_rate
+    FlakyASRHandler.fail_rate = args.fail_rate
+    ASR_BACKENDS['fixture'] = FixtureBackend
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FlakyASRHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_address[1]}/recognize'
+
+    for mode in ('auto', 'hedged'):
+        run(mode, url, args.requests)
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+بنچمارک تشخیص فرمان: مقایسه IntentMatcher با پیاده‌سازی قبلی (حلقه re.search)
+"""
+
+import os
+import sys
+import re
+import time
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from persian_assistant_complete import CommandProcessor, Database
+
+NAMES = ['علی', 'رضا', 'مامان', 'بابا', 'سارا', 'محمد', 'شرکت', 'دکتر احمدی']
+APPS = ['اینستاگرام', 'واتساپ', 'تلگرام', 'یوتیوب', 'نقشه', 'دوربین', 'گالری']
+ARTISTS = ['شادمهر', 'بنیامین', 'محسن', 'همایون', 'ابی']
+PLACES = ['آزادی', 'تجریش', 'ونک', 'کارخانه', 'فرودگاه', 'دانشگاه']
+TEXTS = ['قبض برق', 'خرید نان', 'جلسه با مدیر', 'دارو بخور', 'ورزش صبحگاهی']
+
+TEMPLATES = [
+    'با {name} تماس بگیر', 'زنگ بزن به {name}', 'تماس با {name}',
+    '{app} رو باز کن', 'برنامه {app} رو اجرا کن', 'اجرای {app}',
+    'آهنگ {artist} رو پخش کن', 'موزیک {artist}', 'یه آهنگ از {artist}', 'موسیقی پخش کن',
+    'یادآوری کن {text}', 'یادت باشه {text}', 'فردا {text}', 'ساعت {hour} {text}',
+    'هوا چطوره', 'هوای امروز چطوره', 'دما چند درجه است',
+    'راه {place}', 'مسیر به {place}', 'چطور برم {place}',
+    'یادداشت کن {text}', 'بنویس {text}', 'ذخیره کن {text}',
+    'ساکت شو', 'خاموش شو', 'سکوت', 'برو بخواب',
+    # فرمان‌های نامشخص (بدترین حالت برای حلقه قبلی)
+    'امروز چند شنبه است', 'یک جوک برام تعریف کن', 'قیمت دلار چنده',
+    'اسم تو چیه', 'حالت چطوره دوست من', 'این جمله هیچ فرمانی ندارد {text}',
+]
+
+# ترتیب اولویت فرمان‌های اصلی؛ فرمان‌های اضافه‌شده بعدی فقط بعد از این‌ها می‌آیند
+BASELINE_ORDER = ['call', 'app', 'music', 'reminder', 'weather', 'navigation', 'note', 'control']
+# جمله‌هایی که کلیدواژه فرمان‌های جدیدتر را هم دارند ولی باید مثل قبل تشخیص داده شوند
+PRIORITY_CASES = [
+    ('یادداشت کن چقدر خرج کردم', 'note'),
+    ('بنویس ثبت هزینه قبض برق', 'note'),
+    ('یادآوری کن جمع هزینه‌ها رو حساب کنم', 'reminder'),
+    ('با علی تماس بگیر که بگه چقدر خرج کردم', 'call'),
+    ('فردا جستجو در یادداشت‌ها رو یادم بنداز', 'reminder'),
+    ('ذخیره کن دیروز ۵۰ هزار تومان خرج کردم', 'note'),
+    ('ثبت هزینه ۱۲۰،۰۰۰ تومان نان', 'expense'),
+    ('نان ۵۰ هزار تومان خرج کردم', 'expense'),
+    ('این ماه چقدر خرج کردم', 'expense_report'),
+]
+
+
+def check_priority(processor):
+    """بررسی اینکه فرمان‌های جدید ترتیب اولویت فرمان‌های اصلی را به هم نزده‌اند"""
+    order = list(CommandProcessor.COMMAND_PATTERNS)
+    errors = []
+    if order[:len(BASELINE_ORDER)] != BASELINE_ORDER:
+        errors.append(f"ترتیب فرمان‌ها: {order}")
+    for text, expected in PRIORITY_CASES:
+        cmd_type = processor.identify_command(text)[0]
+        if cmd_type != expected:
+            errors.append(f"«{text}»: {cmd_type} به جای {expected}")
+    return errors
+
+
+def build_corpus(size=5000, seed=42):
+    """ساخت مجموعه جملات فارسی تصادفی"""
+    rnd = random.Random(seed)
+    corpus = []
+    for _ in range(size):
+        template = rnd.choice(TEMPLATES)
+        corpus.append(template.format(
+            name=rnd.choice(NAMES),
+            app=rnd.choice(APPS),
+            artist=rnd.choice(ARTISTS),
+            place=rnd.choice(PLACES),
+            text=rnd.choice(TEXTS),
+            hour=rnd.randint(1, 12)
+        ))
+    return corpus
+
+
+def legacy_identify_command(text):
+    """پیاده‌سازی قبلی: ساخت الگوها و re.search پشت سر هم در هر فراخوانی"""
+    patterns = {k: list(v) for k, v in CommandProcessor.COMMAND_PATTERNS.items()}
+    for cmd_type, cmd_patterns in patterns.items():
+        for pattern in cmd_patterns:
+            match = re.search(pattern, text)
+            if match:
+                return cmd_type, match.groups()
+    return 'unknown', ()
+
+
+def measure(func, corpus, rounds=3):
+    """اندازه‌گیری تعداد تطبیق در ثانیه و تاخیر p50/p99"""
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for text in corpus:
+            t0 = time.perf_counter_ns()
+            func(text)
+            latencies.append(time.perf_counter_ns() - t0)
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        'matches_per_sec': len(latencies) / elapsed,
+        'p50_us': latencies[len(latencies) // 2] / 1000,
+        'p99_us': latencies[int(len(latencies) * 0.99)] / 1000,
+    }
+
+
+def main():
+    corpus = build_corpus(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
+    processor = CommandProcessor(Database(':memory:'))
+
+    errors = check_priority(processor)
+    for error in errors:
+        print(f"❌ اولویت فرمان: {error}")
+    if errors:
+        sys.exit(1)
+
+    # اطمینان از یکسان بودن نتایج و ترتیب اولویت
+    mismatches = [t for t in corpus if processor.identify_command(t) != legacy_identify_command(t)]
+    if mismatches:
+        print(f"❌ {len(mismatches)} نتیجه متفاوت، مثلا: {mismatches[0]}")
+        sys.exit(1)
+
+    unknown = [t for t in corpus if legacy_identify_command(t)[0] == 'unknown']
+    print(f"مجموعه: {len(corpus)} جمله ({len(unknown)} نامشخص)\n")
+
+    for label, texts in (('همه', corpus), ('نامشخص', unknown)):
+        old = measure(legacy_identify_command, texts)
+        new = measure(processor.identify_command, texts)
+        print(f"[{label}]")
+        print(f"  legacy : {old['matches_per_sec']:>10.0f}/s  p50={old['p50_us']:.1f}us  p99={old['p99_us']:.1f}us")
+        print(f"  matcher: {new['matches_per_sec']:>10.0f}/s  p50={new['p50_us']:.1f}us  p99={new['p99_us']:.1f}us")
+        print(f"  speedup: {new['matches_per_sec'] / old['matches_per_sec']:.1f}x\n")
+
+
+if __name__ == '__main__':
+    main()
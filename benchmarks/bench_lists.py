@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+بنچمارک فهرست‌های یادداشت و مخاطب: صفحه‌بندی keyset در برابر ساخت یک رشته از کل جدول
+
+- زمان و حافظه باز کردن فهرست (روش قبلی: همه سطرها در یک رشته برای یک Label)
+- زمان صفحه اول و یک صفحه در عمق جدول با keyset در برابر OFFSET
+- به‌روزرسانی درجا با تغییرهایی که Database.watch می‌دهد (watch بدون انتظار برای
+  نویسنده، و شنونده‌ای که خودش می‌نویسد قفل نمی‌کند)
+- برابری ترتیب پیمایش کامل صفحه‌ها با ORDER BY روی کل جدول
+
+استفاده:
+    python benchmarks/bench_lists.py [--rows 100000] [--page-size 50]
+"""
+
+import os
+import sys
+import time
+import queue
+import random
+import argparse
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from persian_assistant_complete import Database, KeysetPager
+from bench_contacts import make_name
+from bench_notes_search import make_note
+
+LISTS = {
+    'contacts': (('id', 'name', 'phone', 'category'), ('name', 'id'), False),
+    'notes': (('id', 'content', 'created_at'), ('created_at', 'id'), True),
+}
+
+
+def legacy_contacts(db):
+    """پیاده‌سازی قبلی show_contacts (بدون ساخت Label)"""
+    content_text = "مخاطبین:\n\n"
+    for name, phone, category in db.query("SELECT name, phone, category FROM contacts ORDER BY name"):
+        content_text += f"• {name}: {phone}\n  ({category})\n\n"
+    return content_text
+
+
+def timed_memory(func):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    result = func()
+    elapsed = 1000 * (time.perf_counter() - t0)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / 1024, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--page-size', type=int, default=50)
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    db = Database(os.path.join(tmp.name, 'assistant.db'))
+    db.init_tables()
+
+    rnd = random.Random(9)
+    start = datetime(2023, 1, 1)
+    db.executemany("INSERT INTO contacts (name, phone, category) VALUES (?, ?, ?)",
+                   [(make_name(rnd), f'0912{i:07d}', 'friend') for i in range(args.rows)])
+    db.executemany("INSERT INTO notes (content, created_at) VALUES (?, ?)",
+                   [(make_note(rnd), (start + timedelta(minutes=rnd.randint(0, 10 ** 6))).isoformat(' '))
+                    for _ in range(args.rows)])
+
+    ok = True
+    ms, kb, text = timed_memory(lambda: legacy_contacts(db))
+    print(f"روش قبلی (مخاطبین): {ms:.1f}ms  اوج حافظه={kb:.0f}KB  رشته={len(text)} نویسه")
+
+    for table, (columns, order, descending) in LISTS.items():
+        def first_page():
+            pager = KeysetPager(db, table, columns, order, descending=descending, page_size=args.page_size)
+            pager.load_more()
+            return pager
+        ms, kb, pager = timed_memory(first_page)
+        print(f"[{table}] صفحه اول: {ms:.2f}ms  اوج حافظه={kb:.0f}KB")
+
+        # صفحه‌ای در میانه جدول: keyset از آخرین کلید، OFFSET از شماره سطر
+        middle = args.rows // 2
+        key = db.query_one(f"SELECT {', '.join(order)} FROM {table} ORDER BY "
+                           + ', '.join(f"{c} {'DESC' if descending else 'ASC'}" for c in order)
+                           + " LIMIT 1 OFFSET ?", (middle,))
+        pager.keys = [tuple(key)]
+        t0 = time.perf_counter()
+        keyset_rows = pager.fetch(args.page_size)
+        keyset_ms = 1000 * (time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        offset_rows = db.query(pager.select + pager.order_by + " OFFSET ?", (args.page_size, middle + 1))
+        offset_ms = 1000 * (time.perf_counter() - t0)
+        same = keyset_rows == offset_rows
+        ok = ok and same
+        print(f"  صفحه میانی: keyset={keyset_ms:.2f}ms  OFFSET={offset_ms:.2f}ms  {'برابر' if same else 'نابرابر!'}")
+
+        # پیمایش کامل
+        pager = KeysetPager(db, table, columns, order, descending=descending, page_size=args.page_size)
+        t0 = time.perf_counter()
+        while pager.load_more():
+            pass
+        walk_ms = 1000 * (time.perf_counter() - t0)
+        full = [row[0] for row in db.query(pager.select + pager.order_by, (-1,))]
+        same = [item['id'] for item in pager.items] == full
+        ok = ok and same
+        print(f"  پیمایش همه {len(pager.items)} سطر: {walk_ms:.0f}ms  ترتیب {'درست' if same else 'نادرست!'}")
+
+        # به‌روزرسانی درجا روی دو صفحه بارگذاری شده
+        pager = KeysetPager(db, table, columns, order, descending=descending, page_size=args.page_size)
+        pager.load_more()
+        pager.load_more()
+        applied = queue.Queue()
+
+        def on_changes(changes):
+            pager.apply_changes(changes)
+            applied.put(changes)
+
+        def write_back(changes):
+            # شنونده‌ها در thread نویسنده اجرا نمی‌شوند، پس نوشتن با انتظار قفل نمی‌کند
+            db.execute("INSERT INTO command_logs (command_text) VALUES (?)", (f'{table}: {len(changes)}',))
+
+        logs_before = db.query_one("SELECT COUNT(*) FROM command_logs")[0]
+        t0 = time.perf_counter()
+        db.watch(table, on_changes)
+        db.watch(table, write_back)
+        watch_ms = 1000 * (time.perf_counter() - t0)
+        row_id = pager.items[3]['id']
+        t0 = time.perf_counter()
+        db.execute(f"UPDATE {table} SET {columns[2]} = ? WHERE id = ?", ('تغییر کرد', row_id))
+        applied.get(timeout=5)
+        update_ms = 1000 * (time.perf_counter() - t0)
+        changed = any(item['id'] == row_id and item[columns[2]] == 'تغییر کرد' for item in pager.items)
+        db.execute(f"DELETE FROM {table} WHERE id = ?", (row_id,))
+        applied.get(timeout=5)
+        removed = all(item['id'] != row_id for item in pager.items)
+        deadline = time.monotonic() + 5
+        while db.query_one("SELECT COUNT(*) FROM command_logs")[0] < logs_before + 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        written = db.query_one("SELECT COUNT(*) FROM command_logs")[0] - logs_before
+        db.unwatch(table, on_changes)
+        db.unwatch(table, write_back)
+        ok = ok and changed and removed and written == 2 and watch_ms < 5
+        print(f"  watch: {watch_ms:.3f}ms  تغییر یک سطر تا نمایش: {update_ms:.2f}ms  به‌روز={changed} "
+              f"حذف={removed} نوشتن از شنونده={written}")
+
+    db.close()
+    tmp.cleanup()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
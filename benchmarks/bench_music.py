@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+بنچمارک کتابخانه موسیقی: پیمایش افزایشی و جستجوی فازی خواننده و آهنگ
+
+یک پوشه music ساختگی (فایل‌های کوچک mp3 با برچسب ID3، بخشی بدون برچسب با
+نام «خواننده - آهنگ» یا پوشه خواننده) ساخته می‌شود و زمان پیمایش کامل،
+پیمایش بدون تغییر، پیمایش پس از تغییر چند فایل، زمان برگشت scan_async و
+تاخیر و دقت جستجو با نام‌های دقیق و املای خروجی موتور گفتار اندازه‌گیری می‌شود.
+
+استفاده:
+    python benchmarks/bench_music.py [--tracks 50000] [--queries 2000]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from persian_assistant_complete import CommandProcessor, Database, MusicLibrary
+from bench_contacts import asr_variant, make_name, percentiles, typo_variant
+from bench_notes_search import WORDS
+
+
+def id3_file(title, artist, album):
+    """فایل mp3 کوچک با برچسب ID3v2.3 (متن UTF-8) و یک فریم صوتی خالی"""
+    frames = b''
+    for frame_id, text in (('TIT2', title), ('TPE1', artist), ('TALB', album)):
+        body = b'\x03' + text.encode('utf-8')
+        frames += frame_id.encode() + len(body).to_bytes(4, 'big') + b'\x00\x00' + body
+    size = bytes((len(frames) >> shift) & 0x7f for shift in (21, 14, 7, 0))
+    return b'ID3\x03\x00\x00' + size + frames + b'\xff\xfb\x90\x00' + bytes(413)
+
+
+def make_library(root, rnd, count):
+    """ساخت پوشه ساختگی؛ خروجی: لیست (مسیر نسبی، عنوان، خواننده)"""
+    artists = sorted({make_name(rnd) for _ in range(max(10, count // 20))})
+    tracks, titles = [], set()
+    for i in range(count):
+        artist = rnd.choice(artists)
+        # یک کلمه رایج و یک کلمه کمیاب، مثل بیشتر نام‌های واقعی آهنگ
+        title = f'{rnd.choice(WORDS)} {make_name(rnd).split()[-1]}'
+        while title in titles:
+            title = f'{rnd.choice(WORDS)} {make_name(rnd).split()[-1]}'
+        titles.add(title)
+        folder = os.path.join(root, artist)
+        os.makedirs(folder, exist_ok=True)
+        kind = i % 10
+        if kind < 8:
+            relative = os.path.join(artist, f'{i:06d}.mp3')
+            data = id3_file(title, artist, 'آلبوم ' + artist)
+        elif kind == 8:
+            relative = os.path.join(artist, f'{title}.ogg')
+            data = b'OggS' + bytes(60)
+        else:
+            relative = f'{artist} - {title}.mp3'
+            data = b'\xff\xfb\x90\x00' + bytes(200)
+        with open(os.path.join(root, relative), 'wb') as f:
+            f.write(data)
+        tracks.append((relative, title, artist))
+    return tracks
+
+
+def timed_scan(library):
+    t0 = time.perf_counter()
+    stats = library.scan()
+    return time.perf_counter() - t0, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tracks', type=int, default=50000)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--changes', type=int, default=100)
+    args = parser.parse_args()
+
+    rnd = random.Random(17)
+    tmp = tempfile.TemporaryDirectory()
+    root = os.path.join(tmp.name, 'music')
+    t0 = time.perf_counter()
+    tracks = make_library(root, rnd, args.tracks)
+    print(f"ساخت {len(tracks)} فایل: {time.perf_counter() - t0:.1f}s")
+
+    db = Database(os.path.join(tmp.name, 'assistant.db'))
+    db.init_tables()
+    library = MusicLibrary(db, root)
+    ok = True
+
+    seconds, stats = timed_scan(library)
+    print(f"پیمایش کامل: {seconds:.2f}s  {stats}")
+    ok = ok and stats['added'] == len(tracks)
+    tagged = dict(db.query("SELECT path, artist || '/' || title FROM tracks"))
+    wrong = sum(tagged.get(relative) != f'{artist}/{title}' for relative, title, artist in tracks)
+    print(f"برچسب یا نام فایل اشتباه خوانده شده: {wrong}")
+    ok = ok and wrong == 0
+
+    seconds, stats = timed_scan(library)
+    print(f"پیمایش بدون تغییر: {seconds:.2f}s  {stats}")
+    ok = ok and stats['added'] == stats['updated'] == stats['removed'] == 0
+
+    changed = rnd.sample(tracks, args.changes)
+    for relative, title, artist in changed[:args.changes // 2]:
+        path = os.path.join(root, relative)
+        st = os.stat(path)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    for relative, title, artist in changed[args.changes // 2:]:
+        os.remove(os.path.join(root, relative))
+    seconds, stats = timed_scan(library)
+    print(f"پیمایش پس از تغییر {args.changes // 2} و حذف {args.changes - args.changes // 2} فایل: "
+          f"{seconds:.2f}s  {stats}")
+    ok = ok and stats['updated'] == args.changes // 2 and stats['removed'] == args.changes - args.changes // 2
+    removed = {relative for relative, title, artist in changed[args.changes // 2:]}
+    tracks = [track for track in tracks if track[0] not in removed]
+
+    # راه‌اندازی منتظر پیمایش نمی‌ماند
+    fresh = MusicLibrary(db, root)
+    t0 = time.perf_counter()
+    fresh.scan_async()
+    started_ms = 1000 * (time.perf_counter() - t0)
+    fresh.scan_thread.join()
+    print(f"برگشت scan_async: {started_ms:.2f}ms")
+    ok = ok and started_ms < 50
+
+    # جستجو: نام دقیق، املای موتور گفتار و یک حرف جا افتاده
+    t0 = time.perf_counter()
+    library.load()
+    print(f"ساخت ایندکس فازی: {1000 * (time.perf_counter() - t0):.0f}ms  "
+          f"خواننده‌ها={len(library.keys['artist'])} آهنگ‌ها={len(library.keys['title'])}")
+    samples = rnd.sample(tracks, min(args.queries, len(tracks)))
+    for name, variant in (('دقیق', lambda s: s), ('املای موتور گفتار', asr_variant),
+                          ('یک حرف کم', lambda s: typo_variant(rnd, s))):
+        for kind, field in (('خواننده', 2), ('آهنگ', 1)):
+            latencies, found = [], 0
+            for track in samples:
+                t0 = time.perf_counter()
+                rows = library.find(variant(track[field]))
+                latencies.append(time.perf_counter() - t0)
+                found += any(row[3 if field == 2 else 2] == track[field] for row in rows)
+            p50, p99 = percentiles(latencies)
+            accuracy = found / len(samples)
+            print(f"  {kind} / {name}: p50={p50:.2f}ms p99={p99:.2f}ms  پیدا شد={100 * accuracy:.1f}%")
+            ok = ok and p99 < 50 and (accuracy == 1 if name != 'یک حرف کم' else accuracy > 0.8)
+
+    processor = CommandProcessor(db, music_library=library)
+    artist = samples[0][2]
+    for text in (f'یه آهنگ از {artist} پخش کن', f'آهنگ {samples[1][1]} رو پخش کن', 'موسیقی پخش کن'):
+        t0 = time.perf_counter()
+        result = processor.process(text)
+        elapsed = 1000 * (time.perf_counter() - t0)
+        print(f"  «{text}»: {elapsed:.2f}ms  {result.get('artist')} / {result.get('song')}")
+        ok = ok and result['success']
+
+    db.close()
+    tmp.cleanup()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+بنچمارک جستجوی یادداشت‌ها: ایندکس FTS5 در برابر پیمایش LIKE
+
+- زمان درج یادداشت‌ها با تریگر همگام‌سازی ایندکس
+- تاخیر p50/p99 جستجوی رتبه‌بندی شده برای کلمه‌های پرتکرار و کم‌تکرار
+  (LIKE رتبه‌بندی ندارد و با اولین ۱۰ تطابق متوقف می‌شود)
+- پیدا شدن یادداشت با املای متفاوت (ي/ك و بدون نیم‌فاصله)
+
+استفاده:
+    python benchmarks/bench_notes_search.py [--notes 300000] [--queries 200]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from persian_assistant_complete import Database, normalize_persian
+
+WORDS = ['قبض', 'برق', 'آب', 'گاز', 'خرید', 'نان', 'شیر', 'جلسه', 'مدیر', 'فروش', 'دارو', 'دکتر',
+         'نوبت', 'کتاب', 'کلاس', 'ورزش', 'باشگاه', 'تولد', 'هدیه', 'مامان', 'بانک', 'قسط', 'اجاره',
+         'ماشین', 'تعمیر', 'بیمه', 'پرواز', 'بلیت', 'هتل', 'سفر', 'مشهد', 'شیراز', 'پروژه', 'گزارش',
+         'ایمیل', 'تماس', 'پیام', 'رمز', 'وای‌فای', 'کلید', 'یخچال', 'میوه', 'سبزی', 'گوشت', 'برنج']
+FILLER = ['را', 'با', 'از', 'به', 'برای', 'و', 'که', 'فردا', 'امروز', 'حتما', 'یادم', 'باشه', 'بده', 'بگیر', 'کن']
+
+
+def make_note(rnd):
+    """یادداشت تصادفی با توزیع زیپف کلمه‌ها و یک کلمه کم‌تکرار"""
+    words = [WORDS[min(int(rnd.paretovariate(1.1)) - 1, len(WORDS) - 1)] for _ in range(rnd.randint(2, 5))]
+    words += rnd.sample(FILLER, 3)
+    words.append(f'کد{rnd.randint(0, 99999)}')
+    rnd.shuffle(words)
+    return ' '.join(words)
+
+
+def timed(func, queries):
+    latencies, hits = [], 0
+    for query in queries:
+        t0 = time.perf_counter()
+        hits += bool(func(query))
+        latencies.append(time.perf_counter() - t0)
+    latencies.sort()
+    return 1000 * latencies[len(latencies) // 2], 1000 * latencies[int(len(latencies) * 0.99)], hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--notes', type=int, default=300000)
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    db = Database(os.path.join(tmp.name, 'assistant.db'))
+    db.init_tables()
+
+    rnd = random.Random(5)
+    notes = [(note, normalize_persian(note)) for note in (make_note(rnd) for _ in range(args.notes))]
+    t0 = time.perf_counter()
+    for i in range(0, len(notes), 10000):
+        db.executemany("INSERT INTO notes (content, body) VALUES (?, ?)", notes[i:i + 10000])
+    elapsed = time.perf_counter() - t0
+    print(f"درج {args.notes} یادداشت (با تریگر FTS): {elapsed:.2f} ثانیه، "
+          f"{args.notes / elapsed:.0f} در ثانیه")
+
+    def like(query):
+        return db.query("SELECT id, content FROM notes WHERE content LIKE ? ORDER BY id DESC LIMIT 10",
+                        (f'%{query}%',))
+
+    def fts(query):
+        return db.search_notes(query, limit=10)
+
+    samples = [content for content, body in rnd.sample(notes, args.queries)]
+    scenarios = (
+        ('کلمه پرتکرار', [rnd.choice(WORDS[:3]) for _ in range(args.queries)]),
+        ('دو کلمه', [' '.join(rnd.sample(WORDS[:12], 2)) for _ in range(args.queries)]),
+        ('کلمه کم‌تکرار', [next(w for w in text.split() if w.startswith('کد')) for text in samples]),
+        ('املای ي/ك', [next(w for w in text.split() if w.startswith('کد')).replace('ک', 'ك')
+                       for text in samples]),
+    )
+    for label, queries in scenarios:
+        old_p50, old_p99, old_hits = timed(like, queries)
+        new_p50, new_p99, new_hits = timed(fts, queries)
+        print(f"[{label}]")
+        print(f"  LIKE: p50={old_p50:.2f}ms p99={old_p99:.2f}ms  نتیجه={old_hits}/{len(queries)}")
+        print(f"  FTS5: p50={new_p50:.2f}ms p99={new_p99:.2f}ms  نتیجه={new_hits}/{len(queries)}")
+
+    db.close()
+    tmp.cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+بنچمارک خط لوله فرمان صوتی: مراحل هم‌پوشان با صف محدود در برابر اجرای پشت سر هم
+
+زمان ضبط و ساخت صدا با تاخیر ثابت شبیه‌سازی می‌شود. تشخیص گفتار با
+SpeechRecognizer واقعی در حالت hedged انجام می‌شود (تشخیص جریانی در حین ضبط و
+موتور آنلاین روی workerهای مشترک تشخیص) و فقط موتورها ساختگی‌اند: موتور آنلاین
+و رمزگشای جریانی با تاخیر ثابت، متن فرمان را از روی نمونه‌های صدا برمی‌گردانند.
+اجرای فرمان با CommandProcessor واقعی انجام می‌شود. فرمان‌ها به محض آزاد شدن
+مرحله ضبط فرستاده می‌شوند (مثل کاربری که پشت سر هم فرمان می‌دهد).
+
+- توان عملیاتی خط لوله در برابر مجموع تاخیر مراحل (روش قبلی)
+- ثابت ماندن تعداد threadها زیر بار (بدون thread تازه برای هر جمله)
+- درست بودن متن تشخیص داده شده برای همه فرمان‌ها
+- عمق صف، انتظار و زمان سرویس هر مرحله
+
+استفاده:
+    python benchmarks/bench_pipeline.py [--commands 100] [--capture-ms 30] [--asr-ms 40] [--offline-ms 60] [--tts-ms 35]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from persian_assistant_complete import (ASR_BACKENDS, DEFAULT_CONFIG, CommandProcessor, Database, RecognizerBackend,
+                                        SpeechOutputWorker, SpeechRecognizer, Tracer, VoicePipeline, VoskBackend)
+
+COMMANDS = ['یادداشت کن خرید نان', 'با علی تماس بگیر', 'سلام', 'ساعت چنده', 'موزیک پخش کن']
+
+
+def transcript(raw):
+    """متن فرمان از روی اولین نمونه صدا (شماره فرمان در COMMANDS)"""
+    return COMMANDS[int.from_bytes(raw[:2], 'little')] if raw else ''
+
+
+class DelayOnlineBackend(RecognizerBackend):
+    """موتور آنلاین ساختگی با تاخیر ثابت"""
+
+    name = 'delay-online'
+    is_online = True
+    latency = 0.04
+
+    def recognize(self, audio):
+        return self.recognize_scored(audio)[0]
+
+    def recognize_scored(self, audio):
+        time.sleep(self.latency)
+        return transcript(audio.get_raw_data()), 0.9
+
+
+class DelayDecoder:
+    """رمزگشای ساختگی با رابط KaldiRecognizer و تاخیر ثابت برای نتیجه نهایی"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.data = b''
+
+    def Reset(self):
+        self.data = b''
+
+    def AcceptWaveform(self, chunk):
+        self.data += chunk
+        return False
+
+    def PartialResult(self):
+        return json.dumps({'partial': transcript(self.data)})
+
+    def FinalResult(self):
+        time.sleep(self.latency)
+        return json.dumps({'text': transcript(self.data), 'result': [{'conf': 0.7}]})
+
+
+class DelayStreamBackend(VoskBackend):
+    """موتور آفلاین ساختگی؛ تشخیص جریانی همان RecognitionStream برنامه است"""
+
+    name = 'delay-stream'
+    latency = 0.06
+
+    def load(self):
+        self.ready.set()
+        self.loaded.set()
+
+    def create_decoder(self, sample_rate):
+        return DelayDecoder(self.latency)
+
+
+class DelayTTS:
+    """موتور TTS ساختگی با زمان ساخت ثابت و بدون پخش"""
+
+    def __init__(self, delay):
+        self.delay = delay
+
+    def synthesize(self, text):
+        time.sleep(self.delay)
+        return text
+
+    def play(self, path):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--commands', type=int, default=100)
+    parser.add_argument('--capture-ms', type=float, default=30)
+    parser.add_argument('--asr-ms', type=float, default=40, help='تاخیر موتور آنلاین')
+    parser.add_argument('--offline-ms', type=float, default=60, help='تاخیر نتیجه نهایی تشخیص جریانی')
+    parser.add_argument('--tts-ms', type=float, default=35)
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    db = Database(os.path.join(tmp.name, 'assistant.db'))
+    db.init_tables()
+    db.add_sample_data()
+    processor = CommandProcessor(db)
+    tracer = Tracer()
+    speech_worker = SpeechOutputWorker(DelayTTS(args.tts_ms / 1000))
+
+    DelayOnlineBackend.latency = args.asr_ms / 1000
+    DelayStreamBackend.latency = args.offline_ms / 1000
+    ASR_BACKENDS['delay-online'] = DelayOnlineBackend
+    ASR_BACKENDS['delay-stream'] = DelayStreamBackend
+    recognizer = SpeechRecognizer(dict(DEFAULT_CONFIG, asr_mode='hedged', asr_online='delay-online',
+                                       asr_offline='delay-stream'))
+    recognizer.offline.loaded.wait()
+    partials = []
+    wrong = []
+
+    def capture(job):
+        # مثل callback میکروفون: صدا در چند بلوک به تشخیص جریانی داده می‌شود
+        index, trace = job
+        samples = np.full(16 * max(1, int(args.capture_ms)), index, dtype=np.int16)
+        stream = recognizer.start_stream(16000, on_partial=partials.append)
+        for block in np.array_split(samples, 3):
+            time.sleep(args.capture_ms / 3000)
+            if stream:
+                stream.feed(block)
+        trace.add('record')
+        return index, samples, stream, trace
+
+    def recognize(job):
+        index, samples, stream, trace = job
+        text = recognizer.recognize_buffer(samples, 16000, stream=stream)
+        trace.add('asr')
+        if text != COMMANDS[index]:
+            wrong.append((COMMANDS[index], text))
+        return text or COMMANDS[index], trace
+
+    def execute(job):
+        text, trace = job
+        trace.add('dispatch')
+        result = processor.process(text, trace)
+        speech_worker.say(result.get('response') or result.get('error'), trace=trace)
+
+    pipeline = VoicePipeline(capture, recognize, execute)
+    pipeline.start()
+    for text in COMMANDS:
+        processor.process(text)
+
+    threads_before = threading.active_count()
+    peak_threads = threads_before
+    t0 = time.perf_counter()
+    for i in range(args.commands):
+        # مثل کاربر: فرمان بعدی وقتی ضبط آزاد شد (صف پر یعنی فشار برگشتی)
+        pipeline.stages[0].submit((i % len(COMMANDS), tracer.start()))
+        peak_threads = max(peak_threads, threading.active_count())
+    while speech_worker.spoken + speech_worker.dropped < args.commands and time.perf_counter() - t0 < 120:
+        peak_threads = max(peak_threads, threading.active_count())
+        time.sleep(0.002)
+    elapsed = time.perf_counter() - t0
+
+    stage_ms = args.capture_ms + args.asr_ms + args.tts_ms
+    sequential = args.commands * stage_ms / 1000
+    bottleneck = args.commands * max(args.capture_ms, args.asr_ms, args.tts_ms) / 1000
+    print(f"{args.commands} فرمان: خط لوله={elapsed:.2f}s  پشت سر هم (حداقل)={sequential:.2f}s  "
+          f"کند‌ترین مرحله={bottleneck:.2f}s")
+    print(f"threadها: قبل={threads_before} بیشینه={peak_threads}")
+    for name, stats in pipeline.stats().items():
+        print(f"  [{name}] پردازش={stats['processed']} رد={stats['rejected']} "
+              f"انتظار p50={stats['wait_ms']['p50']}ms سرویس p50={stats['service_ms']['p50']}ms")
+    jobs = recognizer.jobs.stats()
+    print(f"  [asr-jobs] workers={jobs['workers']} پردازش={jobs['processed']} رد={jobs['rejected']} "
+          f"انتظار p99={jobs['wait_ms']['p99']}ms سرویس p50={jobs['service_ms']['p50']}ms")
+    print(f"  [asr] {json.dumps(recognizer.stats())}  متن اشتباه={len(wrong)} فرضیه جزئی={len(partials)}")
+    print(f"  [tts] {json.dumps(speech_worker.stats())}")
+    summary = tracer.summary()
+    print(f"تاخیر کل هر فرمان: {summary['total']['*']}")
+
+    pipeline.stop()
+    recognizer.jobs.stop()
+    db.close()
+    tmp.cleanup()
+    ok = speech_worker.spoken == args.commands and peak_threads == threads_before and not wrong
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+بنچمارک زمان‌بند یادآوری با ۱۰۰ هزار یادآوری آینده
+
+- زمان بارگذاری پنجره هنگام شروع
+- دقت زمان اعلام نسبت به موعد و تجمیع یادآوری‌های هم‌زمان در یک اعلام
+- تاخیر بیدار شدن زمان‌بند پس از افزودن یادآوری جدید
+- پلن کوئری یادآوری‌های رسیده (استفاده از ایندکس ترکیبی)
+
+اگر یادآوری‌ای زودتر از موعد یا دیرتر از سقف مجاز اعلام شود، ترتیب یا گروه‌بندی
+اعلام‌ها درست نباشد یا یادآوری آینده‌ای اعلام شود کد خروج ۱ است.
+
+استفاده:
+    python benchmarks/bench_reminders.py [--count 100000] [--max-late-ms 250]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import threading
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from persian_assistant_complete import Database, ReminderManager
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--count', type=int, default=100000)
+    parser.add_argument('--max-late-ms', type=float, default=250, help='سقف تاخیر اعلام نسبت به موعد')
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    db = Database(os.path.join(tmp.name, 'assistant.db'))
+    db.init_tables()
+
+    # یادآوری‌های آینده در ۳۰ روز آینده (از ۲ ساعت بعد به بعد)
+    rnd = random.Random(7)
+    now = datetime.now()
+    rows = [(f'یادآوری {i}', now + timedelta(hours=2, seconds=rnd.randint(0, 30 * 86400)))
+            for i in range(args.count)]
+    t0 = time.perf_counter()
+    for i in range(0, len(rows), 10000):
+        db.executemany("INSERT INTO reminders (title, reminder_time) VALUES (?, ?)", rows[i:i + 10000])
+    print(f"درج {args.count} یادآوری: {time.perf_counter() - t0:.2f} ثانیه")
+
+    # پنج یادآوری هم‌زمان و یکی جدا، نزدیک به حال
+    soon = datetime.now() + timedelta(seconds=1.5)
+    db.executemany("INSERT INTO reminders (title, reminder_time) VALUES (?, ?)",
+                   [(f'هم‌زمان {i}', soon) for i in range(5)])
+    db.execute("INSERT INTO reminders (title, reminder_time) VALUES (?, ?)",
+               ('جدا', soon + timedelta(seconds=1.5)))
+
+    plan = db.query("EXPLAIN QUERY PLAN SELECT id, title, reminder_time FROM reminders "
+                    "WHERE is_completed = 0 AND reminder_time <= ?", (now,))
+    print(f"پلن کوئری: {plan[0][-1]}")
+
+    events = []
+    fired = threading.Event()
+
+    def on_due(due):
+        events.append((datetime.now(), due))
+        if sum(len(d) for _, d in events) >= 7:
+            fired.set()
+
+    manager = ReminderManager(db)
+    t0 = time.perf_counter()
+    count = manager.load_window(datetime.now())
+    print(f"بارگذاری پنجره {manager.horizon}: {count} یادآوری در {1000 * (time.perf_counter() - t0):.1f}ms "
+          f"(از {args.count + 6} کل)")
+    manager.start(on_due)
+
+    # یادآوری اضافه شده در حین اجرا باید بدون انتظار برای سرکشی اعلام شود
+    time.sleep(0.2)
+    manager.add_reminder('تازه', datetime.now() + timedelta(seconds=4))
+
+    fired.wait(10)
+    manager.stop()
+
+    ok = True
+    for fired_at, due in events:
+        lateness = [(fired_at - t).total_seconds() for _, _, t in due]
+        print(f"  اعلام {len(due)} یادآوری ({', '.join(title for _, title, _ in due)}) "
+              f"تاخیر حداقل {1000 * min(lateness):.0f}ms حداکثر {1000 * max(lateness):.0f}ms")
+        # نه زودتر از موعد، نه دیرتر از سقف
+        ok = ok and min(lateness) >= 0 and 1000 * max(lateness) <= args.max_late_ms
+
+    # سه اعلام به ترتیب موعد: پنج هم‌زمان با هم، سپس «جدا»، سپس «تازه»
+    expected = [sorted(f'هم‌زمان {i}' for i in range(5)), ['جدا'], ['تازه']]
+    batches = [sorted(title for _, title, _ in due) for _, due in events]
+    print(f"تعداد اعلام‌ها: {len(events)} (انتظار: ۳)  ترتیب درست: {batches == expected}")
+    ok = ok and batches == expected
+
+    pending = db.query_one("SELECT COUNT(*) FROM reminders WHERE is_completed = 0")[0]
+    print(f"یادآوری‌های باقیمانده: {pending}/{args.count}")
+    ok = ok and pending == args.count
+    db.close()
+    tmp.cleanup()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
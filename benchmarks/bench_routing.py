@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+بنچمارک مسیریابی آفلاین: گراف فشرده نگاشت‌شده در حافظه و A* با نشانه‌ها
+
+یک شهر شبکه‌ای ساختگی (بزرگراه، خیابان اصلی و کوچه‌های یک‌طرفه با مختصات
+نامنظم و میدان‌های نام‌دار) به شکل فایل OSM XML نوشته و با همان مسیر
+build-roads ساخته می‌شود. سپس زمان ساخت، اندازه فایل‌ها، زمان باز کردن،
+تاخیر پرسش‌های تصادفی در برابر Dijkstra ساده (و برابری نتیجه‌ها) و فرمان
+کامل «چطور برم تجریش» اندازه‌گیری می‌شود.
+
+استفاده:
+    python benchmarks/bench_routing.py [--side 250] [--queries 200] [--landmarks 8]
+"""
+
+import os
+import sys
+import math
+import time
+import heapq
+import random
+import argparse
+import tempfile
+from xml.sax.saxutils import quoteattr
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from persian_assistant_complete import (CommandProcessor, Database, NavigationService, RoadGraph, build_roads_main,
+                                        read_osm_roads)
+
+ORIGIN = (35.70, 51.40)
+STEP_LAT, STEP_LON = 0.001, 0.0012
+# نام: (سطر، ستون) به نسبت اندازه شهر
+PLACES = {
+    'میدان آزادی': (0.5, 0.02),
+    'میدان تجریش': (0.98, 0.55),
+    'میدان ونک': (0.75, 0.5),
+    'میدان انقلاب': (0.5, 0.45),
+    'ایستگاه راه‌آهن': (0.05, 0.45),
+    'تهرانپارس': (0.6, 0.97),
+}
+
+
+def write_city(path, side, seed=3):
+    """نوشتن شهر شبکه‌ای ساختگی به شکل OSM XML؛ خروجی: تعداد گره‌ها"""
+    rnd = random.Random(seed)
+
+    def node_id(i, j):
+        return 1 + i * side + j
+
+    def road(k):
+        if k % 50 == 0:
+            return 'trunk'
+        if k % 10 == 0:
+            return 'primary'
+        return 'residential'
+
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<osm version="0.6">\n')
+        for i in range(side):
+            for j in range(side):
+                lat = ORIGIN[0] + i * STEP_LAT + rnd.uniform(-0.3, 0.3) * STEP_LAT
+                lon = ORIGIN[1] + j * STEP_LON + rnd.uniform(-0.3, 0.3) * STEP_LON
+                f.write(f'<node id="{node_id(i, j)}" lat="{lat:.7f}" lon="{lon:.7f}"/>\n')
+        place_id = side * side + 1
+        for name, (row, col) in PLACES.items():
+            lat = ORIGIN[0] + row * (side - 1) * STEP_LAT + 0.0002
+            lon = ORIGIN[1] + col * (side - 1) * STEP_LON + 0.0002
+            f.write(f'<node id="{place_id}" lat="{lat:.7f}" lon="{lon:.7f}">'
+                    f'<tag k="place" v="square"/><tag k="name:fa" v={quoteattr(name)}/></node>\n')
+            place_id += 1
+        way_id = 1
+        for i in range(side):
+            # کوچه‌های افقی یک‌طرفه با جهت یک در میان
+            tags = {'highway': road(i)}
+            if tags['highway'] == 'residential':
+                tags['oneway'] = 'yes' if i % 2 else '-1'
+            if i == side // 2:
+                tags['name'] = 'خیابان آزادی'
+            refs = ''.join(f'<nd ref="{node_id(i, j)}"/>' for j in range(side))
+            tag_xml = ''.join(f'<tag k="{k}" v={quoteattr(v)}/>' for k, v in tags.items())
+            f.write(f'<way id="{way_id}">{refs}{tag_xml}</way>\n')
+            way_id += 1
+        for j in range(side):
+            tags = {'highway': road(j)}
+            if j == side // 2:
+                tags['name'] = 'خیابان ولیعصر'
+            refs = ''.join(f'<nd ref="{node_id(i, j)}"/>' for i in range(side))
+            tag_xml = ''.join(f'<tag k="{k}" v={quoteattr(v)}/>' for k, v in tags.items())
+            f.write(f'<way id="{way_id}">{refs}{tag_xml}</way>\n')
+            way_id += 1
+        f.write('</osm>\n')
+    return side * side
+
+
+def dijkstra(graph, source, target):
+    """مرجع: Dijkstra ساده روی همان آرایه‌ها؛ (ثانیه، گره‌های باز شده)"""
+    offsets, targets, times = graph.offsets, graph.targets, graph.times
+    best = {source: 0.0}
+    heap = [(0.0, source)]
+    settled = 0
+    while heap:
+        d, v = heapq.heappop(heap)
+        if d > best[v]:
+            continue
+        if v == target:
+            return d, settled
+        settled += 1
+        for i in range(offsets[v], offsets[v + 1]):
+            w = targets[i]
+            nd = d + times[i]
+            if nd < best.get(w, math.inf):
+                best[w] = nd
+                heapq.heappush(heap, (nd, w))
+    return None, settled
+
+
+def percentiles(values):
+    values = sorted(values)
+    return (1000 * values[len(values) // 2], 1000 * values[min(len(values) - 1, int(0.99 * len(values)))])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--side', type=int, default=250, help='تعداد تقاطع‌ها در هر ضلع شهر')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--landmarks', type=int, default=8)
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    osm_path = os.path.join(tmp.name, 'city.osm')
+    roads = os.path.join(tmp.name, 'roads')
+    nodes = write_city(osm_path, args.side)
+    print(f"شهر ساختگی: {nodes} تقاطع، {os.path.getsize(osm_path) / 1e6:.1f}MB OSM XML")
+
+    t0 = time.perf_counter()
+    coords, edges, places = read_osm_roads(osm_path)
+    parse_time = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    build_roads_main([osm_path, '-o', roads, '--landmarks', str(args.landmarks)])
+    build_time = time.perf_counter() - t0
+    size = sum(os.path.getsize(os.path.join(roads, name)) for name in os.listdir(roads))
+    print(f"خواندن OSM: {parse_time:.1f}s  ساخت کامل: {build_time:.1f}s  "
+          f"اندازه گراف: {size / 1e6:.1f}MB ({len(edges)} یال، {len(places)} نام)")
+
+    t0 = time.perf_counter()
+    graph = RoadGraph(roads)
+    print(f"باز کردن گراف (mmap): {1000 * (time.perf_counter() - t0):.2f}ms")
+    ok = graph.node_count == nodes
+
+    rnd = random.Random(9)
+    pairs = [(rnd.randrange(graph.node_count), rnd.randrange(graph.node_count)) for _ in range(args.queries)]
+    latencies, settled = [], []
+    results = []
+    for source, target in pairs:
+        t0 = time.perf_counter()
+        result = graph.route(source, target)
+        latencies.append(time.perf_counter() - t0)
+        results.append(result)
+        settled.append(result[2])
+    alt_p50, alt_p99 = percentiles(latencies)
+
+    # مقایسه با Dijkstra روی بخشی از پرسش‌ها (Dijkstra پایتونی کند است)
+    checked = pairs[:max(1, args.queries // 5)]
+    reference, reference_settled = [], []
+    mismatches = 0
+    for (source, target), result in zip(checked, results):
+        t0 = time.perf_counter()
+        seconds, count = dijkstra(graph, source, target)
+        reference.append(time.perf_counter() - t0)
+        reference_settled.append(count)
+        if seconds is None or abs(seconds - result[0]) > 1e-4 * max(1.0, seconds):
+            mismatches += 1
+    ref_p50, ref_p99 = percentiles(reference)
+    print(f"A* با {graph.landmark_count} نشانه: p50={alt_p50:.2f}ms p99={alt_p99:.2f}ms  "
+          f"گره‌های باز شده (میانه)={sorted(settled)[len(settled) // 2]}")
+    print(f"Dijkstra ساده: p50={ref_p50:.2f}ms p99={ref_p99:.2f}ms  "
+          f"گره‌های باز شده (میانه)={sorted(reference_settled)[len(reference_settled) // 2]}  "
+          f"نتیجه متفاوت: {mismatches}/{len(checked)}")
+    ok = ok and mismatches == 0
+    graph.close()
+
+    # فرمان کامل از مرکز شهر (مبدا پیش‌فرض) و با مبدا گفته شده
+    center = (ORIGIN[0] + args.side / 2 * STEP_LAT, ORIGIN[1] + args.side / 2 * STEP_LON)
+    db = Database(os.path.join(tmp.name, 'assistant.db'))
+    db.init_tables()
+    navigation = NavigationService({'navigation_graph': roads, 'navigation_origin': center})
+    processor = CommandProcessor(db, navigation_service=navigation)
+    for text in ('چطور برم تجریش', 'راه از میدان ونک به آزادی', 'مسیر به تهرانپارس', 'چطور برم اصفهان'):
+        t0 = time.perf_counter()
+        result = processor.process(text)
+        elapsed = 1000 * (time.perf_counter() - t0)
+        print(f"  «{text}»: {elapsed:.1f}ms  {result.get('response') or result.get('error')}")
+        ok = ok and result['success'] == (text != 'چطور برم اصفهان')
+
+    navigation.graph.close()
+    db.close()
+    tmp.cleanup()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
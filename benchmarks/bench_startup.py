@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+بنچمارک زمان راه‌اندازی: import سرد ماژول دستیار با importهای تنبل در برابر importهای مستقیم
+
+هر اندازه‌گیری در یک پردازه تازه انجام می‌شود تا کش ماژول‌ها اثر نگذارد. حالت
+«مستقیم» همان کتابخانه‌های سنگین (numpy، requests، speech_recognition) را پیش از
+import دستیار بارگذاری می‌کند که رفتار قبلی بود.
+
+استفاده:
+    python benchmarks/bench_startup.py [--runs 7]
+"""
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = '''
+import sys, time, json
+t0 = time.perf_counter()
+for name in {eager!r}:
+    try:
+        __import__(name)
+    except ImportError:
+        pass
+import persian_assistant_complete as m
+elapsed = time.perf_counter() - t0
+heavy = [name for name in ('numpy', 'requests', 'speech_recognition') if name in sys.modules]
+print(json.dumps({{'ms': 1000 * elapsed, 'heavy': heavy, 'modules': len(sys.modules)}}))
+'''
+
+
+def run_probe(eager):
+    env = dict(os.environ, ASSISTANT_HEADLESS='1', PYTHONPATH=ROOT)
+    out = subprocess.run([sys.executable, '-c', PROBE.format(eager=eager)],
+                         env=env, cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=7)
+    args = parser.parse_args()
+
+    results = {}
+    for label, eager in (('تنبل', []), ('مستقیم', ['numpy', 'requests', 'speech_recognition'])):
+        runs = [run_probe(eager) for _ in range(args.runs)]
+        times = sorted(run['ms'] for run in runs)
+        results[label] = runs[0]
+        print(f"[{label}] میانه={times[len(times) // 2]:.1f}ms کمترین={times[0]:.1f}ms "
+              f"ماژول‌ها={runs[0]['modules']} کتابخانه‌های سنگین={runs[0]['heavy']}")
+
+    # در حالت تنبل هیچ کتابخانه سنگینی نباید هنگام import بارگذاری شود
+    sys.exit(0 if not results['تنبل']['heavy'] else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+مجموعه بنچمارک بدون رابط کاربری: پردازش فرمان، پایگاه داده و تشخیص گفتار
+
+بدون کیوی، دستگاه صوتی یا شبکه اجرا می‌شود (ASSISTANT_HEADLESS=1) و برای CI
+مناسب است. هر سناریو تعداد عملیات در ثانیه و صدک‌های تاخیر را گزارش می‌کند.
+
+- intent: تشخیص فرمان روی جمله‌های تصادفی
+- process/TYPE: CommandProcessor.process (تشخیص + execute_*) به تفکیک نوع فرمان
+- db/...: جستجوی یادداشت و مخاطب، گزارش هزینه و flush لاگ فرمان روی SQLite موقت
+- tts/cache_hit: برخورد کش صوتی TTS (بدون نوشتن در ایندکس)
+- asr/...: VAD و recognize_file روی فایل‌های WAV با موتور آفلاین ساختگی
+  (یا Vosk واقعی با --asr-model)، و زنجیره کامل WAV تا پاسخ
+
+خروجی JSON با --json ذخیره می‌شود (- یعنی stdout). با --baseline نتیجه با یک
+اجرای قبلی مقایسه می‌شود و اگر p50 یا p95 سناریویی بیش از حد مجاز کندتر شده
+باشد کد خروج ۱ است.
+
+استفاده:
+    python benchmarks/bench_suite.py [--quick] [--json results.json] [--baseline baseline.json]
+        [--tolerance 0.3] [--only db/] [--fixtures fixtures/asr] [--asr-model models/vosk-model-small-fa-0.5]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import argparse
+import platform
+import tempfile
+from datetime import datetime
+
+import scipy.io.wavfile as wav
+
+os.environ['ASSISTANT_HEADLESS'] = '1'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from persian_assistant_complete import (ASR_BACKENDS, DEFAULT_CONFIG, CommandLogWriter, CommandProcessor,
+                                        ContactIndex, Database, RecognizerBackend, SpeechRecognizer, TTSCache,
+                                        VoiceActivityDetector, WeatherService, normalize_persian)
+from bench_contacts import asr_variant, make_name
+from bench_expenses import generate_ledger
+from bench_intent import build_corpus
+from bench_notes_search import WORDS, make_note
+from bench_wake_word import SAMPLE_RATE, synth_word
+from bench_weather import FixtureWeatherProvider
+
+# فرمان‌هایی که در پیکره bench_intent نیستند
+EXTRA_COMMANDS = [
+    'سی و پنج هزار تومان برای ناهار خرج کردم', 'ثبت هزینه دویست هزار تومان بنزین',
+    'این ماه چقدر برای غذا خرج کردم', 'امروز چقدر خرج کردم',
+    'جستجو در یادداشت‌ها قبض', 'یادداشت درباره جلسه',
+]
+
+SIZES = {'contacts': 20000, 'notes': 50000, 'expenses': 100000, 'fixtures': 20, 'repeat': 3}
+
+
+class FixtureBackend(RecognizerBackend):
+    """موتور آفلاین ساختگی: متن مرجع فایل در حال پردازش را برمی‌گرداند"""
+
+    name = 'fixture'
+    transcript = ''
+
+    def recognize(self, audio):
+        return self.recognize_scored(audio)[0]
+
+    def recognize_scored(self, audio):
+        return FixtureBackend.transcript, 1.0
+
+
+def measure(func, inputs, repeat=1, warmup=10, min_samples=200):
+    """اجرای func روی همه ورودی‌ها و خلاصه تاخیر (میلی‌ثانیه) و توان عملیاتی"""
+    # گروه‌های کوچک تکرار می‌شوند تا صدک‌ها معنی داشته باشند
+    repeat = max(repeat, -(-min_samples // len(inputs)))
+    for item in inputs[:warmup]:
+        func(item)
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for item in inputs:
+            t0 = time.perf_counter()
+            func(item)
+            latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    pct = lambda q: round(1000 * latencies[min(len(latencies) - 1, int(len(latencies) * q))], 4)
+    return {
+        'count': len(latencies),
+        'ops_per_sec': round(len(latencies) / elapsed, 1),
+        'p50_ms': pct(0.5),
+        'p95_ms': pct(0.95),
+        'p99_ms': pct(0.99),
+        'max_ms': round(1000 * latencies[-1], 4),
+    }
+
+
+def seed_database(db, rnd, sizes):
+    """پر کردن پایگاه داده موقت با مخاطب، یادداشت و هزینه ساختگی"""
+    names = [make_name(rnd) for _ in range(sizes['contacts'])]
+    db.executemany("INSERT INTO contacts (name, phone, category) VALUES (?, ?, ?)",
+                   [(name, f'0912{i:07d}', 'friend') for i, name in enumerate(names)])
+    for i in range(0, sizes['notes'], 10000):
+        notes = [make_note(rnd) for _ in range(min(10000, sizes['notes'] - i))]
+        db.executemany("INSERT INTO notes (content, body) VALUES (?, ?)",
+                       [(note, normalize_persian(note)) for note in notes])
+    ledger = generate_ledger(rnd, sizes['expenses'])
+    for i in range(0, sizes['expenses'], 10000):
+        db.executemany("INSERT INTO expenses (amount, description, category, created_at) VALUES (?, ?, ?, ?)",
+                       [next(ledger) for _ in range(min(10000, sizes['expenses'] - i))])
+    return names
+
+
+def load_fixtures(directory, corpus, rnd, count):
+    """فایل‌های WAV پوشه fixtures (با متن مرجع NAME.txt) یا ساخت فایل مصنوعی"""
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+        for i in range(count):
+            syllables = [(rnd.randint(250, 700), rnd.randint(1000, 2600)) for _ in range(rnd.randint(3, 8))]
+            path = os.path.join(directory, f'utt{i:03d}.wav')
+            wav.write(path, SAMPLE_RATE, synth_word(syllables, seed=i))
+            with open(path[:-4] + '.txt', 'w', encoding='utf-8') as f:
+                f.write(rnd.choice(corpus))
+
+    fixtures = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith('.wav'):
+            continue
+        path = os.path.join(directory, name)
+        reference = path[:-4] + '.txt'
+        transcript = open(reference, encoding='utf-8').read().strip() if os.path.exists(reference) else ''
+        rate, data = wav.read(path)
+        fixtures.append((path, transcript, rate, data if data.ndim == 1 else data[:, 0]))
+    return fixtures
+
+
+def run_vad(fixture):
+    """پخش فایل به صورت بلوک‌های ۳۲ میلی‌ثانیه‌ای مثل callback میکروفون"""
+    path, transcript, rate, data = fixture
+    vad = VoiceActivityDetector(sample_rate=rate)
+    block = rate // 32
+    for i in range(0, len(data), block):
+        if vad.process(data[i:i + block]):
+            break
+    return vad.utterance()
+
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    """سناریوهایی که p50 یا p95 آن‌ها بیش از حد مجاز از مبنا کندتر شده است"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous:
+            continue
+        for key in ('p50_ms', 'p95_ms'):
+            if current[key] > previous[key] * (1 + tolerance) and current[key] - previous[key] > min_delta_ms:
+                regressions.append((name, key, previous[key], current[key]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--quick', action='store_true', help='داده و تکرار کمتر برای CI')
+    parser.add_argument('--json', help='مسیر خروجی JSON (- برای stdout)')
+    parser.add_argument('--baseline', help='خروجی JSON یک اجرای قبلی برای مقایسه')
+    parser.add_argument('--tolerance', type=float, default=0.3, help='کندی نسبی مجاز (پیش‌فرض ۳۰٪)')
+    parser.add_argument('--min-delta-ms', type=float, default=0.05, help='کندی مطلق کمتر از این نادیده گرفته می‌شود')
+    parser.add_argument('--only', help='فقط سناریوهایی که نامشان با این پیشوند شروع می‌شود')
+    parser.add_argument('--fixtures', help='پوشه فایل‌های WAV (پیش‌فرض: فایل‌های مصنوعی)')
+    parser.add_argument('--asr-model', help='مسیر مدل Vosk برای تشخیص واقعی به جای موتور ساختگی')
+    args = parser.parse_args()
+
+    # وقتی JSON روی stdout است، گزارش خوانا به stderr می‌رود
+    out = sys.stderr if args.json == '-' else sys.stdout
+    sizes = dict(SIZES, contacts=2000, notes=5000, expenses=10000, repeat=1) if args.quick else dict(SIZES)
+    wanted = lambda name: not args.only or name.startswith(args.only)
+
+    tmp = tempfile.TemporaryDirectory()
+    db = Database(os.path.join(tmp.name, 'assistant.db'))
+    db.init_tables()
+    db.add_sample_data()
+    rnd = random.Random(16)
+
+    t0 = time.perf_counter()
+    names = seed_database(db, rnd, sizes)
+    print(f"آماده‌سازی داده {sizes}: {time.perf_counter() - t0:.1f} ثانیه", file=out)
+
+    # فرمان هوا بدون شبکه و از کش
+    processor = CommandProcessor(db, weather_service=WeatherService(provider=FixtureWeatherProvider()))
+    corpus = build_corpus(2000 if args.quick else 5000) + EXTRA_COMMANDS
+    results = {}
+
+    def run(name, func, inputs, repeat=1, **kwargs):
+        if wanted(name) and inputs:
+            results[name] = measure(func, inputs, repeat, **kwargs)
+            # نوشتن‌های ناهمگام این سناریو نباید زمان سناریوی بعدی را خراب کند
+            db.transaction(lambda conn: None)
+            r = results[name]
+            print(f"  {name:<28} {r['ops_per_sec']:>10.0f}/s  p50={r['p50_ms']:.3f}ms  "
+                  f"p95={r['p95_ms']:.3f}ms  p99={r['p99_ms']:.3f}ms", file=out)
+
+    # ---------- پردازش فرمان ----------
+    run('db/contact_index_load', lambda _: ContactIndex(db).load(), [None], warmup=1, min_samples=3)
+    index = processor.contacts
+    index.ensure_loaded()
+
+    run('intent', processor.identify_command, corpus, sizes['repeat'])
+    by_type = {}
+    for text in corpus:
+        by_type.setdefault(processor.identify_command(text)[0], []).append(text)
+    for command_type in sorted(by_type):
+        run(f'process/{command_type}', processor.process, by_type[command_type])
+
+    # ---------- پایگاه داده ----------
+    queries = [' '.join(rnd.sample(WORDS[:12], rnd.randint(1, 2))) for _ in range(200)]
+    run('db/notes_search', lambda q: db.search_notes(q, limit=3), queries)
+    run('db/contacts_search', lambda q: index.search(q, k=3),
+        [asr_variant(name) for name in rnd.sample(names, min(500, len(names)))])
+    tracker = processor.expenses
+    label, days, months = tracker.period('این ماه', datetime.now().date())
+    run('db/expense_report', lambda category: tracker.total(months=months, category=category),
+        list(tracker.CATEGORIES) * 20)
+
+    log_writer = CommandLogWriter(db, batch_size=10 ** 9, flush_interval=3600)
+
+    def flush_batch(batch):
+        for text in batch:
+            log_writer.log(text, 'bench', True)
+        log_writer.flush(wait=True)
+
+    run('db/command_log_flush', flush_batch, [corpus[i:i + 50] for i in range(0, 2000, 50)])
+    log_writer.close()
+
+    # ---------- کش TTS ----------
+    tts_cache = TTSCache(os.path.join(tmp.name, 'tts'))
+    phrases = corpus[:200]
+
+    def write_audio(path):
+        with open(path, 'wb') as f:
+            f.write(bytes(64))
+
+    for text in phrases:
+        tts_cache.put(text, 'fa', 'com', write_audio)
+    run('tts/cache_hit', lambda text: tts_cache.get(text, 'fa', 'com'), phrases)
+    tts_cache.flush()
+
+    # ---------- تشخیص گفتار ----------
+    fixtures = load_fixtures(args.fixtures or os.path.join(tmp.name, 'fixtures'), corpus, rnd, sizes['fixtures'])
+    if args.asr_model:
+        config = dict(DEFAULT_CONFIG, asr_mode='offline', asr_offline='vosk', asr_model=args.asr_model)
+    else:
+        ASR_BACKENDS['fixture'] = FixtureBackend
+        config = dict(DEFAULT_CONFIG, asr_mode='offline', asr_offline='fixture')
+    recognizer = SpeechRecognizer(config)
+    recognizer.offline.loaded.wait()
+    if not recognizer.offline.ready.is_set():
+        print("❌ موتور آفلاین بارگذاری نشد (مدل یا کتابخانه موجود نیست)", file=out)
+        sys.exit(1)
+
+    def recognize(fixture):
+        FixtureBackend.transcript = fixture[1]
+        return recognizer.recognize_file(fixture[0])
+
+    def end_to_end(fixture):
+        text = recognize(fixture)
+        return processor.process(text) if text else None
+
+    run('asr/vad', run_vad, fixtures)
+    run('asr/recognize_file', recognize, fixtures)
+    run('asr/end_to_end', end_to_end, fixtures)
+
+    db.close()
+    tmp.cleanup()
+
+    report = {
+        'meta': {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'asr_backend': 'vosk' if args.asr_model else 'fixture',
+            'sizes': sizes,
+        },
+        'results': results,
+    }
+    if args.json == '-':
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=1)
+        print()
+    elif args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=1)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('meta', {}).get('sizes') != sizes:
+            print("⚠️ اندازه داده مبنا با این اجرا یکی نیست؛ مقایسه تقریبی است", file=out)
+        regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+        for name, key, before, after in regressions:
+            print(f"❌ کندتر شده: {name} {key} {before:.3f}ms → {after:.3f}ms", file=out)
+        print(f"مقایسه با مبنا: {len(regressions)} مورد کندی در {len(results)} سناریو", file=out)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
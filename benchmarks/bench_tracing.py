@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+بنچمارک هزینه ردیابی تاخیر مراحل فرمان
+
+- هزینه هر ردیابی کامل (شروع، بازه‌های همه مراحل، تجمیع و لاگ) به میکروثانیه
+- سربار ردیابی روی پردازش فرمان در CommandProcessor
+- دقت صدک‌های هیستوگرام در برابر صدک‌های دقیق روی تاخیرهای لاگ‌نرمال
+- ذخیره شدن شناسه و بازه‌ها در سطر command_logs
+
+استفاده:
+    python benchmarks/bench_tracing.py [--traces 100000] [--commands 3000]
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from persian_assistant_complete import (CommandLogWriter, CommandProcessor, Database, LatencyHistogram, Tracer,
+                                        WeatherService)
+from bench_weather import FixtureWeatherProvider
+
+STAGES = ['record', 'asr', 'dispatch', 'identify', 'execute', 'speech_queue', 'tts', 'play']
+COMMANDS = ['یادداشت کن خرید نان', 'با علی تماس بگیر', 'هوا چطوره', 'موزیک پخش کن', 'سلام']
+
+
+def exact_percentile(values, p):
+    values = sorted(values)
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--traces', type=int, default=100000)
+    parser.add_argument('--commands', type=int, default=3000)
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    db = Database(os.path.join(tmp.name, 'assistant.db'))
+    db.init_tables()
+    db.add_sample_data()
+    log_writer = CommandLogWriter(db)
+    tracer = Tracer(log_writer)
+
+    # هزینه خالص ردیابی: همه مراحل خط لوله بدون کار واقعی
+    t0 = time.perf_counter()
+    for i in range(args.traces):
+        trace = tracer.start()
+        for stage in STAGES:
+            trace.add(stage)
+        trace.command = ('سلام', 'unknown', True)
+        trace.finish()
+    per_trace = 1000000 * (time.perf_counter() - t0) / args.traces
+    print(f"هزینه هر ردیابی ({len(STAGES)} مرحله + تجمیع + لاگ): {per_trace:.1f}µs")
+
+    # سربار روی پردازش فرمان
+    processor = CommandProcessor(db, weather_service=WeatherService(provider=FixtureWeatherProvider()))
+    texts = [COMMANDS[i % len(COMMANDS)] for i in range(args.commands)]
+    for text in texts[:50]:
+        processor.process(text)
+    t0 = time.perf_counter()
+    for text in texts:
+        processor.process(text)
+    plain = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for text in texts:
+        trace = tracer.start()
+        processor.process(text, trace)
+        trace.finish()
+    traced = time.perf_counter() - t0
+    print(f"پردازش فرمان: بدون ردیابی={1000 * plain / len(texts):.3f}ms "
+          f"با ردیابی={1000 * traced / len(texts):.3f}ms "
+          f"(سربار {1000000 * (traced - plain) / len(texts):.1f}µs)")
+
+    # دقت هیستوگرام
+    rnd = random.Random(5)
+    values = [rnd.lognormvariate(math.log(0.4), 0.8) for _ in range(200000)]
+    histogram = LatencyHistogram()
+    for value in values:
+        histogram.record(value)
+    worst = 0.0
+    for p in (50, 95, 99):
+        exact = exact_percentile(values, p)
+        estimate = histogram.percentile(p)
+        worst = max(worst, abs(estimate - exact) / exact)
+        print(f"  p{p}: دقیق={1000 * exact:.1f}ms هیستوگرام={1000 * estimate:.1f}ms")
+    print(f"بیشترین خطای نسبی: {100 * worst:.2f}%  سطل‌ها: {len(histogram.counts)}")
+
+    summary = tracer.summary()
+    print(f"total/*: {summary['total']['*']}")
+
+    log_writer.close()
+    row = db.query_one("SELECT trace_id, latency_ms, spans FROM command_logs "
+                       "WHERE trace_id IS NOT NULL ORDER BY id DESC LIMIT 1")
+    logged = db.query_one("SELECT COUNT(*) FROM command_logs WHERE trace_id IS NOT NULL")[0]
+    stages = [span[0] for span in json.loads(row[2])]
+    print(f"سطرهای ردیابی شده: {logged}  نمونه: {row[0]} {row[1]}ms {stages}")
+
+    db.close()
+    tmp.cleanup()
+    ok = worst < 1 / 32 and logged == args.traces + args.commands and stages[-1] == 'total'
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
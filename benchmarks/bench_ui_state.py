@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+بنچمارک به‌روزرسانی رابط کاربری: انبار وضعیت با اعمال یک بار در هر فریم در برابر روش قبلی
+
+- هزینه thread اصلی برای هر فرمان با رشد طول جلسه، در روش قبلی (split و بازسازی متن
+  لاگ؛ که در عمل فقط آخرین فرمان را نگه می‌داشت) و در انبار وضعیت (تاریخچه حلقوی)
+- تعداد اعمال روی ویجت‌ها وقتی یک thread کاری با سرعت زیاد تغییر می‌فرستد
+
+استفاده:
+    python benchmarks/bench_ui_state.py [--commands 20000] [--fps 60]
+"""
+
+import os
+import sys
+import time
+import argparse
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from persian_assistant_complete import UIStateStore
+
+
+class FrameTrigger:
+    """جایگزین Clock.create_trigger: درخواست‌های بین دو فریم یک بار اجرا می‌شوند"""
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.pending = threading.Event()
+
+    def __call__(self):
+        self.pending.set()
+
+    def frame(self):
+        if self.pending.is_set():
+            self.pending.clear()
+            self.callback(0)
+
+
+class FakeLabel:
+    text = ''
+
+
+def legacy_show_command(label, text):
+    """پیاده‌سازی قبلی به‌روزرسانی لاگ فرمان"""
+    label.text = f"آخرین فرمان:\n{text}\n\n{label.text.split('آخرین فرمان')[0]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--commands', type=int, default=20000)
+    parser.add_argument('--fps', type=int, default=60)
+    args = parser.parse_args()
+
+    # هزینه هر فرمان روی thread اصلی در ابتدا و انتهای جلسه
+    label = FakeLabel()
+    label.text = 'آخرین فرمان‌ها:\n--------------------'
+    store_label = FakeLabel()
+    applied = []
+
+    def apply(delta):
+        applied.append(len(delta))
+        if 'history' in delta:
+            store_label.text = 'آخرین فرمان‌ها:\n--------------------\n' + '\n'.join(delta['history'])
+
+    store = UIStateStore(apply, make_trigger=lambda callback: (lambda: None))
+    checkpoints = {100, args.commands // 2, args.commands}
+    results = []
+    for i in range(1, args.commands + 1):
+        text = f'یادداشت کن خرید شماره {i}'
+        t0 = time.perf_counter()
+        legacy_show_command(label, text)
+        legacy_us = 1e6 * (time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        store.add_history(text)
+        store.flush()
+        store_us = 1e6 * (time.perf_counter() - t0)
+        if i in checkpoints:
+            results.append((i, legacy_us, store_us, label.text.count('خرید'), store_label.text.count('خرید')))
+    for i, legacy_us, store_us, legacy_shown, store_shown in results:
+        print(f"فرمان {i}: قبلی={legacy_us:.1f}µs ({legacy_shown} فرمان در لاگ)  "
+              f"انبار وضعیت={store_us:.1f}µs ({store_shown} فرمان در لاگ)")
+
+    # thread کاری پشت سر هم تغییر می‌فرستد و حلقه فریم اعمال می‌کند
+    applied.clear()
+    store = UIStateStore(apply, make_trigger=FrameTrigger, listening=False, command_count=0)
+    done = threading.Event()
+
+    def worker():
+        for i in range(args.commands):
+            store.update(listening=True, status='در حال گوش دادن...')
+            for j in range(5):
+                store.update(status=f'«جزئی {j}»')
+            store.add_history(f'فرمان {i}')
+            store.increment('command_count')
+            store.update(listening=False, status='آماده')
+        done.set()
+
+    t0 = time.perf_counter()
+    thread = threading.Thread(target=worker)
+    thread.start()
+    frames = 0
+    while not done.is_set():
+        time.sleep(1 / args.fps)
+        store.trigger.frame()
+        frames += 1
+    thread.join()
+    store.trigger.frame()
+    elapsed = time.perf_counter() - t0
+    print(f"{store.updates} تغییر از thread کاری در {elapsed:.2f}s: {store.flushes} بار اعمال روی "
+          f"ویجت‌ها در {frames} فریم")
+    ok = store.state['command_count'] == args.commands and store.flushes <= frames + 1 and \
+        len(store.history) == store.history.maxlen
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+بنچمارک مصرف CPU و تاخیر تشخیص کلمه بیدارباش از روی فایل‌های WAV
+
+استفاده:
+    python benchmarks/bench_wake_word.py --templates models/wake_word \
+        --positives fixtures/wake/pos --negatives fixtures/wake/neg
+
+بدون آرگومان، فایل‌های WAV مصنوعی در یک پوشه موقت ساخته می‌شوند.
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+import numpy as np
+import scipy.io.wavfile as wav
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from persian_assistant_complete import WakeWordDetector
+
+SAMPLE_RATE = 16000
+
+
+def synth_word(syllables, stretch=1.0, noise=40, seed=0):
+    """ساخت یک «کلمه» مصنوعی از هجاهای چند فرکانسی با سکوت اطراف"""
+    rnd = np.random.default_rng(seed)
+    parts = [np.zeros(int(0.5 * SAMPLE_RATE))]
+    for f1, f2 in syllables:
+        t = np.arange(int(0.16 * stretch * SAMPLE_RATE)) / SAMPLE_RATE
+        env = np.hanning(len(t))
+        parts.append(env * (3000 * np.sin(2 * np.pi * f1 * t) + 1500 * np.sin(2 * np.pi * f2 * t)))
+    parts.append(np.zeros(int(0.8 * SAMPLE_RATE)))
+    signal = np.concatenate(parts) + rnd.normal(0, noise, sum(len(p) for p in parts))
+    return np.clip(signal, -32768, 32767).astype(np.int16)
+
+
+def make_fixtures(root):
+    """ساخت پوشه‌های templates/positives/negatives با فایل‌های WAV مصنوعی"""
+    wake = [(300, 2200), (500, 1500), (700, 1100), (400, 2600)]
+    other = [(650, 1000), (250, 2400), (550, 1800)]
+    dirs = {name: os.path.join(root, name) for name in ('templates', 'positives', 'negatives')}
+    for d in dirs.values():
+        os.makedirs(d, exist_ok=True)
+    for i in range(3):
+        wav.write(os.path.join(dirs['templates'], f't{i}.wav'), SAMPLE_RATE, synth_word(wake, 1 + 0.05 * i, seed=i))
+    for i in range(20):
+        wav.write(os.path.join(dirs['positives'], f'p{i}.wav'), SAMPLE_RATE,
+                  synth_word(wake, 0.85 + 0.015 * i, noise=80, seed=100 + i))
+        wav.write(os.path.join(dirs['negatives'], f'n{i}.wav'), SAMPLE_RATE,
+                  synth_word(other, 0.85 + 0.015 * i, noise=80, seed=200 + i))
+    return dirs
+
+
+def read_dir(directory):
+    for name in sorted(os.listdir(directory)):
+        if name.endswith('.wav'):
+            rate, data = wav.read(os.path.join(directory, name))
+            if rate != SAMPLE_RATE:
+                print(f"⚠️ {name}: نرخ نمونه {rate} پشتیبانی نمی‌شود")
+                continue
+            yield name, data if data.ndim == 1 else data[:, 0]
+
+
+def run(detector, directory, block):
+    """پخش فایل‌ها به صورت بلوک به بلوک مثل callback میکروفون"""
+    hits, audio_seconds, cpu, match_times = 0, 0.0, 0.0, []
+    for name, data in read_dir(directory):
+        detector.reset()
+        audio_seconds += len(data) / SAMPLE_RATE
+        detected = False
+        for i in range(0, len(data), block):
+            c0 = time.process_time()
+            t0 = time.perf_counter()
+            fired = detector.process(data[i:i + block])
+            elapsed = time.perf_counter() - t0
+            cpu += time.process_time() - c0
+            if fired and not detected:
+                detected = True
+                match_times.append(elapsed)
+        hits += detected
+    return hits, audio_seconds, cpu, match_times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--templates')
+    parser.add_argument('--positives')
+    parser.add_argument('--negatives')
+    parser.add_argument('--threshold', type=float, default=0.35)
+    args = parser.parse_args()
+
+    tmp = None
+    if not (args.templates and args.positives and args.negatives):
+        tmp = tempfile.TemporaryDirectory()
+        dirs = make_fixtures(tmp.name)
+        args.templates = args.templates or dirs['templates']
+        args.positives = args.positives or dirs['positives']
+        args.negatives = args.negatives or dirs['negatives']
+
+    detector = WakeWordDetector(templates_dir=args.templates, threshold=args.threshold)
+    block = detector.frame_length
+
+    pos_hits, pos_sec, pos_cpu, match_times = run(detector, args.positives, block)
+    neg_hits, neg_sec, neg_cpu, _ = run(detector, args.negatives, block)
+    pos_files = sum(1 for _ in read_dir(args.positives))
+    neg_files = sum(1 for _ in read_dir(args.negatives))
+
+    total_sec = pos_sec + neg_sec
+    print(f"نمونه‌ها: {len(detector.templates)}  آستانه: {args.threshold}")
+    print(f"تشخیص درست: {pos_hits}/{pos_files}   هشدار اشتباه: {neg_hits}/{neg_files}")
+    print(f"CPU: {100 * (pos_cpu + neg_cpu) / total_sec:.2f}% از یک هسته ({total_sec:.1f} ثانیه صدا)")
+    if match_times:
+        match_times.sort()
+        print(f"زمان تطبیق بلوک تشخیص: p50={1000 * match_times[len(match_times) // 2]:.2f}ms "
+              f"max={1000 * match_times[-1]:.2f}ms")
+    print(f"تاخیر صوتی پس از پایان کلمه: {1000 * detector.hangover_frames * detector.frame_duration:.0f}ms (hangover)")
+
+    if tmp:
+        tmp.cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+بنچمارک سرویس هواشناسی در برابر یک سرور آزمایشی محلی با پاسخ شبیه Open-Meteo
+
+- پاسخ «هوا چطوره» از کش (هدف: زیر ۱۰ میلی‌ثانیه) در برابر دریافت مستقیم
+- استفاده دوباره از اتصال با Session مشترک (تعداد اتصال‌های TCP سرور)
+- پاسخ کهنه فوری و تازه‌سازی در پس‌زمینه بعد از گذشت TTL
+- ادامه پاسخ از کش وقتی سرور از دسترس خارج می‌شود
+
+سرور آزمایشی را می‌توان جدا اجرا کرد و weather_url تنظیمات برنامه را به آن داد:
+    python benchmarks/bench_weather.py --serve 8765
+
+استفاده:
+    python benchmarks/bench_weather.py [--latency-ms 80] [--queries 2000]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from persian_assistant_complete import CommandProcessor, Database, WeatherProvider, WeatherService
+
+
+class FixtureWeatherProvider(WeatherProvider):
+    """منبع ثابت بدون شبکه برای بنچمارک‌هایی که فرمان هوا را هم اجرا می‌کنند"""
+
+    name = 'fixture'
+
+    def __init__(self, session=None, config=None):
+        super().__init__(session, config)
+
+    def fetch(self, lat, lon):
+        return {'temp': 24.0, 'condition': 'نیمه ابری', 'wind': 11.5}
+
+
+class StubWeatherServer(ThreadingHTTPServer):
+    """سرور محلی با پاسخ /v1/forecast شبیه Open-Meteo، تاخیر قابل تنظیم و شمارش درخواست و اتصال"""
+
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=0.0):
+        super().__init__(('127.0.0.1', port), StubWeatherHandler)
+        self.latency = latency
+        self.requests = 0
+        self.connections = 0
+        self.temperature = 24.0
+        self.available = True
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}/v1/forecast'
+
+
+class StubWeatherHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 تا اتصال keep-alive بماند؛ بدون Nagle تا سرآیند و بدنه جدا تاخیر نگیرند
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_GET(self):
+        self.server.requests += 1
+        query = parse_qs(urlparse(self.path).query)
+        time.sleep(self.server.latency)
+        if not self.server.available:
+            self.send_error(503)
+            return
+        body = json.dumps({
+            'latitude': float(query['latitude'][0]),
+            'longitude': float(query['longitude'][0]),
+            'current': {'temperature_2m': self.server.temperature, 'weather_code': 2, 'wind_speed_10m': 11.5},
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def percentiles(latencies):
+    latencies = sorted(latencies)
+    return 1000 * latencies[len(latencies) // 2], 1000 * latencies[int(len(latencies) * 0.99)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--latency-ms', type=float, default=80)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--serve', type=int, metavar='PORT', help='فقط اجرای سرور آزمایشی روی این پورت')
+    args = parser.parse_args()
+
+    server = StubWeatherServer(args.serve or 0, args.latency_ms / 1000)
+    if args.serve:
+        print(f"سرور آزمایشی هواشناسی: {server.url}")
+        server.serve_forever()
+        return
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    import tempfile
+    tmp = tempfile.TemporaryDirectory()
+    db = Database(os.path.join(tmp.name, 'assistant.db'))
+    db.init_tables()
+    config = {'weather_url': server.url, 'weather_ttl': 600}
+    weather = WeatherService(config)
+    processor = CommandProcessor(db, weather_service=weather)
+    ok = True
+
+    # دریافت مستقیم (هر بار درخواست به سرور)
+    latencies = []
+    for _ in range(10):
+        t0 = time.perf_counter()
+        weather.refresh(weather.cache_key(*weather.config['weather_location']))
+        latencies.append(time.perf_counter() - t0)
+    direct_p50, direct_p99 = percentiles(latencies)
+    print(f"دریافت مستقیم: p50={direct_p50:.1f}ms p99={direct_p99:.1f}ms  "
+          f"درخواست‌ها={server.requests} اتصال‌ها={server.connections}")
+    ok = ok and server.connections == 1
+
+    # پاسخ فرمان از کش
+    latencies = []
+    for _ in range(args.queries):
+        t0 = time.perf_counter()
+        result = processor.process('هوا چطوره')
+        latencies.append(time.perf_counter() - t0)
+    cached_p50, cached_p99 = percentiles(latencies)
+    print(f"«هوا چطوره» از کش: p50={cached_p50:.3f}ms p99={cached_p99:.3f}ms  پاسخ: {result['response']}")
+    ok = ok and result['success'] and cached_p99 < 10
+
+    # کهنه شدن: پاسخ فوری قدیمی و تازه‌سازی پس‌زمینه
+    weather.config['weather_ttl'] = 0
+    server.temperature = 30.0
+    requests_before = server.requests
+    t0 = time.perf_counter()
+    stale = processor.process('هوا چطوره')['response']
+    stale_ms = 1000 * (time.perf_counter() - t0)
+    time.sleep(2 * args.latency_ms / 1000 + 0.2)
+    weather.config['weather_ttl'] = 600
+    fresh = processor.process('هوا چطوره')['response']
+    print(f"بعد از TTL: پاسخ کهنه در {stale_ms:.2f}ms «{stale}» سپس «{fresh}» "
+          f"(درخواست‌های پس‌زمینه={server.requests - requests_before})")
+    ok = ok and '24' in stale and '30' in fresh and server.requests - requests_before == 1
+
+    # سرور از دسترس خارج می‌شود
+    server.available = False
+    weather.config['weather_ttl'] = 0
+    down = processor.process('هوا چطوره')
+    time.sleep(2 * args.latency_ms / 1000 + 0.2)
+    print(f"سرور خاموش: {down['response']}  خطاهای تازه‌سازی={weather.stats()['errors']}")
+    ok = ok and down['success'] and weather.stats()['errors'] == 1
+
+    # مکان دیگر بدون کش و بدون سرور: خطای قابل فهم
+    weather.config['weather_location'] = [29.6, 52.5]
+    missing = processor.process('هوا چطوره')
+    print(f"بدون کش و سرور: {missing.get('error')}  آمار: {weather.stats()}")
+    ok = ok and not missing['success']
+
+    server.shutdown()
+    server.server_close()
+    db.close()
+    tmp.cleanup()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+ارزیابی آفلاین موتور تشخیص گفتار روی فایل‌های WAV ضبط شده
+
+هر فایل fixtures/asr/NAME.wav می‌تواند یک متن مرجع در NAME.txt داشته باشد.
+
+استفاده:
+    python benchmarks/eval_asr.py fixtures/asr [--backend vosk] [--model models/vosk-model-small-fa-0.5]
+"""
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from persian_assistant_complete import DEFAULT_CONFIG, SpeechRecognizer
+
+
+def word_errors(reference, hypothesis):
+    """فاصله ویرایشی در سطح کلمه"""
+    ref, hyp = reference.split(), hypothesis.split()
+    row = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        prev, row[0] = row[0], i
+        for j, h in enumerate(hyp, 1):
+            prev, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, prev + (r != h))
+    return row[-1], len(ref)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('fixtures')
+    parser.add_argument('--backend', default=DEFAULT_CONFIG['asr_offline'])
+    parser.add_argument('--model')
+    args = parser.parse_args()
+
+    config = dict(DEFAULT_CONFIG, asr_mode='offline', asr_offline=args.backend, asr_model=args.model)
+
+    started = time.monotonic()
+    recognizer = SpeechRecognizer(config)
+    recognizer.offline.loaded.wait()
+    if not recognizer.offline.ready.is_set():
+        print("❌ موتور آفلاین بارگذاری نشد (مدل یا کتابخانه موجود نیست)")
+        sys.exit(1)
+    print(f"بارگذاری مدل: {time.monotonic() - started:.2f} ثانیه")
+
+    errors = words = 0
+    latencies = []
+    for name in sorted(os.listdir(args.fixtures)):
+        if not name.endswith('.wav'):
+            continue
+        path = os.path.join(args.fixtures, name)
+        t0 = time.perf_counter()
+        text = recognizer.recognize_file(path) or ''
+        latencies.append(time.perf_counter() - t0)
+
+        ref_path = path[:-4] + '.txt'
+        line = f"{name}: {latencies[-1] * 1000:.0f}ms «{text}»"
+        if os.path.exists(ref_path):
+            with open(ref_path, encoding='utf-8') as f:
+                e, n = word_errors(f.read().strip(), text)
+            errors, words = errors + e, words + n
+            line += f" خطا={e}/{n}"
+        print(line)
+
+    if not latencies:
+        print("فایل WAV پیدا نشد")
+        return
+    warm = sorted(latencies[1:]) or latencies
+    print(f"\nاولین جمله: {latencies[0] * 1000:.0f}ms   جمله‌های بعدی (p50): {warm[len(warm) // 2] * 1000:.0f}ms")
+    if words:
+        print(f"WER: {100 * errors / words:.1f}%")
+
+
+if __name__ == '__main__':
+    main()
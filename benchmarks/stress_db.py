@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+تست فشار همزمانی لایه پایگاه داده
+
+پردازش فرمان، بررسی یادآوری‌ها و نوشتن لاگ به صورت موازی روی یک فایل SQLite
+اجرا می‌شوند و یک thread «UI» تاخیر خواندن را اندازه می‌گیرد. اگر نوشتنی گم یا
+تکرار شود، یادآوری‌ای اعلام نشود یا بیش از یک بار اعلام شود، خطایی رخ دهد یا
+p99 خواندن UI از سقف بیشتر شود کد خروج ۱ است.
+
+استفاده:
+    python benchmarks/stress_db.py [--commands 500] [--workers 4] [--max-read-ms 50]
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from persian_assistant_complete import CommandProcessor, Database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--commands', type=int, default=500)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--max-read-ms', type=float, default=50, help='سقف p99 خواندن UI')
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    db = Database(os.path.join(tmp.name, 'assistant.db'))
+    db.init_tables()
+    db.add_sample_data()
+    processor = CommandProcessor(db)
+
+    errors = []
+    stop = threading.Event()
+    read_latencies = []
+    fired = []
+
+    def guarded(func):
+        def run(*a):
+            try:
+                func(*a)
+            except Exception as e:
+                errors.append(repr(e))
+        return run
+
+    @guarded
+    def commands(worker):
+        for i in range(args.commands):
+            for text in (f'یادداشت کن کار {worker}-{i}', f'یادت باشه تماس {worker}-{i}', 'با علی تماس بگیر'):
+                result = processor.process(text)
+                if not result['success']:
+                    errors.append(result.get('error'))
+
+    def poll_reminders():
+        # همه یادآوری‌ها را «موعد رسیده» فرض می‌کنیم تا مسیر UPDATE هم زیر فشار باشد
+        due = db.query(
+            "SELECT id FROM reminders WHERE reminder_time <= ? AND is_completed = 0",
+            (datetime.now() + timedelta(hours=1),)
+        )
+        if due:
+            db.executemany("UPDATE reminders SET is_completed = 1 WHERE id = ?", due)
+            fired.extend(row[0] for row in due)
+
+    @guarded
+    def reminder_poller():
+        while not stop.is_set():
+            poll_reminders()
+            time.sleep(0.005)
+
+    @guarded
+    def log_writer():
+        for i in range(args.commands * 3):
+            db.execute("INSERT INTO command_logs (command_type, success) VALUES (?, ?)", ('stress', True))
+
+    @guarded
+    def ui_reader():
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            db.query("SELECT content, created_at FROM notes ORDER BY created_at DESC LIMIT 10")
+            db.query("SELECT COUNT(*) FROM command_logs")
+            read_latencies.append(time.perf_counter() - t0)
+            time.sleep(0.002)
+
+    background = [threading.Thread(target=reminder_poller), threading.Thread(target=ui_reader)]
+    workers = [threading.Thread(target=commands, args=(w,)) for w in range(args.workers)]
+    workers += [threading.Thread(target=log_writer) for _ in range(2)]
+
+    started = time.perf_counter()
+    for t in background + workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for t in background:
+        t.join()
+    # یادداشت‌ها ناهمگام ثبت می‌شوند؛ شمارش پس از خالی شدن صف نویسنده
+    db.transaction(lambda conn: None)
+    guarded(poll_reminders)()
+
+    expected = args.workers * args.commands
+    tags = {f'{worker}-{i}' for worker in range(args.workers) for i in range(args.commands)}
+    # هر نوشتن دقیقا یک بار: گم شده‌ها و تکراری‌ها جدا شمرده می‌شوند
+    notes = [row[0] for row in db.query("SELECT content FROM notes WHERE content LIKE 'کار %'")]
+    reminders = [row[0] for row in db.query("SELECT title FROM reminders WHERE title LIKE 'تماس %'")]
+    lost_notes = len(tags - {content.split()[-1] for content in notes})
+    lost_reminders = len(tags - {title.split()[-1] for title in reminders})
+    pending = db.query_one("SELECT COUNT(*) FROM reminders WHERE is_completed = 0")[0]
+    logs = db.query_one("SELECT COUNT(*) FROM command_logs")[0]
+    read_latencies.sort()
+    read_p99 = 1000 * read_latencies[int(len(read_latencies) * 0.99)]
+
+    print(f"زمان کل: {elapsed:.2f} ثانیه، {3 * expected / elapsed:.0f} فرمان در ثانیه")
+    print(f"یادداشت‌ها: {len(notes)}/{expected} (گم شده {lost_notes})  "
+          f"یادآوری‌ها: {len(reminders)}/{expected} (گم شده {lost_reminders})  "
+          f"اعلام شده: {len(fired)} (تکراری {len(fired) - len(set(fired))}، اعلام نشده {pending})  "
+          f"لاگ‌ها: {logs}/{args.commands * 6}")
+    print(f"خواندن UI: p50={1000 * read_latencies[len(read_latencies) // 2]:.2f}ms "
+          f"p99={read_p99:.2f}ms max={1000 * read_latencies[-1]:.2f}ms")
+    print(f"خطاها: {len(errors)}" + (f" (اولین: {errors[0]})" if errors else ""))
+
+    db.close()
+    tmp.cleanup()
+    ok = (not errors and len(notes) == len(reminders) == expected and lost_notes == lost_reminders == 0
+          and len(fired) == len(set(fired)) == expected and pending == 0 and logs == args.commands * 6
+          and read_p99 <= args.max_read_ms)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
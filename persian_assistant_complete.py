@@ -8,18 +8,113 @@ import sys
 import json
 import sqlite3
 import threading
+import weakref
 import queue
 import time
+import math
+import random
+import mmap
 import re
+import heapq
+import importlib
+import importlib.util
+from collections import Counter, deque
+from itertools import chain, count
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 
+# ========== پروفایل راه‌اندازی ==========
+class StartupProfiler:
+    """زمان‌بندی راه‌اندازی: importها، آماده شدن سرویس‌ها، اولین فریم و اولین فرمان"""
+    
+    def __init__(self):
+        self.started = time.monotonic()
+        self.process_age = self.read_process_age()
+        self.marks = {}
+        self.imports = []
+        self.lock = threading.Lock()
+        
+    @staticmethod
+    def read_process_age():
+        """زمان گذشته از شروع فرایند تا import این ماژول (فقط لینوکس/اندروید)"""
+        try:
+            with open('/proc/self/stat') as f:
+                start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+            with open('/proc/uptime') as f:
+                uptime = float(f.read().split()[0])
+            return max(0.0, uptime - start_ticks / os.sysconf('SC_CLK_TCK'))
+        except (OSError, ValueError, IndexError, AttributeError):
+            return None
+            
+    def elapsed(self):
+        return time.monotonic() - self.started
+        
+    def mark(self, name):
+        """ثبت اولین رخداد یک مرحله (ثانیه از import ماژول)"""
+        with self.lock:
+            self.marks.setdefault(name, self.elapsed())
+            
+    def record_import(self, module, seconds):
+        """ثبت زمان import و threadی که آن را انجام داد"""
+        with self.lock:
+            self.imports.append((module, seconds, threading.current_thread().name))
+            
+    def report(self):
+        """گزارش قابل ذخیره (میلی‌ثانیه)"""
+        with self.lock:
+            return {
+                'process_before_import_ms': round(1000 * self.process_age) if self.process_age is not None else None,
+                'marks_ms': {name: round(1000 * t) for name, t in sorted(self.marks.items(), key=lambda m: m[1])},
+                'imports_ms': [(module, round(1000 * seconds, 1), thread) for module, seconds, thread in self.imports],
+            }
+
+STARTUP = StartupProfiler()
+
+class LazyImport:
+    """import تنبل: ماژول (یا یک نام از آن) در اولین استفاده بارگذاری و در همین شیء نگه داشته می‌شود"""
+    
+    # نام ویژگی‌ها پیشوند دارد تا با ویژگی‌های ماژول هدف (مثل SoundLoader.load) تداخل نکند
+    def __init__(self, module, attr=None):
+        self.lazy_module = module
+        self.lazy_attr = attr
+        self.lazy_target = None
+        self.lazy_lock = threading.Lock()
+        
+    def lazy_load(self):
+        """ماژول یا نام هدف؛ فقط اولین فراخوانی import می‌کند"""
+        target = self.lazy_target
+        if target is None:
+            with self.lazy_lock:
+                if self.lazy_target is None:
+                    started = time.monotonic()
+                    target = importlib.import_module(self.lazy_module)
+                    if self.lazy_attr:
+                        target = getattr(target, self.lazy_attr)
+                    STARTUP.record_import(self.lazy_module, time.monotonic() - started)
+                    self.lazy_target = target
+                target = self.lazy_target
+        return target
+        
+    def __getattr__(self, name):
+        return getattr(self.lazy_load(), name)
+        
+    def __call__(self, *args, **kwargs):
+        return self.lazy_load()(*args, **kwargs)
+
 # ========== تنظیمات اولیه ==========
 os.environ['KIVY_AUDIO'] = 'ffpyplayer'
 os.environ['KIVY_VIDEO'] = 'ffpyplayer'
 
 # ========== وارد کردن کتابخانه‌ها ==========
+# هسته (پایگاه داده، پردازش فرمان، تشخیص گفتار) بدون رابط کاربری و سخت‌افزار صدا هم
+# وارد می‌شود؛ با ASSISTANT_HEADLESS=1 یا در حالت batch و build-roads کیوی اصلا import نمی‌شود
+# تا پنجره‌ای باز نشود (worker‌های batch هم همین sys.argv را می‌بینند)
+HEADLESS = os.environ.get('ASSISTANT_HEADLESS') == '1' or sys.argv[1:2] in (['batch'], ['build-roads'])
+MISSING_LIBS = []
+
 try:
+    if HEADLESS:
+        raise ImportError("حالت بدون رابط کاربری (ASSISTANT_HEADLESS=1)")
     import kivy
     kivy.require('2.2.1')
     from kivy.app import App
@@ -27,144 +122,654 @@ try:
     from kivy.uix.boxlayout import BoxLayout
     from kivy.uix.popup import Popup
     from kivy.uix.button import Button
+    from kivy.uix.recycleview import RecycleView
+    from kivy.uix.recycleboxlayout import RecycleBoxLayout
+    from kivy.metrics import dp
     from kivy.clock import Clock
     from kivy.core.window import Window
-    from kivy.core.audio import SoundLoader
     from kivy.properties import StringProperty, BooleanProperty, NumericProperty
     from kivy.lang import Builder
     from kivy.logger import Logger
+except ImportError as e:
+    MISSING_LIBS.append(str(e))
+    # جایگزین‌های حداقلی تا کلاس‌ها بدون کیوی هم تعریف شوند
+    import logging
+    Logger = logging.getLogger('assistant')
+    App = object
+    StringProperty = BooleanProperty = NumericProperty = lambda default=None: default
+STARTUP.mark('ui_imported')
+
+# کتابخانه‌های سنگین غیر UI در اولین استفاده (معمولا در thread راه‌اندازی) بارگذاری
+# می‌شوند تا رابط کاربری زودتر نمایش داده شود؛ اینجا فقط وجودشان بررسی می‌شود
+# این نام‌ها همیشه همین شیءهای واسط می‌مانند و globals ماژول عوض نمی‌شود
+np = LazyImport('numpy')
+requests = LazyImport('requests')
+sr = LazyImport('speech_recognition')
+sd = LazyImport('sounddevice')
+gTTS = LazyImport('gtts', 'gTTS')
+pygame = LazyImport('pygame')
+notification = LazyImport('plyer', 'notification')
+SoundLoader = LazyImport('kivy.core.audio', 'SoundLoader')
+
+MISSING_LIBS += [
+    f"No module named '{name}'"
+    for name in ('numpy', 'requests', 'speech_recognition', 'sounddevice', 'gtts', 'pygame', 'plyer')
+    if importlib.util.find_spec(name) is None
+]
+
+HAS_LIBS = not MISSING_LIBS
+
+# ========== تنظیمات قابل تغییر ==========
+DEFAULT_CONFIG = {
+    'asr_mode': 'auto',        # auto: اول آنلاین بعد آفلاین | online | offline | hedged
+    'asr_online': 'google',    # موتور آنلاین از ASR_BACKENDS
+    'asr_offline': 'vosk',     # موتور آفلاین از ASR_BACKENDS
+    'asr_model': None,         # مسیر مدل آفلاین؛ None یعنی جستجو در models/
+    'asr_load_timeout': 10,    # حداکثر انتظار برای بارگذاری مدل آفلاین (ثانیه)
+    'asr_http_url': None,      # آدرس سرور تشخیص گفتار برای موتور http
+    'asr_hedge_delay': 0.3,    # حالت hedged: تاخیر شروع موتور دوم (ثانیه)
+    'asr_deadline': 4.0,       # حالت hedged: حداکثر انتظار برای نتیجه (ثانیه)
+    'asr_min_confidence': 0.6, # حالت hedged: حداقل اطمینان برای پذیرش فوری
+    'asr_workers': 4,          # worker‌های مشترک تشخیص جریانی و موتورهای hedged
+    'weather_provider': 'open-meteo',        # منبع داده از WEATHER_PROVIDERS
+    'weather_url': None,                     # آدرس دیگر برای منبع (مثلا سرور آزمایشی محلی)
+    'weather_location': [35.6892, 51.3890],  # عرض و طول جغرافیایی پیش‌فرض (تهران)
+    'weather_ttl': 600,                      # عمر داده تازه در کش (ثانیه)
+    'weather_max_stale': 3 * 3600,           # تا این سن داده کهنه داده و در پس‌زمینه تازه می‌شود
+    'weather_timeout': 3.0,                  # حداکثر انتظار برای پاسخ منبع (ثانیه)
+    'weather_retry_after': 60,               # بعد از خطا تا این مدت درخواست دوباره فرستاده نمی‌شود
+    'navigation_graph': 'models/roads',      # پوشه گراف جاده‌ای ساخته شده با build-roads
+    'navigation_origin': None,               # مبدا پیش‌فرض مسیر؛ None یعنی weather_location
+}
+
+def load_config(path='data/config.json'):
+    """خواندن تنظیمات کاربر روی مقادیر پیش‌فرض"""
+    config = dict(DEFAULT_CONFIG)
+    try:
+        with open(path, encoding='utf-8') as f:
+            config.update(json.load(f))
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError) as e:
+        print(f"خطا در خواندن تنظیمات {path}: {e}")
+    return config
+
+# ========== نرمال‌سازی متن فارسی ==========
+# یکسان‌سازی حروف عربی/فارسی، حذف اعراب، کشیده و نیم‌فاصله و تبدیل ارقام
+PERSIAN_CHAR_MAP = str.maketrans({
+    'ي': 'ی', 'ى': 'ی', 'ك': 'ک', 'ة': 'ه', 'ۀ': 'ه',
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا', 'ؤ': 'و',
+    '\u200c': '', '\u200d': '', '\u0640': '', '\u0670': '',
+    **{chr(c): '' for c in range(0x064B, 0x0653)},
+    **{d: str(i) for i, d in enumerate('۰۱۲۳۴۵۶۷۸۹')},
+    **{d: str(i) for i, d in enumerate('٠١٢٣٤٥٦٧٨٩')},
+    '٫': '.', '٬': ',',
+})
+
+def normalize_persian(text):
+    """شکل استاندارد متن فارسی برای مقایسه و جستجو"""
+    return ' '.join(text.translate(PERSIAN_CHAR_MAP).lower().split())
+
+# عددهای نوشته شده با حروف (به شکل نرمال‌شده)
+PERSIAN_NUMBERS = {normalize_persian(word): value for word, value in {
+    'صفر': 0, 'یک': 1, 'یه': 1, 'دو': 2, 'سه': 3, 'چهار': 4, 'پنج': 5, 'شش': 6, 'شیش': 6,
+    'هفت': 7, 'هشت': 8, 'نه': 9, 'ده': 10, 'یازده': 11, 'دوازده': 12, 'سیزده': 13,
+    'چهارده': 14, 'پانزده': 15, 'پونزده': 15, 'شانزده': 16, 'شونزده': 16, 'هفده': 17,
+    'هجده': 18, 'هیجده': 18, 'نوزده': 19, 'بیست': 20, 'سی': 30, 'چهل': 40, 'پنجاه': 50,
+    'شصت': 60, 'هفتاد': 70, 'هشتاد': 80, 'نود': 90, 'صد': 100, 'یکصد': 100, 'دویست': 200,
+    'سیصد': 300, 'چهارصد': 400, 'پانصد': 500, 'پونصد': 500, 'ششصد': 600, 'هفتصد': 700,
+    'هشتصد': 800, 'نهصد': 900, 'نیم': 0.5,
+}.items()}
+PERSIAN_SCALES = {'هزار': 10 ** 3, 'میلیون': 10 ** 6, 'ملیون': 10 ** 6, 'میلیارد': 10 ** 9}
+CURRENCY_FACTORS = {'تومان': 1, 'تومن': 1, 'ریال': 0.1}
+
+def parse_persian_amount(text):
+    """استخراج مبلغ به تومان از متن فارسی؛ (مبلغ float یا None، بقیه کلمه‌ها)"""
+    words = text.split()
+    # جداکننده هزارگان «،» و «٬» مثل «,» است؛ ویرگول چسبیده به آخر کلمه هم کنار می‌رود
+    keys = [normalize_persian(word).replace('،', ',').strip(',') for word in words]
     
-    import numpy as np
-    import sounddevice as sd
-    import requests
-    from gtts import gTTS
-    import pygame
-    from plyer import notification, gps, accelerometer
-    import speech_recognition as sr
+    def value(key):
+        if key in PERSIAN_NUMBERS:
+            return PERSIAN_NUMBERS[key]
+        if re.fullmatch(r'\d+(?:,\d{3})*(?:\.\d+)?', key):
+            return float(key.replace(',', ''))
+        return None
+        
+    def numeric(key):
+        return value(key) is not None or key in PERSIAN_SCALES
+        
+    def read(start):
+        """خواندن یک دنباله عدد/مقیاس مثل «دو میلیون و پانصد هزار» و واحد پول بعد از آن"""
+        total = current = 0
+        end = start
+        while end < len(keys):
+            key = keys[end]
+            number = value(key)
+            if number is not None:
+                # «سه صد» یعنی ۳۰۰، نه ۱۰۳
+                current = current * number if number == 100 and 0 < current < 10 else current + number
+            elif key in PERSIAN_SCALES:
+                total += (current or 1) * PERSIAN_SCALES[key]
+                current = 0
+            elif not (key == 'و' and end + 1 < len(keys) and numeric(keys[end + 1])):
+                break
+            end += 1
+        amount = total + current
+        has_currency = end < len(keys) and keys[end] in CURRENCY_FACTORS
+        if has_currency:
+            amount *= CURRENCY_FACTORS[keys[end]]
+            end += 1
+        return has_currency, amount, start, end
+        
+    # «یه» و «نه» هم عددند؛ تنها و بدون واحد پول مبلغ حساب نمی‌شوند و از بقیه
+    # دنباله‌ها آن که واحد پول دارد یا بزرگ‌ترین انتخاب می‌شود
+    runs = []
+    i = 0
+    while i < len(keys):
+        if numeric(keys[i]):
+            run = read(i)
+            if run[0] or run[3] - i > 1 or keys[i] not in ('یه', 'یک', 'نه'):
+                runs.append(run)
+            i = run[3]
+        else:
+            i += 1
+    if not runs:
+        return None, words
+    has_currency, amount, start, end = max(runs, key=lambda run: run[:2])
+    # مبلغ همیشه float است، چه با حروف گفته شده باشد چه با رقم
+    return float(amount), words[:start] + words[end:]
+
+# ========== لایه دسترسی به پایگاه داده ==========
+class ReaderSlot:
+    """نگهدارنده اتصال خواندن یک thread (قابل weakref تا بسته شدنش با پایان thread)"""
+    __slots__ = ('conn', '__weakref__')
     
-    HAS_LIBS = True
-except ImportError as e:
-    print(f"کتابخانه‌های مورد نیاز نصب نیستند: {e}")
-    HAS_LIBS = False
+    def __init__(self, conn):
+        self.conn = conn
 
-# ========== کلاس اصلی دستیار ==========
-class PersianVoiceAssistant(App):
-    """کلاس اصلی اپلیکیشن دستیار صوتی"""
+class Database:
+    """دسترسی امن بین threadها به SQLite: اتصال جدا برای خواندن در هر thread و یک نویسنده واحد"""
     
-    # Properties برای UI
-    status_text = StringProperty("آماده... بگویید: سلام دستیار")
-    is_listening = BooleanProperty(False)
-    is_premium = BooleanProperty(False)
-    command_count = NumericProperty(0)
+    PRAGMAS = [
+        "PRAGMA synchronous = NORMAL",
+        "PRAGMA busy_timeout = 5000",
+        "PRAGMA temp_store = MEMORY",
+        "PRAGMA cache_size = -8000"
+    ]
     
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        self.setup_directories()
-        self.setup_database()
-        self.setup_services()
+    # ایندکس متنی یادداشت‌ها روی ستون body (متن نرمال‌شده که نویسنده پر می‌کند، مثل add_note)؛
+    # تریگرها فقط SQL ساده‌اند تا هر اتصالی (حتی بدون تابع‌های پایتونی) بتواند بنویسد. اگر
+    # نویسنده‌ای body را پر نکند متن خام ایندکس می‌شود و تغییر content بدون body، body کهنه را
+    # پاک می‌کند. تریگرهای قدیمی که normalize_fa را صدا می‌زدند جایگزین می‌شوند؛ آخرین دستور
+    # یادداشت‌های قدیمی‌تر از ساخت ایندکس را اضافه می‌کند
+    NOTES_FTS_SCHEMA = '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+            body,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3 4'
+        );
+        DROP TRIGGER IF EXISTS notes_fts_insert;
+        DROP TRIGGER IF EXISTS notes_fts_update;
+        CREATE TRIGGER IF NOT EXISTS notes_fts_insert AFTER INSERT ON notes BEGIN
+            INSERT INTO notes_fts (rowid, body) VALUES (new.id, COALESCE(new.body, new.content));
+        END;
+        CREATE TRIGGER IF NOT EXISTS notes_fts_update AFTER UPDATE OF content, body ON notes BEGIN
+            UPDATE notes SET body = NULL
+                WHERE id = new.id AND new.body IS old.body AND new.content IS NOT old.content;
+            UPDATE notes_fts SET body = (SELECT COALESCE(body, content) FROM notes WHERE id = new.id)
+                WHERE rowid = new.id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS notes_fts_delete AFTER DELETE ON notes BEGIN
+            DELETE FROM notes_fts WHERE rowid = old.id;
+        END;
+        INSERT INTO notes_fts (rowid, body)
+            SELECT id, COALESCE(body, content) FROM notes
+            WHERE id > (SELECT COALESCE(MAX(rowid), 0) FROM notes_fts);
+    '''
+    # رتبه‌بندی bm25 فقط روی این تعداد از جدیدترین یادداشت‌های منطبق
+    NOTES_RANK_WINDOW = 1000
+    
+    # جدول‌هایی که تریگرهای اطلاع از تغییرشان هنگام init_tables ساخته می‌شود
+    WATCHED_TABLES = ('notes', 'contacts')
+    # تریگرهای موقت (فقط روی اتصال نویسنده) که تغییر هر سطر را به row_changed خبر می‌دهند
+    WATCH_TRIGGERS = '''
+        CREATE TEMP TRIGGER IF NOT EXISTS watch_{table}_insert AFTER INSERT ON main.{table} BEGIN
+            SELECT row_changed('{table}', 'insert', new.id);
+        END;
+        CREATE TEMP TRIGGER IF NOT EXISTS watch_{table}_update AFTER UPDATE ON main.{table} BEGIN
+            SELECT row_changed('{table}', 'update', new.id);
+        END;
+        CREATE TEMP TRIGGER IF NOT EXISTS watch_{table}_delete AFTER DELETE ON main.{table} BEGIN
+            SELECT row_changed('{table}', 'delete', old.id);
+        END;
+    '''
+    
+    # جدول‌های تجمیعی هزینه (روزانه، ماهانه، هر دسته) که تریگرها در همان تراکنش
+    # درج به‌روز می‌کنند؛ دو دستور آخر هزینه‌های ثبت شده قبل از ساخت آن‌ها را یک بار جمع می‌زنند
+    EXPENSE_ROLLUP_SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS expense_daily (
+            day TEXT NOT NULL,
+            category TEXT NOT NULL,
+            total REAL NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (day, category)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS expense_monthly (
+            month TEXT NOT NULL,
+            category TEXT NOT NULL,
+            total REAL NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (month, category)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS expense_category (
+            category TEXT PRIMARY KEY,
+            total REAL NOT NULL,
+            count INTEGER NOT NULL
+        ) WITHOUT ROWID;
+        CREATE TRIGGER IF NOT EXISTS expenses_rollup_insert AFTER INSERT ON expenses BEGIN
+            INSERT INTO expense_daily VALUES (date(new.created_at), new.category, new.amount, 1)
+                ON CONFLICT (day, category) DO UPDATE SET total = total + excluded.total, count = count + 1;
+            INSERT INTO expense_monthly VALUES (strftime('%Y-%m', new.created_at), new.category, new.amount, 1)
+                ON CONFLICT (month, category) DO UPDATE SET total = total + excluded.total, count = count + 1;
+            INSERT INTO expense_category VALUES (new.category, new.amount, 1)
+                ON CONFLICT (category) DO UPDATE SET total = total + excluded.total, count = count + 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS expenses_rollup_delete AFTER DELETE ON expenses BEGIN
+            UPDATE expense_daily SET total = total - old.amount, count = count - 1
+                WHERE day = date(old.created_at) AND category = old.category;
+            UPDATE expense_monthly SET total = total - old.amount, count = count - 1
+                WHERE month = strftime('%Y-%m', old.created_at) AND category = old.category;
+            UPDATE expense_category SET total = total - old.amount, count = count - 1
+                WHERE category = old.category;
+        END;
+        CREATE TRIGGER IF NOT EXISTS expenses_rollup_update AFTER UPDATE OF amount, category, created_at ON expenses BEGIN
+            UPDATE expense_daily SET total = total - old.amount, count = count - 1
+                WHERE day = date(old.created_at) AND category = old.category;
+            UPDATE expense_monthly SET total = total - old.amount, count = count - 1
+                WHERE month = strftime('%Y-%m', old.created_at) AND category = old.category;
+            UPDATE expense_category SET total = total - old.amount, count = count - 1
+                WHERE category = old.category;
+            INSERT INTO expense_daily VALUES (date(new.created_at), new.category, new.amount, 1)
+                ON CONFLICT (day, category) DO UPDATE SET total = total + excluded.total, count = count + 1;
+            INSERT INTO expense_monthly VALUES (strftime('%Y-%m', new.created_at), new.category, new.amount, 1)
+                ON CONFLICT (month, category) DO UPDATE SET total = total + excluded.total, count = count + 1;
+            INSERT INTO expense_category VALUES (new.category, new.amount, 1)
+                ON CONFLICT (category) DO UPDATE SET total = total + excluded.total, count = count + 1;
+        END;
+        INSERT INTO expense_daily
+            SELECT date(created_at), category, SUM(amount), COUNT(*) FROM expenses
+            WHERE NOT EXISTS (SELECT 1 FROM expense_category) GROUP BY 1, 2;
+        INSERT INTO expense_monthly
+            SELECT strftime('%Y-%m', created_at), category, SUM(amount), COUNT(*) FROM expenses
+            WHERE NOT EXISTS (SELECT 1 FROM expense_category) GROUP BY 1, 2;
+        INSERT INTO expense_category
+            SELECT category, SUM(amount), COUNT(*) FROM expenses
+            WHERE NOT EXISTS (SELECT 1 FROM expense_category) GROUP BY 1;
+    '''
+    
+    def __init__(self, path, batch_size=64):
+        self.uri = False
+        if path == ':memory:':
+            # هر اتصال :memory: پایگاه جدایی است؛ برای اشتراک از حافظه مشترک استفاده می‌شود
+            path = f'file:assistant_{id(self)}?mode=memory&cache=shared'
+            self.uri = True
+        self.path = path
+        self.batch_size = batch_size
+        self.local = threading.local()
+        self.has_fts = False
+        self.connections = []
+        self.connections_lock = threading.Lock()
+        self.watchers = {}
+        self.watched = set()
+        self.changes = []
         
-        # حالت‌های برنامه
-        self.is_muted = False
-        self.is_sleeping = False
-        self.current_volume = 0.5
+        self.write_conn = self.connect()
+        if not self.uri:
+            self.write_conn.execute("PRAGMA journal_mode = WAL")
+        self.write_conn.create_function('row_changed', 3, self.record_change)
         
-        # صف‌های ارتباطی
-        self.command_queue = queue.Queue()
-        self.audio_queue = queue.Queue()
+        self.jobs = queue.Queue()
+        self.writer = threading.Thread(target=self.write_loop, name='db-writer', daemon=True)
+        self.writer.start()
         
-        # تنظیمات UI
-        Window.clearcolor = (0.1, 0.1, 0.1, 1)
-        Window.size = (400, 600)
+        # شنونده‌های تغییرات در thread جدا صدا زده می‌شوند تا نویسنده منتظرشان نماند
+        # (و شنونده‌ای که خودش با wait=True می‌نویسد قفل نکند)
+        self.notices = queue.Queue()
+        self.notifier = threading.Thread(target=self.notify_loop, name='db-notify', daemon=True)
+        self.notifier.start()
         
-    def setup_directories(self):
-        """ایجاد پوشه‌های مورد نیاز"""
-        dirs = ['data', 'cache', 'models', 'sounds', 'music', 'notes']
-        for d in dirs:
-            os.makedirs(d, exist_ok=True)
+    def connect(self):
+        """اتصال جدید با تنظیمات بهینه"""
+        conn = sqlite3.connect(self.path, uri=self.uri, isolation_level=None, check_same_thread=False)
+        for pragma in self.PRAGMAS:
+            conn.execute(pragma)
+        # برای پر کردن ستون body دیتابیس‌های قدیمی و جستجوی بدون FTS5
+        conn.create_function('normalize_fa', 1, normalize_persian, deterministic=True)
+        with self.connections_lock:
+            self.connections.append(conn)
+        return conn
+        
+    def reader(self):
+        """اتصال خواندن مخصوص thread فعلی؛ با پایان thread بسته می‌شود"""
+        slot = getattr(self.local, 'slot', None)
+        if slot is None:
+            slot = self.local.slot = ReaderSlot(self.connect())
+            # داده thread-local با پایان thread آزاد می‌شود؛ threadهای کوتاه‌عمر
+            # (پیمایش موسیقی، کارهای پس‌زمینه) اتصال باز جا نمی‌گذارند
+            weakref.finalize(slot, self.release, slot.conn)
+        return slot.conn
+        
+    def release(self, conn):
+        """بستن اتصال خواندن یک thread تمام شده"""
+        with self.connections_lock:
+            if conn in self.connections:
+                self.connections.remove(conn)
+        conn.close()
+        
+    # ---------- خواندن ----------
+    def query(self, sql, params=()):
+        """اجرای SELECT و برگرداندن همه سطرها"""
+        return self.reader().execute(sql, params).fetchall()
+        
+    def query_one(self, sql, params=()):
+        """اجرای SELECT و برگرداندن اولین سطر"""
+        return self.reader().execute(sql, params).fetchone()
+        
+    # ---------- نوشتن ----------
+    def transaction(self, func, wait=True):
+        """اجرای func(conn) در thread نویسنده داخل یک تراکنش"""
+        from concurrent.futures import Future
+        future = Future()
+        if not wait:
+            # کسی منتظر نتیجه نیست؛ خطا حداقل در لاگ دیده شود
+            future.add_done_callback(self.report_error)
+        self.jobs.put((func, future))
+        return future.result() if wait else future
+        
+    @staticmethod
+    def report_error(future):
+        error = future.exception()
+        if error is not None:
+            Logger.error(f"خطا در نوشتن در پایگاه داده: {error}")
             
-    def setup_database(self):
-        """راه‌اندازی پایگاه داده SQLite"""
-        self.db = sqlite3.connect('data/assistant.db')
-        self.init_tables()
+    def execute(self, sql, params=(), wait=True):
+        """اجرای یک دستور نوشتن؛ برگرداندن lastrowid"""
+        return self.transaction(lambda conn: conn.execute(sql, params).lastrowid, wait)
         
-    def init_tables(self):
-        """ایجاد جداول دیتابیس"""
-        cursor = self.db.cursor()
-        
-        # جدول کاربران
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                device_id TEXT UNIQUE,
-                is_premium BOOLEAN DEFAULT 0,
-                premium_until DATE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+    def executemany(self, sql, rows, wait=True):
+        """اجرای یک دستور نوشتن برای چند سطر"""
+        return self.transaction(lambda conn: conn.executemany(sql, rows).rowcount, wait)
         
-        # جدول مخاطبین
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS contacts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                phone TEXT,
-                category TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+    def executescript(self, script, wait=True):
+        """اجرای چند دستور (مثلا ساخت جدول‌ها) در یک تراکنش"""
+        # conn.executescript خودش commit می‌کند، پس دستورها جدا اجرا می‌شوند
+        statements, buffer = [], ''
+        for piece in script.split(';'):
+            buffer += piece + ';'
+            if sqlite3.complete_statement(buffer):
+                if buffer.strip(' \n;'):
+                    statements.append(buffer)
+                buffer = ''
+        return self.transaction(lambda conn: [conn.execute(sql) for sql in statements], wait)
         
-        # جدول یادآوری‌ها
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS reminders (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT NOT NULL,
-                reminder_time DATETIME NOT NULL,
-                is_completed BOOLEAN DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+    def write_loop(self):
+        """نویسنده واحد: کارهای صف شده با هم در یک commit (group commit)"""
+        conn = self.write_conn
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            batch = [job]
+            while len(batch) < self.batch_size:
+                try:
+                    job = self.jobs.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    self.jobs.put(None)
+                    break
+                batch.append(job)
+                
+            # هر کار در savepoint خودش؛ خطای یک کار بقیه را خراب نمی‌کند
+            results = []
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                for func, future in batch:
+                    changed = len(self.changes)
+                    conn.execute("SAVEPOINT job")
+                    try:
+                        results.append((future, func(conn), None))
+                        conn.execute("RELEASE job")
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO job")
+                        conn.execute("RELEASE job")
+                        del self.changes[changed:]
+                        results.append((future, None, e))
+                conn.execute("COMMIT")
+            except Exception as e:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                self.changes = []
+                results = [(future, None, e) for func, future in batch]
+                
+            if self.changes:
+                self.notify()
+            for future, result, error in results:
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+                    
+    # ---------- اطلاع از تغییرات ----------
+    def watch(self, table, callback):
+        """فراخوانی callback(changes) بعد از هر commit با لیست (نوع تغییر، id) سطرهای تغییر کرده جدول؛
+        callback در thread db-notify صدا زده می‌شود، پس از هر threadی (حتی رابط کاربری) بدون انتظار است"""
+        with self.connections_lock:
+            self.watchers.setdefault(table, []).append(callback)
+            install = table not in self.watched
+            self.watched.add(table)
+        if install:
+            # جدول خارج از WATCHED_TABLES: تریگرها بدون انتظار در صف نویسنده ساخته می‌شوند
+            self.executescript(self.WATCH_TRIGGERS.format(table=table), wait=False)
+            
+    def unwatch(self, table, callback):
+        """حذف callback؛ تریگرها می‌مانند و بدون شنونده فقط یک append هزینه دارند"""
+        with self.connections_lock:
+            if callback in self.watchers.get(table, ()):
+                self.watchers[table].remove(callback)
+                
+    def record_change(self, table, op, row_id):
+        """تابع SQL صدا زده شده از تریگرهای موقت (در thread نویسنده)"""
+        self.changes.append((table, op, row_id))
         
-        # جدول یادداشت‌ها
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS notes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                content TEXT NOT NULL,
-                category TEXT DEFAULT 'general',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+    def notify(self):
+        """فرستادن تغییرات commit شده به thread شنونده‌ها، یک بار برای هر جدول (در thread نویسنده)"""
+        changes, self.changes = self.changes, []
+        by_table = {}
+        for table, op, row_id in changes:
+            by_table.setdefault(table, []).append((op, row_id))
+        self.notices.put(by_table)
         
-        # جدول هزینه‌ها
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS expenses (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                amount REAL NOT NULL,
-                description TEXT,
-                category TEXT DEFAULT 'other',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    def notify_loop(self):
+        """اجرای شنونده‌ها به ترتیب commitها"""
+        while True:
+            by_table = self.notices.get()
+            if by_table is None:
+                break
+            for table, rows in by_table.items():
+                with self.connections_lock:
+                    callbacks = list(self.watchers.get(table, ()))
+                for callback in callbacks:
+                    try:
+                        callback(rows)
+                    except Exception as e:
+                        Logger.error(f"خطا در شنونده تغییرات {table}: {e}")
+                        
+    # ---------- ساختار ----------
+    def init_tables(self):
+        """ایجاد جداول دیتابیس"""
+        def create(conn):
+            cursor = conn.cursor()
+            
+            # جدول کاربران
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS users (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    device_id TEXT UNIQUE,
+                    is_premium BOOLEAN DEFAULT 0,
+                    premium_until DATE,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            # جدول مخاطبین
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS contacts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT NOT NULL,
+                    phone TEXT,
+                    category TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            # جدول یادآوری‌ها
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS reminders (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    title TEXT NOT NULL,
+                    reminder_time DATETIME NOT NULL,
+                    is_completed BOOLEAN DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_reminders_pending ON reminders (is_completed, reminder_time)"
             )
-        ''')
+            
+            # جدول یادداشت‌ها
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS notes (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    content TEXT NOT NULL,
+                    category TEXT DEFAULT 'general',
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    body TEXT
+                )
+            ''')
+            
+            # ستون متن نرمال‌شده برای دیتابیس‌های قدیمی؛ یک بار با تابع پایتونی اتصال نویسنده پر می‌شود
+            if 'body' not in {row[1] for row in cursor.execute("PRAGMA table_info(notes)")}:
+                cursor.execute("ALTER TABLE notes ADD COLUMN body TEXT")
+                cursor.execute("UPDATE notes SET body = normalize_fa(content)")
+                
+            # ایندکس‌های صفحه‌بندی فهرست‌ها؛ rowid ستون آخر ضمنی هر ایندکس است
+            # پس کلید (name, id) و (created_at, id) مستقیم از ایندکس خوانده می‌شود
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_contacts_name ON contacts (name)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_notes_created ON notes (created_at)")
+            
+            # کتابخانه موسیقی؛ mtime و اندازه برای پیمایش افزایشی و کلیدهای نرمال‌شده برای جستجو
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS tracks (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    path TEXT NOT NULL UNIQUE,
+                    mtime_ns INTEGER,
+                    size INTEGER,
+                    title TEXT,
+                    artist TEXT,
+                    album TEXT,
+                    title_key TEXT,
+                    artist_key TEXT
+                )
+            ''')
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_tracks_artist ON tracks (artist_key)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_tracks_title ON tracks (title_key)")
+            
+            # جدول هزینه‌ها
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS expenses (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    amount REAL NOT NULL,
+                    description TEXT,
+                    category TEXT DEFAULT 'other',
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            # جدول فرمان‌های اجرا شده
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS command_logs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    command_text TEXT,
+                    command_type TEXT,
+                    success BOOLEAN,
+                    executed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    trace_id TEXT,
+                    latency_ms REAL,
+                    spans TEXT
+                )
+            ''')
+            
+            # ستون‌های ردیابی برای دیتابیس‌های قدیمی
+            columns = {row[1] for row in cursor.execute("PRAGMA table_info(command_logs)")}
+            for column in ('trace_id TEXT', 'latency_ms REAL', 'spans TEXT'):
+                if column.split()[0] not in columns:
+                    cursor.execute(f"ALTER TABLE command_logs ADD COLUMN {column}")
+                    
+        self.transaction(create)
+        self.executescript(self.EXPENSE_ROLLUP_SCHEMA)
+        self.init_notes_search()
         
-        # جدول فرمان‌های اجرا شده
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS command_logs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                command_text TEXT,
-                command_type TEXT,
-                success BOOLEAN,
-                executed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        # تریگرهای اطلاع از تغییر یک بار هنگام شروع؛ watch بعدا فقط شنونده ثبت می‌کند
+        self.executescript(''.join(self.WATCH_TRIGGERS.format(table=table) for table in self.WATCHED_TABLES))
+        with self.connections_lock:
+            self.watched.update(self.WATCHED_TABLES)
+            
+    def init_notes_search(self):
+        """ایندکس متنی FTS5 یادداشت‌ها روی متن نرمال‌شده (همگام با تریگر)"""
+        try:
+            self.executescript(self.NOTES_FTS_SCHEMA)
+            self.has_fts = True
+        except sqlite3.OperationalError as e:
+            Logger.warning(f"جستجوی متنی یادداشت‌ها در دسترس نیست: {e}")
+            
+    def search_notes(self, query, limit=10, highlight=('[b]', '[/b]')):
+        """جستجوی رتبه‌بندی شده یادداشت‌ها: (id، متن، بخش منطبق، تاریخ)"""
+        terms = re.findall(r'\w+', normalize_persian(query))
+        if not terms:
+            return []
+        if not self.has_fts:
+            # بدون FTS5: پیمایش کامل جدول
+            where = ' AND '.join(["COALESCE(body, normalize_fa(content)) LIKE ?"] * len(terms))
+            rows = self.query(
+                f"SELECT id, content, created_at FROM notes WHERE {where} ORDER BY id DESC LIMIT ?",
+                [f'%{term}%' for term in terms] + [limit]
             )
-        ''')
-        
-        self.db.commit()
+            return [(note_id, content, content, created_at) for note_id, content, created_at in rows]
+            
+        # همه کلمه‌ها با پیشوند («قبض» با «قبضها» هم منطبق است)
+        match = ' '.join(f'"{term}"*' for term in terms)
         
-        # افزودن مخاطبین نمونه
-        self.add_sample_data()
+        # رتبه‌بندی bm25 روی ده‌ها هزار تطابق یک کلمه پرتکرار کند است؛ پیمایش
+        # rowid نزولی سریع است، پس فقط جدیدترین تطابق‌ها رتبه‌بندی می‌شوند
+        bound = self.query_one(
+            "SELECT rowid FROM notes_fts WHERE notes_fts MATCH ? ORDER BY rowid DESC LIMIT 1 OFFSET ?",
+            (match, self.NOTES_RANK_WINDOW - 1)
+        )
+        return self.query('''
+            SELECT n.id, n.content, f.snippet, n.created_at
+            FROM (
+                SELECT rowid, rank, snippet(notes_fts, 0, ?, ?, '…', 10) AS snippet
+                FROM notes_fts WHERE notes_fts MATCH ? AND rowid >= ?
+                ORDER BY rank LIMIT ?
+            ) AS f
+            JOIN notes n ON n.id = f.rowid
+            ORDER BY f.rank
+        ''', (highlight[0], highlight[1], match, bound[0] if bound else 0, limit))
         
     def add_sample_data(self):
         """افزودن داده‌های نمونه"""
-        cursor = self.db.cursor()
-        
         # مخاطبین نمونه
         sample_contacts = [
             ('مامان', '09123456789', 'family'),
@@ -174,34 +779,679 @@ class PersianVoiceAssistant(App):
             ('شرکت', '02144556677', 'work')
         ]
         
-        cursor.executemany(
+        self.executemany(
             "INSERT OR IGNORE INTO contacts (name, phone, category) VALUES (?, ?, ?)",
             sample_contacts
         )
         
         # یادداشت نمونه
-        cursor.execute(
-            "INSERT OR IGNORE INTO notes (content, category) VALUES (?, ?)",
-            ("قبض برق را پرداخت کن", "important")
+        self.add_note("قبض برق را پرداخت کن", "important")
+        
+    def add_note(self, content, category='general', wait=True):
+        """ذخیره یادداشت همراه با متن نرمال‌شده‌اش برای ایندکس متنی"""
+        return self.execute(
+            "INSERT INTO notes (content, category, body) VALUES (?, ?, ?)",
+            (content, category, normalize_persian(content)),
+            wait
         )
         
-        self.db.commit()
+    def close(self):
+        """توقف نویسنده و بستن همه اتصال‌ها"""
+        self.jobs.put(None)
+        self.writer.join(5)
+        self.notices.put(None)
+        self.notifier.join(5)
+        with self.connections_lock:
+            for conn in self.connections:
+                conn.close()
+            self.connections = []
+
+class CommandLogWriter:
+    """نوشتن تاخیری و دسته‌ای لاگ فرمان‌ها (بدون commit روی thread رابط کاربری)"""
+    
+    def __init__(self, db, batch_size=50, flush_interval=2.0):
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.rows = []
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='command-log', daemon=True)
+        self.thread.start()
+        
+    def log(self, command_text, command_type, success, trace_id=None, latency_ms=None, spans=None):
+        """افزودن یک سطر به بافر؛ فقط در صورت پر شدن بافر flush می‌شود"""
+        with self.lock:
+            self.rows.append((command_text, command_type, success, trace_id, latency_ms, spans))
+            full = len(self.rows) >= self.batch_size
+        if full:
+            self.flush()
+            
+    def flush(self, wait=False):
+        """نوشتن همه سطرهای بافر با یک executemany در یک تراکنش"""
+        with self.lock:
+            rows, self.rows = self.rows, []
+        if rows:
+            return self.db.executemany(
+                "INSERT INTO command_logs (command_text, command_type, success, trace_id, latency_ms, spans) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+                wait=wait
+            )
+            
+    def run(self):
+        """flush دوره‌ای بر اساس زمان"""
+        while not self.stopped.wait(self.flush_interval):
+            self.flush()
+            
+    def close(self):
+        """توقف و نوشتن باقیمانده بافر"""
+        self.stopped.set()
+        self.thread.join(self.flush_interval + 1)
+        self.flush(wait=True)
+
+class KeysetPager:
+    """بارگذاری صفحه به صفحه سطرهای یک جدول با صفحه‌بندی keyset روی ستون‌های ایندکس‌شده"""
+    
+    def __init__(self, db, table, columns, order, descending=False, page_size=50, items=None, render=dict):
+        # order کلید مرتب‌سازی است و باید به id ختم شود تا یکتا باشد؛ columns هم باید شامل آن باشد
+        self.db = db
+        self.order = order
+        self.descending = descending
+        self.page_size = page_size
+        self.render = render
+        # items می‌تواند data یک RecycleView باشد تا تغییرات مستقیم نمایش داده شوند
+        self.items = [] if items is None else items
+        self.keys = []
+        self.key_by_id = {}
+        self.exhausted = False
+        
+        self.columns = columns
+        self.key_columns = [columns.index(column) for column in order]
+        direction = 'DESC' if descending else 'ASC'
+        self.select = f"SELECT {', '.join(columns)} FROM {table}"
+        self.order_by = ' ORDER BY ' + ', '.join(f'{column} {direction}' for column in order) + ' LIMIT ?'
+        self.after = (f" WHERE ({', '.join(order)}) {'<' if descending else '>'} "
+                      f"({', '.join('?' * len(order))})")
+                      
+    def row_key(self, row):
+        return tuple(row[i] for i in self.key_columns)
+        
+    def position(self, key):
+        """جای key در ترتیب نمایش (جستجوی دودویی؛ bisect ترتیب نزولی را پشتیبانی نمی‌کند)"""
+        lo, hi = 0, len(self.keys)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if (self.keys[mid] > key) if self.descending else (self.keys[mid] < key):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+        
+    def fetch(self, limit):
+        if self.keys:
+            return self.db.query(self.select + self.after + self.order_by, self.keys[-1] + (limit,))
+        return self.db.query(self.select + self.order_by, (limit,))
+        
+    def append(self, rows):
+        for row in rows:
+            key = self.row_key(row)
+            self.keys.append(key)
+            self.key_by_id[key[-1]] = key
+        self.items.extend(self.render(dict(zip(self.columns, row))) for row in rows)
+        
+    def load_more(self):
+        """صفحه بعدی بعد از آخرین کلید بارگذاری شده (بدون OFFSET)؛ تعداد سطرهای جدید"""
+        if self.exhausted:
+            return 0
+        rows = self.fetch(self.page_size)
+        self.exhausted = len(rows) < self.page_size
+        self.append(rows)
+        return len(rows)
+        
+    def reload(self):
+        """بارگذاری دوباره همان تعداد سطر (بعد از تغییرات انبوه)"""
+        limit = max(len(self.keys), self.page_size)
+        self.keys, self.key_by_id, self.exhausted = [], {}, False
+        del self.items[:]
+        rows = self.fetch(limit)
+        self.exhausted = len(rows) < limit
+        self.append(rows)
+        
+    def apply_changes(self, changes):
+        """به‌روزرسانی درجا با لیست (نوع تغییر، id) که Database.watch می‌دهد"""
+        if len(changes) > self.page_size:
+            self.reload()
+            return
+        for op, row_id in changes:
+            old_key = self.key_by_id.pop(row_id, None)
+            row = None
+            if op != 'delete':
+                row = self.db.query_one(self.select + " WHERE id = ?", (row_id,))
+            new_key = self.row_key(row) if row else None
+            
+            if old_key is not None and old_key == new_key:
+                # کلید مرتب‌سازی عوض نشده: فقط همان آیتم جایگزین می‌شود
+                self.key_by_id[row_id] = new_key
+                self.items[self.position(new_key)] = self.render(dict(zip(self.columns, row)))
+                continue
+            if old_key is not None:
+                i = self.position(old_key)
+                del self.keys[i]
+                del self.items[i]
+            if new_key is not None:
+                i = self.position(new_key)
+                # سطرهای بعد از آخرین صفحه بارگذاری شده با load_more می‌آیند
+                if i < len(self.keys) or self.exhausted:
+                    self.keys.insert(i, new_key)
+                    self.key_by_id[row_id] = new_key
+                    self.items.insert(i, self.render(dict(zip(self.columns, row))))
+
+# ========== ردیابی تاخیر ==========
+class LatencyHistogram:
+    """هیستوگرام تاخیر به سبک HDR: سطل‌های لگاریتمی-خطی با خطای نسبی ثابت و حافظه محدود"""
+    
+    def __init__(self, precision_bits=5):
+        # با ۵ بیت عرض هر سطل حداکثر ۱/۱۶ مقدار آن است (خطای صدک‌ها حداکثر حدود ۳٪)
+        self.precision_bits = precision_bits
+        self.counts = {}
+        self.count = 0
+        self.max = 0
+        
+    def record(self, seconds):
+        """ثبت یک مقدار (ثانیه) با دقت میکروثانیه"""
+        value = int(seconds * 1000000)
+        if value > self.max:
+            self.max = value
+        shift = value.bit_length() - self.precision_bits
+        if shift > 0:
+            value = value >> shift << shift
+        self.counts[value] = self.counts.get(value, 0) + 1
+        self.count += 1
+        
+    def percentile(self, p):
+        """مقدار صدک p (ثانیه)؛ وسط سطل، پس خطای نسبی نصف عرض سطل است"""
+        if not self.count:
+            return None
+        rank = p / 100 * self.count
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                shift = bucket.bit_length() - self.precision_bits
+                middle = bucket + (1 << shift) / 2 if shift > 0 else bucket
+                return min(middle, self.max) / 1000000
+        return self.max / 1000000
+        
+    def summary(self):
+        """تعداد و صدک‌های ۵۰/۹۵/۹۹ و بیشینه به میلی‌ثانیه"""
+        result = {'count': self.count, 'max': self.max / 1000}
+        for p in (50, 95, 99):
+            value = self.percentile(p)
+            result[f'p{p}'] = round(value * 1000, 3) if value is not None else None
+        return result
+
+class Trace:
+    """ردیابی یک فرمان از فشردن دکمه تا شنیدن پاسخ با یک شناسه همبستگی"""
+    
+    __slots__ = ('tracer', 'id', 'started', 'last', 'spans', 'command', 'finished')
+    
+    def __init__(self, tracer, trace_id):
+        self.tracer = tracer
+        self.id = trace_id
+        self.started = self.last = time.monotonic()
+        self.spans = []
+        self.command = None
+        self.finished = False
+        
+    def add(self, stage, start=None, end=None):
+        """ثبت بازه یک مرحله؛ شروع پیش‌فرض پایان مرحله قبلی است"""
+        if end is None:
+            end = time.monotonic()
+        self.spans.append((stage, self.last if start is None else start, end))
+        self.last = end
+        
+    def finish(self):
+        """پایان ردیابی (فقط بار اول اثر دارد)"""
+        if not self.finished:
+            self.finished = True
+            self.tracer.finish(self)
+
+class Tracer:
+    """ساخت ردیابی‌ها، تجمیع در هیستوگرام‌ها و ذخیره بازه‌ها با سطر command_logs"""
+    
+    def __init__(self, log_writer=None, precision_bits=5):
+        self.log_writer = log_writer
+        self.precision_bits = precision_bits
+        self.session = os.urandom(4).hex()
+        self.ids = count(1)
+        self.histograms = {}
+        self.lock = threading.Lock()
+        
+    def start(self):
+        """شروع ردیابی فرمان جدید"""
+        return Trace(self, f'{self.session}-{next(self.ids)}')
+        
+    def finish(self, trace):
+        """ثبت بازه‌ها در هیستوگرام هر مرحله (کلی و به تفکیک نوع فرمان) و در لاگ"""
+        trace.add('total', trace.started)
+        command_types = ('*', trace.command[1]) if trace.command else ('*',)
+        histograms = self.histograms
+        with self.lock:
+            for stage, start, end in trace.spans:
+                for command_type in command_types:
+                    histogram = histograms.get((stage, command_type))
+                    if histogram is None:
+                        histogram = histograms[stage, command_type] = LatencyHistogram(self.precision_bits)
+                    histogram.record(end - start)
+                    
+        if trace.command and self.log_writer:
+            # [مرحله، شروع نسبت به ابتدای فرمان، مدت] به میلی‌ثانیه
+            spans = [(stage, int(10000 * (start - trace.started)) / 10, int(10000 * (end - start)) / 10)
+                     for stage, start, end in trace.spans]
+            self.log_writer.log(*trace.command, trace_id=trace.id, latency_ms=spans[-1][2],
+                                spans=json.dumps(spans, ensure_ascii=False))
+                                
+    def summary(self):
+        """صدک‌های هر مرحله: {مرحله: {نوع فرمان یا '*': خلاصه}}"""
+        with self.lock:
+            items = [(key, histogram.summary()) for key, histogram in self.histograms.items()]
+        result = {}
+        for (stage, command_type), summary in sorted(items, key=lambda item: item[0]):
+            result.setdefault(stage, {})[command_type] = summary
+        return result
+
+# ========== خط لوله فرمان صوتی ==========
+
+class PipelineStage:
+    """یک مرحله خط لوله: صف ورودی محدود، تعداد ثابت worker و اندازه‌گیری انتظار و زمان سرویس"""
+    
+    def __init__(self, name, handler, inbox=None, maxsize=2, workers=1):
+        self.name = name
+        self.handler = handler
+        self.inbox = inbox if inbox is not None else queue.Queue(maxsize)
+        self.next_stage = None
+        # کالبک کار از دست رفته (خطای handler) تا صاحب کار بتواند وضعیتش را آزاد کند
+        self.on_error = None
+        self.stopped = threading.Event()
+        self.wait_time = LatencyHistogram()
+        self.service_time = LatencyHistogram()
+        self.lock = threading.Lock()
+        self.busy = 0
+        self.processed = 0
+        self.rejected = 0
+        self.failed = 0
+        self.threads = [
+            threading.Thread(target=self.run, name=f'pipeline-{name}-{i}', daemon=True)
+            for i in range(workers)
+        ]
+        
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+            
+    def submit(self, item, block=True, timeout=None):
+        """افزودن به صف؛ اگر صف پر باشد صبر می‌کند (فشار برگشتی) یا با block=False رد می‌کند"""
+        try:
+            self.inbox.put((time.monotonic(), item), block, timeout)
+            return True
+        except queue.Full:
+            with self.lock:
+                self.rejected += 1
+            return False
+            
+    def run(self):
+        while not self.stopped.is_set():
+            job = self.inbox.get()
+            if job is None:
+                break
+            enqueued_at, item = job
+            started = time.monotonic()
+            with self.lock:
+                self.busy += 1
+            try:
+                result = self.handler(item)
+            except Exception as e:
+                Logger.error(f"خطا در مرحله {self.name}: {e}")
+                result = None
+                with self.lock:
+                    self.failed += 1
+                if self.on_error:
+                    self.on_error(item)
+            finished = time.monotonic()
+            with self.lock:
+                self.busy -= 1
+                self.processed += 1
+                self.wait_time.record(started - enqueued_at)
+                self.service_time.record(finished - started)
+                
+            # اگر صف مرحله بعد پر باشد این worker همین‌جا صبر می‌کند و کار تازه برنمی‌دارد؛
+            # انتظار کوتاه‌کوتاه است تا توقف خط لوله را ببیند
+            if result is not None and self.next_stage:
+                job = (time.monotonic(), result)
+                while not self.stopped.is_set():
+                    try:
+                        self.next_stage.inbox.put(job, timeout=0.1)
+                        break
+                    except queue.Full:
+                        pass
+                        
+    def stop(self):
+        """توقف بدون انتظار (از thread رابط کاربری)؛ کارهای مانده در صف دور ریخته می‌شوند"""
+        self.stopped.set()
+        for thread in self.threads:
+            while True:
+                try:
+                    self.inbox.put_nowait(None)
+                    break
+                except queue.Full:
+                    try:
+                        self.inbox.get_nowait()
+                    except queue.Empty:
+                        pass
+                        
+    def stats(self):
+        """عمق صف، worker‌های مشغول و صدک‌های انتظار و زمان سرویس"""
+        with self.lock:
+            return {
+                'depth': self.inbox.qsize(),
+                'capacity': self.inbox.maxsize,
+                'workers': len(self.threads),
+                'busy': self.busy,
+                'processed': self.processed,
+                'rejected': self.rejected,
+                'failed': self.failed,
+                'wait_ms': self.wait_time.summary(),
+                'service_ms': self.service_time.summary()
+            }
+
+class VoicePipeline:
+    """ضبط ← تشخیص گفتار ← اجرای فرمان با صف‌های محدود و یک worker ثابت برای هر مرحله"""
+    
+    # پخش پاسخ مرحله آخر است و با صف اولویت‌دار SpeechOutputWorker انجام می‌شود
+    def __init__(self, capture, recognize, execute, audio_queue=None, command_queue=None, on_error=None):
+        self.stages = [
+            PipelineStage('capture', capture, maxsize=1),
+            PipelineStage('asr', recognize, inbox=audio_queue),
+            PipelineStage('command', execute, inbox=command_queue),
+        ]
+        for stage, next_stage in zip(self.stages, self.stages[1:]):
+            stage.next_stage = next_stage
+        for stage in self.stages:
+            stage.on_error = on_error
+            
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+            
+    def stop(self):
+        for stage in self.stages:
+            stage.stop()
+            
+    def submit(self, item):
+        """شروع یک فرمان؛ اگر مرحله ضبط هنوز کار قبلی را دارد False برمی‌گرداند"""
+        return self.stages[0].submit(item, block=False)
+        
+    def stats(self):
+        return {stage.name: stage.stats() for stage in self.stages}
+
+# ========== آماده‌سازی سرویس‌ها ==========
+class ServiceRegistry:
+    """ساخت سرویس‌ها در پس‌زمینه و اعلام ناهمگام آماده شدن یا شکست هر کدام"""
+    
+    def __init__(self, on_change=None):
+        self.on_change = on_change
+        self.states = {}
+        self.events = {}
+        self.lock = threading.Lock()
+        
+    def start(self, name, setup, requires=()):
+        """اجرای setup؛ اگر پیش‌نیازی آماده نباشد اجرا نمی‌شود"""
+        missing = [r for r in requires if not self.is_ready(r)]
+        if missing:
+            self.set_state(name, 'failed', 0.0, f"پیش‌نیاز آماده نیست: {', '.join(missing)}")
+            return False
+            
+        self.set_state(name, 'starting')
+        started = time.monotonic()
+        try:
+            setup()
+        except Exception as e:
+            Logger.error(f"راه‌اندازی سرویس {name} ناموفق بود: {e}")
+            self.set_state(name, 'failed', time.monotonic() - started, str(e))
+            return False
+        self.set_state(name, 'ready', time.monotonic() - started)
+        STARTUP.mark(f'{name}_ready')
+        return True
+        
+    def set_state(self, name, state, seconds=None, error=None):
+        with self.lock:
+            self.states[name] = (state, seconds, error)
+            event = self.events.setdefault(name, threading.Event())
+        if state != 'starting':
+            event.set()
+        if self.on_change:
+            self.on_change(name, state, error)
+            
+    def is_ready(self, *names):
+        with self.lock:
+            return all(self.states.get(name, ('pending',))[0] == 'ready' for name in names)
+            
+    def wait(self, name, timeout=None):
+        """انتظار تا آماده شدن (یا شکست) سرویس؛ True یعنی آماده"""
+        with self.lock:
+            event = self.events.setdefault(name, threading.Event())
+        event.wait(timeout)
+        return self.is_ready(name)
+        
+    def report(self):
+        """وضعیت و زمان ساخت هر سرویس (میلی‌ثانیه)"""
+        with self.lock:
+            return {
+                name: {'state': state, 'ms': round(1000 * seconds) if seconds is not None else None, 'error': error}
+                for name, (state, seconds, error) in self.states.items()
+            }
+
+# ========== وضعیت رابط کاربری ==========
+
+class UIStateStore:
+    """وضعیت رابط کاربری که از هر threadی تغییر می‌کند و حداکثر یک بار در هر فریم روی ویجت‌ها اعمال می‌شود"""
+    
+    def __init__(self, apply, make_trigger, history_size=5, **initial):
+        self.apply = apply
+        self.state = dict(initial)
+        # تاریخچه فرمان‌ها بافر حلقوی با اندازه ثابت است (جدیدترین اول)
+        self.history = deque(maxlen=history_size)
+        self.dirty = set()
+        self.lock = threading.Lock()
+        self.updates = 0
+        self.flushes = 0
+        # چند درخواست در یک فریم فقط یک فراخوانی flush می‌سازند؛ make_trigger در برنامه
+        # Clock.create_trigger است و بدون کیوی (بنچمارک‌ها) از بیرون داده می‌شود
+        self.trigger = make_trigger(self.flush)
+        
+    def update(self, **values):
+        """ثبت مقدارهای جدید؛ فقط آخرین مقدار هر کلید تا فریم بعد می‌ماند"""
+        with self.lock:
+            self.state.update(values)
+            self.dirty.update(values)
+            self.updates += 1
+        self.trigger()
+        
+    def increment(self, key, step=1):
+        with self.lock:
+            self.state[key] = self.state.get(key, 0) + step
+            self.dirty.add(key)
+            self.updates += 1
+        self.trigger()
+        
+    def add_history(self, entry):
+        with self.lock:
+            self.history.appendleft(entry)
+            self.dirty.add('history')
+            self.updates += 1
+        self.trigger()
+        
+    def flush(self, dt=None):
+        """اعمال تغییرات ادغام شده روی thread اصلی (کالبک Clock)"""
+        with self.lock:
+            if not self.dirty:
+                return
+            delta = {key: list(self.history) if key == 'history' else self.state[key] for key in self.dirty}
+            self.dirty = set()
+            self.flushes += 1
+        self.apply(delta)
+
+# ========== کلاس اصلی دستیار ==========
+class PersianVoiceAssistant(App):
+    """کلاس اصلی اپلیکیشن دستیار صوتی"""
+    
+    # Properties برای UI
+    status_text = StringProperty("آماده... بگویید: سلام دستیار")
+    is_listening = BooleanProperty(False)
+    is_premium = BooleanProperty(False)
+    command_count = NumericProperty(0)
+    
+    # جمله‌های ثابت خود برنامه که در شروع در کش TTS ساخته می‌شوند
+    WARM_UP_PHRASES = [
+        "متوجه نشدم، لطفا دوباره بگویید",
+        "یادآوری",
+        "تست صدای دستیار فارسی",
+        "صدا خاموش شد",
+        "صدا روشن شد"
+    ]
+    
+    # سرویس‌های لازم برای گوش دادن به فرمان
+    LISTEN_SERVICES = ('commands', 'speech_recognition')
+    # تعداد نمونه‌هایی که کاربر برای کلمه بیدارباش ضبط می‌کند
+    WAKE_WORD_SAMPLES = 3
+    
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        STARTUP.mark('app_init')
+        self.setup_directories()
+        # نام config نیست: App.run آن را پیش از build با ConfigParser کیوی جایگزین می‌کند
+        self.settings = load_config()
+        
+        # سرویس‌ها پس از اولین فریم در thread پس‌زمینه ساخته می‌شوند
+        self.services = ServiceRegistry(on_change=self.on_service_state)
+        
+        # حالت‌های برنامه
+        self.is_muted = False
+        self.is_sleeping = False
+        self.current_volume = 0.5
+        
+        # صف‌های ارتباطی بین مراحل خط لوله (محدود تا فشار برگشتی به ضبط برسد)
+        self.audio_queue = queue.Queue(maxsize=2)
+        self.command_queue = queue.Queue(maxsize=4)
+        
+        # هر مرحله یک thread ثابت دارد؛ ضبط فرمان بعدی می‌تواند هم‌زمان با تشخیص،
+        # اجرا و پخش پاسخ فرمان قبلی انجام شود
+        self.pipeline = VoicePipeline(
+            self.capture_utterance,
+            self.recognize_utterance,
+            lambda job: self.process_command_text(*job),
+            audio_queue=self.audio_queue,
+            command_queue=self.command_queue,
+            on_error=lambda job: self.finish_command()
+        )
+        self.pipeline.start()
+        
+        # فرمان‌هایی که پاسخشان هنوز پخش نشده؛ تا صفر نشود کلمه بیدارباش گوش نمی‌دهد
+        # تا میکروفون صدای خود دستیار را نشنود و پاسخ را قطع نکند
+        self.pending_commands = 0
+        self.pending_lock = threading.Lock()
+        
+        # همه تغییرات UI از threadهای دیگر از این مسیر و یک بار در هر فریم اعمال می‌شوند
+        self.ui_state = UIStateStore(self.apply_ui_state, Clock.create_trigger, command_count=0)
+        
+        # تنظیمات UI
+        Window.clearcolor = (0.1, 0.1, 0.1, 1)
+        Window.size = (400, 600)
+        
+    def setup_directories(self):
+        """ایجاد پوشه‌های مورد نیاز"""
+        dirs = ['data', 'cache', 'models', 'sounds', 'music', 'notes']
+        for d in dirs:
+            os.makedirs(d, exist_ok=True)
+            
+    def setup_database(self):
+        """راه‌اندازی پایگاه داده SQLite"""
+        self.db = Database('data/assistant.db')
+        self.db.init_tables()
+        self.db.add_sample_data()
+        self.command_log = CommandLogWriter(self.db)
         
     def setup_services(self):
-        """راه‌اندازی سرویس‌های مختلف"""
-        self.audio_recorder = AudioRecorder()
-        self.speech_recognizer = SpeechRecognizer()
-        self.command_processor = CommandProcessor(self.db)
-        self.tts_engine = TTSEngine()
+        """راه‌اندازی سرویس‌ها در پس‌زمینه به ترتیب نیاز (بعد از اولین فریم)"""
+        self.services.start('database', self.setup_database)
+        self.services.start('commands', self.setup_commands, requires=('database',))
+        self.services.start('speech_recognition', self.setup_recognition)
+        self.services.start('tts', self.setup_speech_output)
+        STARTUP.mark('services_ready')
+        self.report_startup()
+        Clock.schedule_once(self.start_background_services)
+        
+    def setup_commands(self):
+        """پردازشگر فرمان و سرویس‌های وابسته به پایگاه داده"""
+        self.reminder_manager = ReminderManager(self.db)
+        self.weather_service = WeatherService(self.settings)
+        self.navigation_service = NavigationService(self.settings)
+        self.music_library = MusicLibrary(self.db)
+        self.command_processor = CommandProcessor(self.db, self.reminder_manager, self.weather_service,
+                                                  self.navigation_service, self.music_library)
+        self.tracer = Tracer(self.command_log)
         self.app_launcher = AppLauncher()
         self.music_player = MusicPlayer()
-        self.reminder_manager = ReminderManager(self.db)
-        self.weather_service = WeatherService()
-        self.navigation_service = NavigationService()
         
         # تنظیم تماس‌های برگشتی
         self.command_processor.on_command_executed = self.on_command_executed
         
+    def setup_recognition(self):
+        """ضبط، تشخیص گفتار و کلمه بیدارباش (numpy و speech_recognition اینجا بارگذاری می‌شوند)"""
+        self.audio_recorder = AudioRecorder()
+        self.speech_recognizer = SpeechRecognizer(self.settings)
+        self.wake_word_detector = WakeWordDetector(on_detect=self.on_wake_word)
+        
+    def setup_speech_output(self):
+        """موتور TTS و صف پخش گفتار"""
+        self.tts_engine = TTSEngine()
+        self.speech_worker = SpeechOutputWorker(self.tts_engine)
+        
+    def on_service_state(self, name, state, error):
+        """کالبک ServiceRegistry (از thread راه‌اندازی)"""
+        Clock.schedule_once(lambda dt: self.show_service_state(name, state, error))
+        
+    def show_service_state(self, name, state, error):
+        """نمایش پیشرفت راه‌اندازی و فعال کردن دکمه گوش دادن"""
+        if state == 'failed':
+            self.status_label.text = f"⚠️ {name} در دسترس نیست"
+        elif self.services.is_ready(*self.LISTEN_SERVICES):
+            self.listen_btn.disabled = False
+            if not self.is_listening:
+                self.status_label.text = 'آماده... بگویید: سلام دستیار'
+        elif state == 'starting':
+            self.status_label.text = f"در حال آماده‌سازی {name}..."
+            
+    def on_first_frame(self, *args):
+        """اولین فریم رسم شد؛ حالا سرویس‌های سنگین در پس‌زمینه ساخته می‌شوند"""
+        Window.unbind(on_flip=self.on_first_frame)
+        STARTUP.mark('first_frame')
+        threading.Thread(target=self.setup_services, name='startup', daemon=True).start()
+        
+    def report_startup(self):
+        """لاگ و ذخیره گزارش راه‌اندازی در data/startup_profile.json"""
+        report = dict(STARTUP.report(), services=self.services.report())
+        Logger.info(f"زمان‌های راه‌اندازی (ms): {json.dumps(report['marks_ms'], ensure_ascii=False)}")
+        for module, ms, thread in report['imports_ms']:
+            if thread == 'MainThread' and ms > 50:
+                Logger.warning(f"import سنگین روی thread رابط کاربری: {module} ({ms}ms)")
+        try:
+            with open('data/startup_profile.json', 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=1)
+        except OSError as e:
+            Logger.warning(f"ذخیره گزارش راه‌اندازی ناموفق بود: {e}")
+            
     def build(self):
         """ساخت UI برنامه"""
         self.title = "دستیار صوتی فارسی 🇮🇷"
@@ -219,7 +1469,7 @@ class PersianVoiceAssistant(App):
         
         # وضعیت
         self.status_label = Label(
-            text=self.status_text,
+            text='در حال آماده‌سازی...',
             font_size='18sp',
             halign='center',
             valign='middle',
@@ -231,10 +1481,12 @@ class PersianVoiceAssistant(App):
         # دکمه‌ها
         btn_layout = BoxLayout(orientation='horizontal', spacing=10, size_hint_y=None, height=50)
         
+        # تا آماده شدن تشخیص گفتار و پردازش فرمان غیرفعال است
         self.listen_btn = Button(
             text='🎤 گوش دادن',
             background_color=(0, 0.7, 0, 1),
-            on_press=self.start_listening_manual
+            on_press=self.start_listening_manual,
+            disabled=True
         )
         
         self.settings_btn = Button(
@@ -259,174 +1511,247 @@ class PersianVoiceAssistant(App):
         layout.add_widget(btn_layout)
         layout.add_widget(self.log_label)
         
-        # شروع سرویس‌های پس‌زمینه
-        Clock.schedule_once(self.start_background_services, 2)
+        # سرویس‌ها بعد از نمایش اولین فریم ساخته می‌شوند
+        Window.bind(on_flip=self.on_first_frame)
         
         return layout
         
     def start_background_services(self, dt):
-        """شروع سرویس‌های پس‌زمینه"""
+        """شروع سرویس‌های پس‌زمینه (پس از آماده شدن، فقط آن‌هایی که ساخته شدند)"""
         # شروع تشخیص کلمه بیدارباش
-        self.start_wake_word_detection()
-        
-        # شروع چک کردن یادآوری‌ها
-        Clock.schedule_interval(self.check_reminders, 60)  # هر دقیقه
-        
-        # نمایش نوتیفیکیشن
-        notification.notify(
+        if self.services.is_ready('speech_recognition'):
+            self.start_wake_word_detection()
+            
+        # زمان‌بند یادآوری‌ها دقیقا در زمان موعد بیدار می‌شود؛ وضعیت هوا از پیش در کش
+        if self.services.is_ready('commands'):
+            self.reminder_manager.start(on_due=self.on_reminders_due)
+            self.weather_service.prefetch()
+            # فقط فایل‌های جدید یا تغییر کرده پوشه music دوباره خوانده می‌شوند
+            self.music_library.scan_async()
+            # ایندکس مخاطبین پیش از اولین فرمان تماس ساخته می‌شود
+            self.command_processor.contacts.load_async()
+            
+        # ساخت از پیش صدای پاسخ‌های ثابت
+        if self.services.is_ready('commands', 'tts'):
+            phrases = self.WARM_UP_PHRASES + self.command_processor.fixed_responses()
+            threading.Thread(target=self.tts_engine.warm_up, args=(phrases,), daemon=True).start()
+            
+        # نمایش نوتیفیکیشن (plyer در thread جدا بارگذاری می‌شود)
+        threading.Thread(target=lambda: notification.notify(
             title='دستیار صوتی فعال شد',
             message='برای استفاده بگویید: سلام دستیار',
             app_name='دستیار فارسی'
-        )
+        ), daemon=True).start()
         
     def start_wake_word_detection(self):
         """شروع تشخیص کلمه بیدارباش"""
-        def detection_thread():
-            while True:
-                try:
-                    # شبیه‌سازی تشخیص - در نسخه واقعی از مدل استفاده می‌شود
-                    time.sleep(0.5)
-                except Exception as e:
-                    Logger.error(f"خطا در تشخیص: {e}")
-                    
-        thread = threading.Thread(target=detection_thread, daemon=True)
-        thread.start()
+        try:
+            self.wake_word_detector.start()
+        except Exception as e:
+            Logger.error(f"خطا در تشخیص: {e}")
+            
+    def on_wake_word(self, pre_roll):
+        """کالبک تشخیص کلمه بیدارباش (از thread صدا)"""
+        Clock.schedule_once(lambda dt: self.start_listening_manual(pre_roll=pre_roll))
         
-    def check_reminders(self, dt):
-        """بررسی یادآوری‌های زمان رسیده"""
-        now = datetime.now()
-        cursor = self.db.cursor()
+    def on_reminders_due(self, reminders):
+        """کالبک زمان‌بند (از thread پس‌زمینه) برای یادآوری‌های رسیده"""
+        Clock.schedule_once(lambda dt: self.announce_reminders(reminders))
         
-        cursor.execute(
-            "SELECT id, title FROM reminders WHERE reminder_time <= ? AND is_completed = 0",
-            (now,)
+    def announce_reminders(self, reminders):
+        """اعلام یادآوری‌های هم‌زمان با یک نوتیفیکیشن و یک جمله"""
+        titles = '، '.join(title for rem_id, title, reminder_time in reminders)
+        
+        # نمایش نوتیفیکیشن
+        notification.notify(
+            title='یادآوری ⏰',
+            message=titles,
+            app_name='دستیار فارسی'
         )
         
-        reminders = cursor.fetchall()
+        # پخش هشدار صوتی (پیشوند ثابت جدا کش می‌شود)
+        self.speak(("یادآوری", titles), SpeechOutputWorker.PRIORITY_REMINDER)
         
-        for rem_id, title in reminders:
-            # نمایش نوتیفیکیشن
-            notification.notify(
-                title='یادآوری ⏰',
-                message=title,
-                app_name='دستیار فارسی'
-            )
-            
-            # پخش هشدار صوتی
-            self.speak(f"یادآوری: {title}")
-            
-            # علامت گذاری به عنوان انجام شده
-            cursor.execute(
-                "UPDATE reminders SET is_completed = 1 WHERE id = ?",
-                (rem_id,)
-            )
-            
-        self.db.commit()
-        
-    def start_listening_manual(self, instance=None):
+    def start_listening_manual(self, instance=None, pre_roll=None):
         """شروع گوش دادن دستی"""
         if self.is_listening:
             return
+        if not self.services.is_ready(*self.LISTEN_SERVICES):
+            self.status_label.text = "هنوز در حال آماده‌سازی..."
+            return
             
+        # برای جلوگیری از شروع دوباره همین حالا؛ بقیه در فریم بعد
         self.is_listening = True
-        self.status_text = "در حال گوش دادن..."
-        self.listen_btn.text = "⏹️ توقف"
-        self.listen_btn.background_color = (0.8, 0, 0, 1)
+        self.ui_state.update(listening=True, status="در حال گوش دادن...")
         
-        # شروع ضبط در thread جداگانه
-        thread = threading.Thread(target=self.record_and_process)
-        thread.daemon = True
-        thread.start()
-        
-    def record_and_process(self):
-        """ضبط صدا و پردازش آن"""
-        try:
-            # ضبط صدا
-            duration = 5  # ثانیه
-            fs = 16000
+        # کاربر شروع به صحبت کرده است؛ گفتار دستیار و جمله‌های مانده در صف قطع می‌شوند
+        if self.services.is_ready('tts'):
+            self.speech_worker.cancel()
             
-            Logger.info("شروع ضبط صدا...")
-            recording = sd.rec(int(duration * fs), samplerate=fs, channels=1, dtype='int16')
-            sd.wait()
+        # میکروفون در حین ضبط فرمان در اختیار ضبط‌کننده است
+        detector = getattr(self, 'wake_word_detector', None)
+        if detector:
+            detector.stop()
             
-            # ذخیره فایل موقت
-            temp_file = "cache/temp_recording.wav"
-            import scipy.io.wavfile as wav
-            wav.write(temp_file, fs, recording)
+        # ردیابی تاخیر از همین لحظه
+        with self.pending_lock:
+            self.pending_commands += 1
+        if not self.pipeline.submit((pre_roll, self.tracer.start())):
+            Logger.warning("مرحله ضبط هنوز مشغول است")
+            self.reset_listening_state()
+            self.finish_command()
             
-            # تبدیل به متن
-            text = self.speech_recognizer.recognize_file(temp_file)
+    def capture_utterance(self, job):
+        """مرحله ضبط (thread خط لوله): ضبط تا پایان جمله همراه با تشخیص جریانی"""
+        pre_roll, trace = job
+        stream = None
+        try:
+            fs = self.audio_recorder.sample_rate
             
-            # پردازش در thread اصلی Kivy
-            Clock.schedule_once(lambda dt: self.process_command_text(text))
+            # تشخیص آفلاین همزمان با ضبط جلو می‌رود
+            stream = self.speech_recognizer.start_stream(fs, on_partial=self.show_partial)
             
+            Logger.info("شروع ضبط صدا...")
+            recording = self.audio_recorder.record_utterance(
+                pre_roll, on_audio=stream.feed if stream else None
+            )
         except Exception as e:
             Logger.error(f"خطا در ضبط صدا: {e}")
-            Clock.schedule_once(lambda dt: self.reset_listening_state())
+            if stream:
+                stream.cancel()
+            trace.finish()
+            self.finish_command()
+            return None
+        finally:
+            # میکروفون آزاد است؛ فرمان بعدی می‌تواند ضبط شود
+            self.reset_listening_state()
+            
+        trace.add('record')
+        if recording is None:
+            if stream:
+                stream.cancel()
+            Logger.info("گفتاری تشخیص داده نشد")
+        return recording, fs, stream, trace
+        
+    def recognize_utterance(self, job):
+        """مرحله تشخیص گفتار (thread خط لوله): تبدیل مستقیم بافر به متن (بدون فایل موقت)"""
+        recording, fs, stream, trace = job
+        text = None
+        if recording is not None:
+            try:
+                text = self.speech_recognizer.recognize_buffer(recording, fs, stream=stream)
+            except Exception as e:
+                Logger.error(f"خطا در تشخیص گفتار: {e}")
+        trace.add('asr')
+        return text, trace
+        
+    def show_partial(self, text):
+        """نمایش فرضیه جزئی تشخیص گفتار"""
+        self.ui_state.update(status=f'«{text}»')
+        
+    def process_command_text(self, text, trace=None):
+        """پردازش متن فرمان (مرحله اجرای خط لوله)؛ UI فقط از طریق Clock به‌روز می‌شود"""
+        if trace:
+            # انتظار در صف مرحله اجرا
+            trace.add('dispatch')
             
-    def process_command_text(self, text):
-        """پردازش متن فرمان"""
         if not text or len(text.strip()) < 2:
-            self.speak("متوجه نشدم، لطفا دوباره بگویید")
-            self.reset_listening_state()
+            self.speak("متوجه نشدم، لطفا دوباره بگویید", trace=trace, on_done=self.finish_command)
             return
             
         Logger.info(f"متن تشخیص داده شده: {text}")
         
         # آپدیت UI
-        self.log_label.text = f"آخرین فرمان:\n{text}\n\n{self.log_label.text.split('آخرین فرمان')[0]}"
+        self.ui_state.add_history(text)
         
         # پردازش فرمان
-        result = self.command_processor.process(text)
-        
+        result = self.command_processor.process(text, trace)
+        if 'first_command' not in STARTUP.marks:
+            STARTUP.mark('first_command')
+            threading.Thread(target=self.report_startup, daemon=True).start()
+            
         # پاسخ به کاربر
         if result['success']:
             response = result.get('response', 'انجام شد')
-            self.speak(response)
+            self.speak(response, trace=trace, on_done=self.finish_command)
             
             # لاگ موفق
-            self.command_count += 1
+            self.ui_state.increment('command_count')
         else:
             error_msg = result.get('error', 'خطا در اجرای فرمان')
-            self.speak(error_msg)
+            self.speak(error_msg, trace=trace, on_done=self.finish_command)
             
-        self.reset_listening_state()
+    def pipeline_stats(self):
+        """عمق صف و زمان سرویس همه مراحل، از جمله صف پخش گفتار"""
+        stats = self.pipeline.stats()
+        if self.services.is_ready('tts'):
+            stats['tts'] = self.speech_worker.stats()
+        return stats
         
     def reset_listening_state(self):
         """بازنشانی حالت گوش دادن"""
-        Clock.schedule_once(lambda dt: setattr(self, 'is_listening', False))
-        Clock.schedule_once(lambda dt: setattr(self.status_label, 'text', 'آماده... بگویید: سلام دستیار'))
-        Clock.schedule_once(lambda dt: setattr(self.listen_btn, 'text', '🎤 گوش دادن'))
-        Clock.schedule_once(lambda dt: setattr(self.listen_btn, 'background_color', (0, 0.7, 0, 1)))
+        self.ui_state.update(listening=False, status='آماده... بگویید: سلام دستیار')
         
-    def on_command_executed(self, command_type, success, details):
+    def apply_ui_state(self, delta):
+        """اعمال تغییرات ادغام شده یک فریم روی ویجت‌ها (thread اصلی)"""
+        if 'listening' in delta:
+            listening = delta['listening']
+            self.is_listening = listening
+            self.listen_btn.text = "⏹️ توقف" if listening else "🎤 گوش دادن"
+            self.listen_btn.background_color = (0.8, 0, 0, 1) if listening else (0, 0.7, 0, 1)
+            if not listening:
+                # اگر پاسخ فرمان هنوز پخش نشده، بعد از پخش آن (finish_command)
+                self.resume_wake_word_detection()
+        if 'status' in delta:
+            self.status_label.text = delta['status']
+        if 'history' in delta:
+            # حداکثر history_size سطر؛ هزینه مستقل از طول جلسه
+            self.log_label.text = 'آخرین فرمان‌ها:\n--------------------\n' + '\n'.join(delta['history'])
+        if 'command_count' in delta:
+            self.command_count = delta['command_count']
+            
+    def finish_command(self):
+        """پاسخ یک فرمان پخش شد یا فرمان از دست رفت (از هر thread)"""
+        with self.pending_lock:
+            self.pending_commands = max(0, self.pending_commands - 1)
+            done = self.pending_commands == 0
+        if done:
+            Clock.schedule_once(lambda dt: self.resume_wake_word_detection())
+            
+    def resume_wake_word_detection(self):
+        """ادامه تشخیص کلمه بیدارباش پس از پخش پاسخ همه فرمان‌ها"""
+        detector = getattr(self, 'wake_word_detector', None)
+        if detector and not self.is_listening and not self.pending_commands:
+            try:
+                detector.start()
+            except Exception as e:
+                Logger.error(f"خطا در تشخیص: {e}")
+                
+    def on_command_executed(self, command_type, success, details, command_text=None, trace=None):
         """کالبک پس از اجرای فرمان"""
         Logger.info(f"فرمان {command_type} اجرا شد: {success}")
         
-        # ذخیره در لاگ
-        cursor = self.db.cursor()
-        cursor.execute(
-            "INSERT INTO command_logs (command_type, success) VALUES (?, ?)",
-            (command_type, success)
-        )
-        self.db.commit()
-        
-    def speak(self, text):
-        """صحبت کردن دستیار"""
-        if self.is_muted:
+        # ذخیره در لاگ (دسته‌ای و در پس‌زمینه)؛ فرمان ردیابی شده پس از
+        # شنیده شدن پاسخ همراه با بازه‌هایش ثبت می‌شود
+        if trace is None:
+            self.command_log.log(command_text, command_type, success)
+            
+        if command_type == 'music' and success:
+            self.music_player.play(details['path'])
+            
+    def speak(self, text, priority=None, trace=None, on_done=None):
+        """صحبت کردن دستیار؛ on_done پس از پخش (یا حذف) جمله صدا زده می‌شود"""
+        if self.is_muted or not self.services.is_ready('tts'):
+            if trace:
+                trace.finish()
+            if on_done:
+                on_done()
             return
             
-        Logger.info(f"دستیار می‌گوید: {text}")
+        Logger.info(f"دستیار می‌گوید: {text if isinstance(text, str) else ': '.join(text)}")
         
-        # استفاده از TTS
-        def tts_thread():
-            try:
-                self.tts_engine.speak(text)
-            except Exception as e:
-                Logger.error(f"خطا در TTS: {e}")
-                
-        thread = threading.Thread(target=tts_thread, daemon=True)
-        thread.start()
+        # همه گفتارها به ترتیب از یک صف پخش می‌شوند
+        self.speech_worker.say(text, priority, trace, on_done)
         
     def show_settings(self, instance):
         """نمایش پنل تنظیمات"""
@@ -439,6 +1764,9 @@ class PersianVoiceAssistant(App):
         # دکمه تست صدا
         test_btn = Button(text="🎵 تست صدا", on_press=lambda x: self.speak("تست صدای دستیار فارسی"))
         
+        # دکمه ضبط کلمه بیدارباش با صدای کاربر
+        wake_btn = Button(text="🎙️ ضبط «سلام دستیار»", on_press=self.enroll_wake_word)
+        
         # دکمه مشاهده یادداشت‌ها
         notes_btn = Button(text="📝 یادداشت‌ها", on_press=self.show_notes)
         
@@ -450,6 +1778,7 @@ class PersianVoiceAssistant(App):
         
         content.add_widget(mute_btn)
         content.add_widget(test_btn)
+        content.add_widget(wake_btn)
         content.add_widget(notes_btn)
         content.add_widget(contacts_btn)
         content.add_widget(close_btn)
@@ -463,6 +1792,38 @@ class PersianVoiceAssistant(App):
         close_btn.bind(on_press=popup.dismiss)
         popup.open()
         
+    def enroll_wake_word(self, instance=None):
+        """ضبط چند نمونه «سلام دستیار» با صدای کاربر به جای نمونه‌های models/wake_word"""
+        if self.is_listening or not self.services.is_ready('speech_recognition'):
+            self.status_label.text = "میکروفون در دسترس نیست، کمی بعد دوباره امتحان کنید"
+            return
+            
+        # میکروفون تا پایان ضبط در اختیار ضبط نمونه‌هاست
+        self.is_listening = True
+        self.ui_state.update(listening=True)
+        self.wake_word_detector.stop()
+        
+        def run():
+            status = 'کلمه بیدارباش ثبت شد. بگویید: سلام دستیار'
+            try:
+                recordings = []
+                for i in range(self.WAKE_WORD_SAMPLES):
+                    self.ui_state.update(status=f'بگویید «سلام دستیار» ({i + 1} از {self.WAKE_WORD_SAMPLES})')
+                    samples = self.audio_recorder.record_utterance()
+                    if samples is None:
+                        status = 'صدایی شنیده نشد؛ دوباره امتحان کنید'
+                        return
+                    recordings.append(samples)
+                self.wake_word_detector.enroll(recordings)
+            except Exception as e:
+                Logger.error(f"خطا در ضبط کلمه بیدارباش: {e}")
+                status = 'ضبط کلمه بیدارباش ناموفق بود'
+            finally:
+                # با پایان گوش دادن تشخیص کلمه بیدارباش با نمونه‌های تازه شروع می‌شود
+                self.ui_state.update(listening=False, status=status)
+                
+        threading.Thread(target=run, name='wake-word-enroll', daemon=True).start()
+        
     def toggle_mute(self, instance):
         """خاموش/روشن کردن صدای دستیار"""
         self.is_muted = not self.is_muted
@@ -472,53 +1833,189 @@ class PersianVoiceAssistant(App):
         
     def show_notes(self, instance):
         """نمایش یادداشت‌ها"""
-        cursor = self.db.cursor()
-        cursor.execute("SELECT content, created_at FROM notes ORDER BY created_at DESC LIMIT 10")
-        notes = cursor.fetchall()
-        
-        content_text = "آخرین یادداشت‌ها:\n\n"
-        for note, created_at in notes:
-            content_text += f"• {note}\n  ({created_at[:10]})\n\n"
-            
-        content = Label(text=content_text, halign='center', valign='top')
-        scroll = BoxLayout()
-        scroll.add_widget(content)
-        
-        popup = Popup(
-            title='یادداشت‌های من',
-            content=scroll,
-            size_hint=(0.9, 0.7)
+        if not self.services.is_ready('database'):
+            return
+        self.show_paged_list(
+            'یادداشت‌های من', 'notes', ('id', 'content', 'created_at'), ('created_at', 'id'),
+            lambda row: f"• {row['content']}\n({str(row['created_at'])[:10]})",
+            descending=True
         )
-        popup.open()
         
     def show_contacts(self, instance):
         """نمایش مخاطبین"""
-        cursor = self.db.cursor()
-        cursor.execute("SELECT name, phone, category FROM contacts ORDER BY name")
-        contacts = cursor.fetchall()
+        if not self.services.is_ready('database'):
+            return
+        self.show_paged_list(
+            'مخاطبین', 'contacts', ('id', 'name', 'phone', 'category'), ('name', 'id'),
+            lambda row: f"• {row['name']}: {row['phone']}\n({row['category']})"
+        )
+        
+    def show_paged_list(self, title, table, columns, order, format_row, descending=False):
+        """فهرست مجازی (RecycleView) که صفحه به صفحه با اسکرول بارگذاری و با تغییر سطرها درجا به‌روز می‌شود"""
+        row_height = dp(64)
+        text_width = Window.width * 0.8
+        # فقط ویجت‌های ردیف‌های قابل مشاهده ساخته می‌شوند؛ data فقط متن صفحه‌های بارگذاری شده است
+        view = RecycleView(viewclass='Label', data=[])
+        rows = RecycleBoxLayout(
+            orientation='vertical',
+            size_hint_y=None,
+            default_size=(None, row_height),
+            default_size_hint=(1, None)
+        )
+        rows.bind(minimum_height=rows.setter('height'))
+        view.add_widget(rows)
+        
+        pager = KeysetPager(
+            self.db, table, columns, order, descending=descending, items=view.data,
+            render=lambda row: {
+                'text': format_row(row),
+                'halign': 'center',
+                'valign': 'middle',
+                'text_size': (text_width, row_height),
+                'max_lines': 2,
+                'shorten': True
+            }
+        )
+        pager.load_more()
         
-        content_text = "مخاطبین:\n\n"
-        for name, phone, category in contacts:
-            content_text += f"• {name}: {phone}\n  ({category})\n\n"
+        def load_more(*args):
+            # کمتر از یک صفحه نمایش تا انتهای داده‌های بارگذاری شده مانده است
+            remaining = view.scroll_y * max(0, rows.height - view.height)
+            if remaining < view.height:
+                pager.load_more()
+                
+        def on_changes(changes):
+            # از thread شنونده‌های پایگاه داده (db-notify) صدا زده می‌شود
+            Clock.schedule_once(lambda dt: pager.apply_changes(changes))
             
-        content = Label(text=content_text, halign='center', valign='top')
-        scroll = BoxLayout()
-        scroll.add_widget(content)
+        view.bind(scroll_y=load_more)
+        self.db.watch(table, on_changes)
         
         popup = Popup(
-            title='مخاطبین',
-            content=scroll,
+            title=title,
+            content=view,
             size_hint=(0.9, 0.7)
         )
+        popup.bind(on_dismiss=lambda *args: self.db.unwatch(table, on_changes))
         popup.open()
         
     def on_stop(self):
         """ذخیره وضعیت هنگام بسته شدن"""
-        self.db.close()
+        self.pipeline.stop()
+        Logger.info(f"مراحل خط لوله: {json.dumps(self.pipeline_stats(), ensure_ascii=False)}")
+        if self.services.is_ready('commands'):
+            self.reminder_manager.stop()
+            Logger.info(f"تاخیر مراحل (ms): {json.dumps(self.tracer.summary(), ensure_ascii=False)}")
+        if self.services.is_ready('tts'):
+            self.tts_engine.cache.flush()
+        if self.services.is_ready('database'):
+            self.command_log.close()
+            self.db.close()
         return True
 
 # ========== کلاس‌های سرویس ==========
 
+class VoiceActivityDetector:
+    """تشخیص فعالیت صوتی فریم به فریم بر اساس انرژی و نرخ عبور از صفر"""
+    
+    def __init__(self, sample_rate=16000, frame_ms=30, hangover=0.6, max_duration=10,
+                 start_timeout=4, min_speech=0.09, pre_roll=0.3, energy_threshold=300):
+        self.sample_rate = sample_rate
+        self.frame_length = int(sample_rate * frame_ms / 1000)
+        self.frame_duration = frame_ms / 1000
+        self.hangover_frames = max(1, int(hangover / self.frame_duration))
+        self.max_frames = int(max_duration / self.frame_duration)
+        self.start_timeout_frames = int(start_timeout / self.frame_duration)
+        self.min_speech_frames = max(1, int(min_speech / self.frame_duration))
+        self.pre_roll_frames = int(pre_roll / self.frame_duration)
+        self.energy_threshold = energy_threshold
+        self.zcr_threshold = 0.25
+        self.reset()
+        
+    def reset(self):
+        """شروع یک جمله جدید"""
+        self.frames = []
+        self.remainder = np.zeros(0, dtype=np.int16)
+        self.noise_floor = None
+        self.speech_run = 0
+        self.silence_run = 0
+        self.speech_start = None
+        self.waited_frames = 0
+        self.is_done = False
+        
+    def frame_features(self, frames):
+        """انرژی (RMS) و نرخ عبور از صفر برای هر فریم، به صورت برداری"""
+        samples = frames.astype(np.float32)
+        energy = np.sqrt(np.mean(samples * samples, axis=1))
+        signs = np.signbit(samples)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / frames.shape[1]
+        return energy, zcr
+        
+    def is_speech(self, energy, zcr):
+        """تصمیم گفتار/سکوت برای هر فریم با آستانه تطبیقی نسبت به نویز"""
+        threshold = max(self.energy_threshold, 3 * (self.noise_floor or 0))
+        voiced = energy > threshold
+        # صامت‌های سایشی مثل «س» انرژی کمتر و ZCR بالاتری دارند
+        fricative = (energy > threshold / 2) & (zcr > self.zcr_threshold)
+        if self.speech_start is None:
+            return voiced
+        return voiced | fricative
+        
+    def process(self, samples):
+        """افزودن نمونه‌های جدید؛ True یعنی پایان جمله"""
+        if self.is_done:
+            return True
+            
+        samples = np.concatenate((self.remainder, samples.reshape(-1)))
+        count = len(samples) // self.frame_length
+        self.remainder = samples[count * self.frame_length:]
+        if not count:
+            return False
+            
+        frames = samples[:count * self.frame_length].reshape(count, self.frame_length)
+        energy, zcr = self.frame_features(frames)
+        
+        for frame, frame_energy, speech in zip(frames, energy, self.is_speech(energy, zcr)):
+            self.frames.append(frame)
+            
+            if self.speech_start is None:
+                self.waited_frames += 1
+                if speech:
+                    self.speech_run += 1
+                    if self.speech_run >= self.min_speech_frames:
+                        self.speech_start = max(0, len(self.frames) - self.speech_run - self.pre_roll_frames)
+                else:
+                    self.speech_run = 0
+                    # به‌روزرسانی تخمین نویز پس‌زمینه
+                    if self.noise_floor is None:
+                        self.noise_floor = float(frame_energy)
+                    else:
+                        self.noise_floor = 0.95 * self.noise_floor + 0.05 * float(frame_energy)
+                    # قبل از شروع گفتار فقط پیش‌ضبط لازم نگه داشته می‌شود
+                    if len(self.frames) > self.pre_roll_frames:
+                        del self.frames[0]
+                        
+                if self.speech_start is None and self.waited_frames >= self.start_timeout_frames:
+                    self.is_done = True
+                    break
+            else:
+                self.silence_run = 0 if speech else self.silence_run + 1
+                if self.silence_run >= self.hangover_frames:
+                    self.is_done = True
+                    break
+                    
+            if len(self.frames) >= self.max_frames:
+                self.is_done = True
+                break
+                
+        return self.is_done
+        
+    def utterance(self):
+        """بافر int16 جمله تشخیص داده شده یا None اگر گفتاری نبود"""
+        if self.speech_start is None or not self.frames:
+            return None
+        return np.concatenate(self.frames[self.speech_start:])
+
 class AudioRecorder:
     """مدیریت ضبط صدا"""
     
@@ -526,18 +2023,46 @@ class AudioRecorder:
         self.is_recording = False
         self.sample_rate = 16000
         
-    def start_recording(self, duration=5):
-        """شروع ضبط صدا"""
-        self.is_recording = True
-        recording = sd.rec(
-            int(duration * self.sample_rate),
-            samplerate=self.sample_rate,
-            channels=1,
-            dtype='int16'
+        # تنظیمات ضبط جریانی
+        self.max_duration = 10
+        self.silence_hangover = 0.6
+        self.start_timeout = 4
+        
+    def record_utterance(self, pre_roll=None, on_audio=None):
+        """ضبط جریانی تا پایان جمله (تشخیص سکوت) و برگرداندن بافر int16"""
+        vad = VoiceActivityDetector(
+            sample_rate=self.sample_rate,
+            hangover=self.silence_hangover,
+            max_duration=self.max_duration,
+            start_timeout=self.start_timeout
         )
-        sd.wait()
-        self.is_recording = False
-        return recording
+        if pre_roll is not None and len(pre_roll):
+            if on_audio:
+                on_audio(pre_roll)
+            vad.process(pre_roll)
+            
+        finished = threading.Event()
+        
+        def callback(indata, frames, time_info, status):
+            if status:
+                Logger.warning(f"وضعیت ضبط: {status}")
+            chunk = indata[:, 0].copy()
+            if on_audio:
+                on_audio(chunk)
+            if vad.process(chunk):
+                finished.set()
+                raise sd.CallbackStop()
+                
+        self.is_recording = True
+        try:
+            if not vad.is_done:
+                with sd.InputStream(samplerate=self.sample_rate, channels=1, dtype='int16',
+                                    blocksize=vad.frame_length, callback=callback):
+                    finished.wait(self.max_duration + self.start_timeout + 1)
+        finally:
+            self.is_recording = False
+            
+        return vad.utterance()
         
     def save_to_file(self, data, filename):
         """ذخیره فایل صوتی"""
@@ -545,135 +2070,1140 @@ class AudioRecorder:
         wav.write(filename, self.sample_rate, data)
         return filename
 
+class WakeWordDetector:
+    """تشخیص کلمه بیدارباش با بافر حلقوی و تطبیق الگو (DTW) روی ویژگی‌های طیفی"""
+    
+    def __init__(self, on_detect=None, sample_rate=16000, templates_dir='models/wake_word',
+                 threshold=0.35, ring_seconds=3, frame_length=512, n_bands=20):
+        self.on_detect = on_detect
+        self.sample_rate = sample_rate
+        self.frame_length = frame_length
+        self.frame_duration = frame_length / sample_rate
+        self.threshold = threshold
+        self.min_frames = int(0.3 / self.frame_duration)
+        self.max_frames = int(1.8 / self.frame_duration)
+        self.hangover_frames = int(0.25 / self.frame_duration)
+        self.energy_threshold = 200
+        
+        # بافرهای حلقوی صدا و ویژگی‌ها
+        self.ring_frames = int(ring_seconds / self.frame_duration)
+        self.audio_ring = np.zeros(self.ring_frames * frame_length, dtype=np.int16)
+        self.feature_ring = np.zeros((self.ring_frames, n_bands), dtype=np.float32)
+        self.window = np.hanning(frame_length).astype(np.float32)
+        self.filterbank = self.mel_filterbank(n_bands)
+        
+        self.templates = []
+        self.templates_dir = templates_dir
+        self.stream = None
+        self.reset()
+        
+        if templates_dir and os.path.isdir(templates_dir):
+            self.load_templates(templates_dir)
+            
+    def reset(self):
+        """پاک کردن وضعیت تقطیع"""
+        self.frame_count = 0
+        self.remainder = np.zeros(0, dtype=np.int16)
+        self.noise_floor = None
+        self.segment_start = None
+        self.last_speech = None
+        
+    def mel_filterbank(self, n_bands):
+        """فیلترهای مثلثی در مقیاس mel"""
+        n_bins = self.frame_length // 2 + 1
+        mel = lambda f: 2595 * np.log10(1 + f / 700)
+        inv = lambda m: 700 * (10 ** (m / 2595) - 1)
+        points = inv(np.linspace(mel(100), mel(self.sample_rate / 2), n_bands + 2))
+        bins = np.floor(points / (self.sample_rate / 2) * (n_bins - 1)).astype(int)
+        bank = np.zeros((n_bands, n_bins), dtype=np.float32)
+        for i in range(n_bands):
+            left, center, right = bins[i], max(bins[i + 1], bins[i] + 1), max(bins[i + 2], bins[i] + 2)
+            bank[i, left:center] = np.linspace(0, 1, center - left, endpoint=False)
+            bank[i, center:right] = np.linspace(1, 0, right - center, endpoint=False)
+        return bank
+        
+    def features(self, frames):
+        """انرژی لگاریتمی باندهای mel برای چند فریم به صورت برداری"""
+        spectrum = np.abs(np.fft.rfft(frames.astype(np.float32) * self.window, axis=1)) ** 2
+        return np.log(spectrum @ self.filterbank.T + 1e-6).astype(np.float32)
+        
+    def normalize(self, feats):
+        """نرمال‌سازی میانگین کپسترال و طول بردارها برای مقایسه کسینوسی"""
+        feats = feats - feats.mean(axis=0)
+        return feats / (np.linalg.norm(feats, axis=1, keepdims=True) + 1e-6)
+        
+    def add_template(self, samples):
+        """افزودن یک نمونه از کلمه بیدارباش (آرایه int16)"""
+        samples = np.asarray(samples, dtype=np.int16).reshape(-1)
+        count = len(samples) // self.frame_length
+        if not count:
+            return
+        frames = samples[:count * self.frame_length].reshape(count, self.frame_length)
+        energy = np.sqrt(np.mean(frames.astype(np.float32) ** 2, axis=1))
+        
+        # حذف سکوت ابتدا و انتهای نمونه
+        voiced = np.nonzero(energy > max(self.energy_threshold, energy.max() * 0.1))[0]
+        if len(voiced):
+            frames = frames[voiced[0]:voiced[-1] + 1]
+        self.templates.append(self.normalize(self.features(frames)))
+        
+    def load_templates(self, directory):
+        """بارگذاری نمونه‌های WAV کلمه بیدارباش از پوشه مدل‌ها"""
+        import scipy.io.wavfile as wav
+        for name in sorted(os.listdir(directory)):
+            if name.endswith('.wav'):
+                rate, data = wav.read(os.path.join(directory, name))
+                if rate != self.sample_rate:
+                    Logger.warning(f"نرخ نمونه {name} باید {self.sample_rate} باشد")
+                    continue
+                if data.ndim > 1:
+                    data = data[:, 0]
+                self.add_template(data)
+        Logger.info(f"{len(self.templates)} نمونه کلمه بیدارباش بارگذاری شد")
+        
+    def enroll(self, recordings):
+        """جایگزینی نمونه‌ها با صدای ضبط شده کاربر و ذخیره آن‌ها در templates_dir"""
+        import scipy.io.wavfile as wav
+        os.makedirs(self.templates_dir, exist_ok=True)
+        for name in os.listdir(self.templates_dir):
+            if name.endswith('.wav'):
+                os.remove(os.path.join(self.templates_dir, name))
+        self.templates = []
+        for i, samples in enumerate(recordings):
+            samples = np.asarray(samples, dtype=np.int16).reshape(-1)
+            wav.write(os.path.join(self.templates_dir, f'sample_{i + 1:02d}.wav'), self.sample_rate, samples)
+            self.add_template(samples)
+        Logger.info(f"{len(self.templates)} نمونه کلمه بیدارباش ثبت شد")
+        
+    def dtw_distance(self, segment, template):
+        """فاصله DTW با گام‌های (1,0)، (1,1) و (1,2)؛ هر سطر به صورت برداری"""
+        cost = 1 - segment @ template.T
+        acc = np.full(template.shape[0] + 2, np.inf, dtype=np.float32)
+        acc[2] = cost[0, 0]
+        for row in cost[1:]:
+            best = np.minimum(np.minimum(acc[2:], acc[1:-1]), acc[:-2])
+            acc = np.concatenate(([np.inf, np.inf], row + best))
+        return acc[-1] / len(segment)
+        
+    def score(self, segment_features):
+        """کمترین فاصله قطعه تا نمونه‌ها"""
+        segment = self.normalize(segment_features)
+        return min(
+            (self.dtw_distance(segment, t) for t in self.templates
+             if len(t) <= 2 * len(segment) and len(segment) <= 2 * len(t)),
+            default=np.inf
+        )
+        
+    def process(self, samples):
+        """پردازش نمونه‌های جدید؛ True اگر کلمه بیدارباش تشخیص داده شد"""
+        samples = np.concatenate((self.remainder, np.asarray(samples).reshape(-1)))
+        count = len(samples) // self.frame_length
+        self.remainder = samples[count * self.frame_length:]
+        if not count:
+            return False
+            
+        frames = samples[:count * self.frame_length].reshape(count, self.frame_length)
+        feats = self.features(frames)
+        energy = np.sqrt(np.mean(frames.astype(np.float32) ** 2, axis=1))
+        
+        detected = False
+        for frame, frame_feats, frame_energy in zip(frames, feats, energy):
+            slot = self.frame_count % self.ring_frames
+            self.audio_ring[slot * self.frame_length:(slot + 1) * self.frame_length] = frame
+            self.feature_ring[slot] = frame_feats
+            index = self.frame_count
+            self.frame_count += 1
+            
+            threshold = max(self.energy_threshold, 3 * (self.noise_floor or 0))
+            if frame_energy > threshold:
+                if self.segment_start is None:
+                    self.segment_start = index
+                self.last_speech = index
+                continue
+                
+            if self.noise_floor is None:
+                self.noise_floor = float(frame_energy)
+            else:
+                self.noise_floor = 0.95 * self.noise_floor + 0.05 * float(frame_energy)
+                
+            if self.segment_start is not None and index - self.last_speech >= self.hangover_frames:
+                start, end = self.segment_start, self.last_speech + 1
+                self.segment_start = None
+                # قطعه‌های خیلی کوتاه یا بلند (جمله کامل) کلمه بیدارباش نیستند
+                if self.templates and self.min_frames <= end - start <= self.max_frames:
+                    slots = np.arange(start, end) % self.ring_frames
+                    if self.score(self.feature_ring[slots]) < self.threshold:
+                        detected = True
+                        self.fire(end)
+                        
+        return detected
+        
+    def fire(self, segment_end):
+        """اعلام تشخیص همراه با صدای ضبط شده بعد از کلمه بیدارباش"""
+        slots = np.arange(segment_end, self.frame_count) % self.ring_frames
+        pre_roll = self.audio_ring.reshape(self.ring_frames, self.frame_length)[slots].reshape(-1)
+        Logger.info("کلمه بیدارباش تشخیص داده شد")
+        if self.on_detect:
+            self.on_detect(pre_roll.copy())
+            
+    def start(self):
+        """شروع گوش دادن همیشگی روی جریان ورودی"""
+        if self.stream is not None:
+            return
+        if not self.templates:
+            Logger.warning("نمونه‌ای برای کلمه بیدارباش در models/wake_word نیست؛ از تنظیمات ضبط کنید")
+            return
+            
+        def callback(indata, frames, time_info, status):
+            try:
+                self.process(indata[:, 0])
+            except Exception as e:
+                Logger.error(f"خطا در تشخیص: {e}")
+                
+        self.reset()
+        self.stream = sd.InputStream(samplerate=self.sample_rate, channels=1, dtype='int16',
+                                     blocksize=self.frame_length, callback=callback)
+        self.stream.start()
+        
+    def stop(self):
+        """توقف جریان ورودی (مثلا هنگام ضبط فرمان)"""
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream.close()
+            self.stream = None
+
+class RecognizerBackend:
+    """رابط مشترک موتورهای تشخیص گفتار"""
+    
+    name = 'base'
+    is_online = False
+    
+    def __init__(self, recognizer, config):
+        self.recognizer = recognizer
+        self.config = config
+        self.ready = threading.Event()
+        self.loaded = threading.Event()
+        
+    def load(self):
+        """بارگذاری مدل (در thread پس‌زمینه صدا زده می‌شود)"""
+        self.ready.set()
+        self.loaded.set()
+        
+    def recognize(self, audio):
+        """تبدیل sr.AudioData به متن"""
+        raise NotImplementedError
+        
+    def recognize_scored(self, audio):
+        """متن و میزان اطمینان (0 تا 1، یا None اگر موتور گزارش نمی‌کند)"""
+        return self.recognize(audio), None
+        
+    def start_stream(self, sample_rate, jobs, on_partial=None):
+        """شروع تشخیص جریانی روی workerهای jobs؛ None اگر موتور پشتیبانی نمی‌کند"""
+        return None
+
+class GoogleBackend(RecognizerBackend):
+    """تشخیص آنلاین گوگل"""
+    
+    name = 'google'
+    is_online = True
+    
+    def recognize(self, audio):
+        return self.recognizer.recognize_google(audio, language='fa-IR')
+        
+    def recognize_scored(self, audio):
+        result = self.recognizer.recognize_google(audio, language='fa-IR', show_all=True)
+        if not result or not result.get('alternative'):
+            raise sr.UnknownValueError()
+        best = result['alternative'][0]
+        return best['transcript'], best.get('confidence')
+
+class HTTPBackend(RecognizerBackend):
+    """سرور تشخیص گفتار HTTP (مثلا سرور محلی Whisper)؛ WAV می‌گیرد و JSON برمی‌گرداند"""
+    
+    name = 'http'
+    is_online = True
+    
+    def __init__(self, recognizer, config):
+        super().__init__(recognizer, config)
+        self.session = requests.Session()
+        
+    def recognize(self, audio):
+        return self.recognize_scored(audio)[0]
+        
+    def recognize_scored(self, audio):
+        url = self.config.get('asr_http_url')
+        if not url:
+            raise sr.RequestError("asr_http_url تنظیم نشده است")
+        response = self.session.post(
+            url,
+            data=audio.get_wav_data(),
+            headers={'Content-Type': 'audio/wav'},
+            timeout=self.config.get('asr_deadline', 4.0)
+        )
+        response.raise_for_status()
+        result = response.json()
+        if not result.get('text'):
+            raise sr.UnknownValueError()
+        return result['text'], result.get('confidence')
+
+class VoskBackend(RecognizerBackend):
+    """تشخیص آفلاین روی دستگاه با Vosk و مدل فارسی پوشه models/"""
+    
+    name = 'vosk'
+    
+    def __init__(self, recognizer, config):
+        super().__init__(recognizer, config)
+        self.model = None
+        # رمزگشاهای گرم آزاد برای هر نرخ نمونه
+        self.decoders = {}
+        self.lock = threading.Lock()
+        
+    @staticmethod
+    def find_model(models_dir='models'):
+        """اولین پوشه مدل Vosk (دارای am/ و conf/) در models/"""
+        if not os.path.isdir(models_dir):
+            return None
+        for name in sorted(os.listdir(models_dir)):
+            path = os.path.join(models_dir, name)
+            if os.path.isdir(os.path.join(path, 'am')) and os.path.isdir(os.path.join(path, 'conf')):
+                return path
+        return None
+        
+    def load(self):
+        """بارگذاری یک‌باره مدل"""
+        path = self.config.get('asr_model') or self.find_model()
+        if not path:
+            Logger.warning("مدل آفلاین فارسی در models/ پیدا نشد")
+            self.loaded.set()
+            return
+        try:
+            from vosk import Model, SetLogLevel
+            SetLogLevel(-1)
+            started = time.monotonic()
+            self.model = Model(path)
+            self.release_decoder(16000, self.decoder(16000))
+            Logger.info(f"مدل آفلاین {path} در {time.monotonic() - started:.1f} ثانیه بارگذاری شد")
+            self.ready.set()
+        except Exception as e:
+            Logger.error(f"خطا در بارگذاری مدل آفلاین: {e}")
+        finally:
+            self.loaded.set()
+            
+    @staticmethod
+    def parse_result(result):
+        """متن و میانگین اطمینان کلمات از خروجی JSON رمزگشا"""
+        result = json.loads(result)
+        words = result.get('result') or []
+        confidence = sum(w.get('conf', 0) for w in words) / len(words) if words else None
+        return result.get('text', ''), confidence
+        
+    def create_decoder(self, sample_rate):
+        from vosk import KaldiRecognizer
+        decoder = KaldiRecognizer(self.model, sample_rate)
+        decoder.SetWords(True)
+        return decoder
+        
+    def decoder(self, sample_rate):
+        """یک رمزگشای گرم آزاد (بین جمله‌ها فقط Reset می‌شود) یا رمزگشای تازه؛ با release_decoder پس داده می‌شود"""
+        with self.lock:
+            free = self.decoders.setdefault(sample_rate, [])
+            decoder = free.pop() if free else None
+        if decoder is None:
+            return self.create_decoder(sample_rate)
+        decoder.Reset()
+        return decoder
+        
+    def release_decoder(self, sample_rate, decoder):
+        with self.lock:
+            self.decoders.setdefault(sample_rate, []).append(decoder)
+            
+    def recognize(self, audio):
+        return self.recognize_scored(audio)[0]
+        
+    def recognize_scored(self, audio):
+        decoder = self.decoder(audio.sample_rate)
+        try:
+            decoder.AcceptWaveform(audio.get_raw_data(convert_width=2))
+            return self.parse_result(decoder.FinalResult())
+        finally:
+            self.release_decoder(audio.sample_rate, decoder)
+            
+    def start_stream(self, sample_rate, jobs, on_partial=None):
+        return RecognitionStream(self, sample_rate, jobs, on_partial)
+
+class RecognitionStream:
+    """تشخیص جریانی: صدا در حین ضبط به رمزگشا داده می‌شود"""
+    
+    def __init__(self, backend, sample_rate, jobs, on_partial=None):
+        self.backend = backend
+        self.sample_rate = sample_rate
+        self.jobs = jobs
+        self.on_partial = on_partial
+        self.chunks = queue.Queue()
+        self.lock = threading.Lock()
+        # حداکثر یک کار رمزگشایی در صف یا در حال اجرا
+        self.scheduled = False
+        self.cancelled = False
+        self.decoder = None
+        self.last_partial = ''
+        self.text = None
+        self.confidence = None
+        self.done = threading.Event()
+        
+    def feed(self, samples):
+        """افزودن نمونه‌های int16 (از callback ضبط؛ بدون انتظار)"""
+        self.chunks.put(np.ascontiguousarray(samples, dtype='<i2').tobytes())
+        self.schedule(block=False)
+        
+    def schedule(self, block, timeout=None):
+        """فرستادن کار رمزگشایی به workerهای تشخیص اگر کاری در جریان نیست؛
+        اگر صف پر باشد صدا می‌ماند تا بلوک بعدی یا finish دوباره بفرستد"""
+        with self.lock:
+            if self.scheduled or self.done.is_set():
+                return
+            self.scheduled = True
+        if not self.jobs.submit(self.drain, block, timeout):
+            with self.lock:
+                self.scheduled = False
+                
+    def drain(self):
+        """رمزگشایی صدای رسیده تا این لحظه؛ worker بین بلوک‌ها و تا finish آزاد می‌ماند"""
+        try:
+            while True:
+                try:
+                    chunk = self.chunks.get_nowait()
+                except queue.Empty:
+                    with self.lock:
+                        if self.chunks.empty():
+                            self.scheduled = False
+                            return
+                    continue
+                if chunk is None:
+                    break
+                if self.cancelled:
+                    continue
+                if self.decoder is None:
+                    self.decoder = self.backend.decoder(self.sample_rate)
+                if not self.decoder.AcceptWaveform(chunk) and self.on_partial:
+                    partial = json.loads(self.decoder.PartialResult()).get('partial', '')
+                    if partial and partial != self.last_partial:
+                        self.last_partial = partial
+                        self.on_partial(partial)
+            if not self.cancelled:
+                if self.decoder is None:
+                    self.decoder = self.backend.decoder(self.sample_rate)
+                self.text, self.confidence = self.backend.parse_result(self.decoder.FinalResult())
+        except Exception:
+            self.close()
+            raise
+        self.close()
+        
+    def close(self):
+        """پس دادن رمزگشا و اعلام پایان"""
+        if self.decoder is not None:
+            self.backend.release_decoder(self.sample_rate, self.decoder)
+            self.decoder = None
+        self.done.set()
+        
+    def finish(self, timeout=5):
+        """پایان صدا و برگرداندن متن نهایی"""
+        deadline = time.monotonic() + timeout
+        self.chunks.put(None)
+        self.schedule(True, timeout)
+        self.done.wait(max(0, deadline - time.monotonic()))
+        return self.text
+        
+    def cancel(self):
+        """پایان صدا بدون انتظار برای نتیجه"""
+        self.cancelled = True
+        self.chunks.put(None)
+        self.schedule(block=False)
+
+# موتورهای قابل انتخاب از تنظیمات
+ASR_BACKENDS = {
+    'google': GoogleBackend,
+    'http': HTTPBackend,
+    'vosk': VoskBackend
+}
+
 class SpeechRecognizer:
     """تشخیص گفتار به متن"""
     
-    def __init__(self):
+    def __init__(self, config=None):
+        self.config = config or DEFAULT_CONFIG
         self.recognizer = sr.Recognizer()
         self.recognizer.energy_threshold = 300
+        # درخواست آنلاینی که در hedged بازنده شده قطع‌شدنی نیست؛ حداکثر تا مهلت یک worker را نگه می‌دارد
+        self.recognizer.operation_timeout = self.config.get('asr_deadline', 4.0)
+        
+        self.mode = self.config.get('asr_mode', 'auto')
+        self.online = ASR_BACKENDS[self.config.get('asr_online', 'google')](self.recognizer, self.config)
+        self.offline = ASR_BACKENDS[self.config.get('asr_offline', 'vosk')](self.recognizer, self.config)
+        
+        # آمار هر موتور برای تنظیم حالت hedged
+        self.stats_lock = threading.Lock()
+        self.backend_stats = {
+            backend.name: {'attempts': 0, 'wins': 0, 'latencies': []}
+            for backend in (self.online, self.offline)
+        }
+        
+        # تشخیص جریانی و موتورهای hedged روی تعداد ثابتی worker اجرا می‌شوند، نه یک thread
+        # تازه برای هر جمله؛ کار از صف برداشته و اجرا می‌شود و چیزی به مرحله بعد نمی‌رود
+        workers = self.config.get('asr_workers', 4)
+        self.jobs = PipelineStage('asr-jobs', lambda job: job(), maxsize=2 * workers, workers=workers)
+        self.jobs.start()
         
+        # مدل‌ها در پس‌زمینه بارگذاری می‌شوند تا شروع برنامه کند نشود
+        for backend in (self.online, self.offline):
+            threading.Thread(target=backend.load, daemon=True).start()
+            
     def recognize_file(self, audio_file):
         """تشخیص گفتار از فایل"""
         try:
             with sr.AudioFile(audio_file) as source:
                 audio = self.recognizer.record(source)
                 
-            # اول سعی می‌کنیم با گوگل (آنلاین)
+            return self.recognize_audio(audio)
+            
+        except Exception as e:
+            Logger.error(f"خطا در تشخیص گفتار: {e}")
+            return None
+            
+    def recognize_buffer(self, samples, sample_rate, stream=None):
+        """تشخیص گفتار از بافر int16 در حافظه"""
+        try:
+            return self.recognize_audio(self.to_audio_data(samples, sample_rate), stream)
+        except Exception as e:
+            Logger.error(f"خطا در تشخیص گفتار: {e}")
+            # worker تشخیص جریانی نباید منتظر صدای بیشتر بماند
+            if stream:
+                stream.cancel()
+            return None
+            
+    @staticmethod
+    def to_audio_data(samples, sample_rate):
+        """پیچیدن بافر numpy به صورت AudioData بدون کپی"""
+        samples = np.ascontiguousarray(samples.reshape(-1), dtype='<i2')
+        return sr.AudioData(memoryview(samples).cast('B'), sample_rate, 2)
+        
+    def start_stream(self, sample_rate, on_partial=None):
+        """شروع تشخیص جریانی آفلاین اگر مدل آماده است"""
+        if self.mode == 'online' or not self.offline.ready.is_set():
+            return None
+        return self.offline.start_stream(sample_rate, self.jobs, on_partial)
+        
+    def recognize_audio(self, audio, stream=None):
+        """تشخیص گفتار از AudioData"""
+        if self.mode == 'hedged':
+            return self.recognize_hedged(audio, stream)
+            
+        if self.mode != 'offline':
+            # اول سعی می‌کنیم با موتور آنلاین
             try:
-                text = self.recognizer.recognize_google(audio, language='fa-IR')
+                text = self.online.recognize(audio)
+                if stream:
+                    stream.cancel()
                 return text
-            except:
-                # اگر آنلاین جواب نداد، از روش آفلاین استفاده می‌کنیم
-                return self.recognize_offline(audio)
+            except Exception as e:
+                Logger.warning(f"تشخیص آنلاین ناموفق بود: {e}")
+                if self.mode == 'online':
+                    return None
+                    
+        # اگر آنلاین جواب نداد، از روش آفلاین استفاده می‌کنیم
+        return self.recognize_offline(audio, stream)
+        
+    def recognize_hedged(self, audio, stream=None):
+        """اجرای همزمان موتور آنلاین و آفلاین؛ اولین نتیجه مطمئن یا بهترین نتیجه تا مهلت"""
+        deadline = time.monotonic() + self.config.get('asr_deadline', 4.0)
+        min_confidence = self.config.get('asr_min_confidence', 0.6)
+        results = queue.Queue()
+        decided = threading.Event()
+        
+        def offline():
+            if stream:
+                text = stream.finish(max(0, deadline - time.monotonic()))
+                return text, stream.confidence
+            self.offline.loaded.wait(max(0, deadline - time.monotonic()))
+            if not self.offline.ready.is_set():
+                raise sr.RequestError("مدل آفلاین آماده نیست")
+            return self.offline.recognize_scored(audio)
+            
+        def attempt(backend, func):
+            # کاری که هنوز در صف workerها بوده و برنده مشخص شده، اجرا نمی‌شود
+            if decided.is_set():
+                return
+            with self.stats_lock:
+                self.backend_stats[backend.name]['attempts'] += 1
+            started = time.monotonic()
+            try:
+                text, confidence = func()
+            except Exception as e:
+                Logger.warning(f"تشخیص {backend.name} ناموفق بود: {e}")
+                text, confidence = None, None
+            results.put((backend.name, text, confidence, time.monotonic() - started))
+            
+        def start(backend, func):
+            """فرستادن موتور به workerهای مشترک؛ اگر تا مهلت جا نشد شکست حساب می‌شود"""
+            if self.jobs.submit(lambda: attempt(backend, func), timeout=max(0, deadline - time.monotonic())):
+                return 1
+            Logger.warning(f"worker آزادی برای تشخیص {backend.name} نبود")
+            return 0
+            
+        # موتور دوم بعد از تاخیر کوتاه (یا زودتر اگر اولی شکست خورد) شروع می‌شود و اگر
+        # تا آن موقع برنده مشخص شده باشد اصلا شروع نمی‌شود؛ وقتی تشخیص جریانی در حال
+        # اجراست نتیجه آفلاین تقریبا رایگان است
+        offline_at = time.monotonic() + (0 if stream else self.config.get('asr_hedge_delay', 0.3))
+        offline_started = False
+        pending = start(self.online, lambda: self.online.recognize_scored(audio))
+        best = None
+        while pending or not offline_started:
+            now = time.monotonic()
+            if not offline_started and (now >= offline_at or not pending):
+                offline_started = True
+                pending += start(self.offline, offline)
+                continue
+            wait_until = deadline if offline_started else min(deadline, offline_at)
+            try:
+                name, text, confidence, latency = results.get(timeout=max(0, wait_until - now))
+            except queue.Empty:
+                if time.monotonic() >= deadline:
+                    break
+                continue
+            pending -= 1
+            with self.stats_lock:
+                latencies = self.backend_stats[name]['latencies']
+                latencies.append(latency)
+                del latencies[:-200]
+            if not text:
+                # شکست زودهنگام: موتور دوم بدون انتظار برای تاخیر شروع می‌شود
+                offline_at = now
+                continue
+            if confidence is None or confidence >= min_confidence:
+                best = (name, text, confidence)
+                break
+            if best is None or confidence > (best[2] or 0):
+                best = (name, text, confidence)
                 
-        except Exception as e:
-            Logger.error(f"خطا در تشخیص گفتار: {e}")
+        # لغو بازنده: موتوری که هنوز شروع نشده یا در صف workerهاست اجرا نمی‌شود و
+        # تشخیص جریانی بدون ساخت نتیجه نهایی رمزگشایش را پس می‌دهد. درخواست آنلاینی که
+        # در جریان است قطع‌شدنی نیست (requests و urllib راهی برای لغو از thread دیگر
+        # ندارند)؛ رها می‌شود، نتیجه‌اش دور ریخته می‌شود و worker را حداکثر تا
+        # timeout خودش (asr_deadline) نگه می‌دارد
+        decided.set()
+        if stream:
+            stream.cancel()
+            
+        if best is None:
             return None
+        with self.stats_lock:
+            self.backend_stats[best[0]]['wins'] += 1
+        return best[1]
+        
+    def stats(self):
+        """نرخ برد و تاخیر هر موتور"""
+        with self.stats_lock:
+            report = {}
+            for name, data in self.backend_stats.items():
+                latencies = sorted(data['latencies'])
+                report[name] = {
+                    'attempts': data['attempts'],
+                    'wins': data['wins'],
+                    'win_rate': data['wins'] / data['attempts'] if data['attempts'] else 0,
+                    'latency_p50': latencies[len(latencies) // 2] if latencies else None,
+                    'latency_p95': latencies[int(len(latencies) * 0.95)] if latencies else None
+                }
+            return report
             
-    def recognize_offline(self, audio):
-        """تشخیص آفلاین (شبیه‌سازی)"""
-        # در نسخه واقعی از Vosk یا Whisper استفاده می‌شود
-        patterns = {
-            r'.*تماس.*': 'تماس',
-            r'.*باز کن.*': 'باز کردن برنامه',
-            r'.*آهنگ.*': 'پخش موسیقی',
-            r'.*یادآوری.*': 'یادآوری',
-            r'.*هوا.*': 'هواشناسی',
-            r'.*راه.*': 'مسیریابی',
-            r'.*یادداشت.*': 'یادداشت',
-            r'.*ساکت.*': 'سکوت',
-            r'.*خاموش.*': 'خاموش'
-        }
+    def recognize_offline(self, audio, stream=None):
+        """تشخیص آفلاین روی دستگاه"""
+        if stream:
+            text = stream.finish()
+            if text is not None:
+                return text
+                
+        self.offline.loaded.wait(self.config.get('asr_load_timeout', 10))
+        if not self.offline.ready.is_set():
+            Logger.warning("مدل آفلاین آماده نیست")
+            return None
+        return self.offline.recognize(audio)
+
+class IntentMatcher:
+    """تشخیص‌دهنده کامپایل‌شده فرمان‌ها با ایندکس کلیدواژه"""
+    
+    REGEX_CHARS = set('.^$*+?{}[]\\|()')
+    
+    def __init__(self, patterns):
+        # الگوها یک بار کامپایل می‌شوند و ترتیب اولویت حفظ می‌شود؛
+        # هر الگو با بخش ثابتش ایندکس می‌شود تا فقط وقتی آن بخش در متن
+        # هست سراغ عبارت منظم برویم
+        self.branches = []
+        for cmd_type, cmd_patterns in patterns.items():
+            for pattern in cmd_patterns:
+                keyword = self.required_literal(pattern)
+                self.branches.append((keyword, cmd_type, re.compile(pattern)))
+                
+    @classmethod
+    def required_literal(cls, pattern):
+        """طولانی‌ترین بخش ثابت الگو که هر تطبیقی حتما شامل آن است"""
+        if '|' in pattern:
+            return ''
+        # لنگرهای ابتدا و انتهای الگو بخش ثابت را نمی‌شکنند
+        pieces = [p.lstrip('^').rstrip('$') for p in re.split(r'\([^()]*\)', pattern)]
+        pieces = [p for p in pieces if p.strip() and not cls.REGEX_CHARS & set(p)]
+        return max(pieces, key=len) if pieces else ''
+        
+    def match(self, text):
+        """برگرداندن (نوع فرمان، پارامترها) برای متن"""
+        for keyword, cmd_type, regex in self.branches:
+            if keyword in text:
+                match = regex.search(text)
+                if match:
+                    return cmd_type, match.groups()
+                    
+        return 'unknown', ()
+
+class ContactIndex:
+    """ایندکس فازی مخاطبین در حافظه: نام نرمال‌شده در ایندکس معکوس سه‌حرفی"""
+    
+    def __init__(self, db, min_overlap=0.5, max_expansions=8):
+        self.db = db
+        # حداقل نسبت سه‌حرفی‌های مشترک برای کاندید شدن
+        self.min_overlap = min_overlap
+        # حداکثر کلمه‌های مشابه برای هر کلمه ناشناخته
+        self.max_expansions = max_expansions
+        self.contacts = {}
+        self.names = {}
+        self.postings = {}
+        self.words = {}
+        self.word_postings = {}
+        # کلمه -> کوتاه‌ترین نام‌های شامل آن (برای جستجوی فقط نام کوچک)
+        self.shortest = {}
+        self.loaded = False
+        self.lock = threading.Lock()
+        self.load_lock = threading.Lock()
+        self.load_thread = None
+        
+    @staticmethod
+    def trigrams(text):
+        """مجموعه سه‌حرفی‌های متن با فاصله در دو طرف"""
+        padded = f' {text} '
+        return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+        
+    def load(self):
+        """ساخت کامل ایندکس از جدول مخاطبین (هنگام شروع برنامه)"""
+        rows = self.db.query("SELECT id, name, phone FROM contacts")
+        with self.lock:
+            self.contacts = {}
+            self.names = {}
+            self.postings = {}
+            self.words = {}
+            self.word_postings = {}
+            self.shortest = {}
+            for contact_id, name, phone in rows:
+                self.index(contact_id, name, phone)
+            # کوتاه‌ترین نام‌های هر کلمه از پیش؛ ویرایش‌ها فقط کلمه خودشان را دوباره می‌سازند
+            for word, (word_grams, word_names) in self.words.items():
+                self.shortest[word] = self.shortest_names(word_names, 8)
+            self.loaded = True
+            
+    def ensure_loaded(self):
+        """ساخت ایندکس در صورت نیاز (یا انتظار برای ساختی که در جریان است)"""
+        if not self.loaded:
+            with self.load_lock:
+                if not self.loaded:
+                    self.load()
+                    
+    def load_async(self):
+        """ساخت ایندکس در thread پس‌زمینه؛ اولین فرمان تماس منتظر ساخت از صفر نمی‌ماند"""
+        if self.load_thread and self.load_thread.is_alive():
+            return
+            
+        def run():
+            try:
+                self.ensure_loaded()
+                Logger.info(f"ایندکس مخاطبین ساخته شد: {len(self.contacts)} مخاطب")
+            except Exception as e:
+                Logger.error(f"خطا در ساخت ایندکس مخاطبین: {e}")
+                
+        self.load_thread = threading.Thread(target=run, name='contact-index', daemon=True)
+        self.load_thread.start()
+        
+    def index(self, contact_id, name, phone):
+        """افزودن یا جایگزینی یک مخاطب در ایندکس (با قفل گرفته شده)"""
+        self.unindex(contact_id)
+        normalized = normalize_persian(name)
+        self.contacts[contact_id] = (name, phone, normalized)
+        # نام‌های تکراری یک بار ایندکس می‌شوند
+        entry = self.names.get(normalized)
+        if entry is None:
+            entry = self.names[normalized] = (self.trigrams(normalized), set())
+            self.add_postings(self.postings, entry[0], normalized)
+            for word in set(normalized.split()):
+                word_entry = self.words.get(word)
+                if word_entry is None:
+                    word_entry = self.words[word] = (self.trigrams(word), set())
+                    self.add_postings(self.word_postings, word_entry[0], word)
+                word_entry[1].add(normalized)
+                self.shortest.pop(word, None)
+        entry[1].add(contact_id)
         
-        # تبدیل audio به متن ساده (شبیه‌سازی)
-        import io
-        audio_data = io.BytesIO(audio.get_wav_data())
+    def unindex(self, contact_id):
+        """حذف یک مخاطب از ایندکس (با قفل گرفته شده)"""
+        contact = self.contacts.pop(contact_id, None)
+        if contact is None:
+            return
+        normalized = contact[2]
+        grams, ids = self.names[normalized]
+        ids.discard(contact_id)
+        if ids:
+            return
+        del self.names[normalized]
+        self.remove_postings(self.postings, grams, normalized)
+        for word in set(normalized.split()):
+            word_grams, word_names = self.words[word]
+            word_names.discard(normalized)
+            self.shortest.pop(word, None)
+            if not word_names:
+                del self.words[word]
+                self.remove_postings(self.word_postings, word_grams, word)
+                
+    @staticmethod
+    def add_postings(postings, grams, key):
+        """افزودن کلید به لیست سه‌حرفی‌هایش"""
+        for gram in grams:
+            postings.setdefault(gram, set()).add(key)
+            
+    @staticmethod
+    def remove_postings(postings, grams, key):
+        """حذف کلید از لیست سه‌حرفی‌هایش (لیست‌های خالی پاک می‌شوند)"""
+        for gram in grams:
+            keys = postings[gram]
+            keys.discard(key)
+            if not keys:
+                del postings[gram]
+                
+    def shortest_names(self, names, count):
+        """count نام با کمترین سه‌حرفی (بیشترین امتیاز برای یک کلمه کامل)"""
+        return heapq.nsmallest(count, names, key=lambda key: len(self.names[key][0]))
+        
+    def lookup(self, postings, entries, grams, limit=None):
+        """کلیدهای شبیه به ترتیب امتیاز Dice (حداقل min_overlap سه‌حرفی مشترک)"""
+        need = max(1, int(len(grams) * self.min_overlap + 0.5))
+        # شمارش سه‌حرفی‌های مشترک روی لیست‌های ایندکس معکوس
+        counts = Counter(chain.from_iterable(postings.get(g, ()) for g in grams))
+        scored = [
+            (2 * shared / (len(grams) + len(entries[key][0])), key)
+            for key, shared in counts.items() if shared >= need
+        ]
+        if limit is not None:
+            scored = heapq.nlargest(limit, scored)
+        return [key for score, key in scored]
+        
+    def add_contact(self, name, phone, category=None):
+        """ثبت مخاطب جدید و به‌روزرسانی ایندکس"""
+        self.ensure_loaded()
+        contact_id = self.db.execute(
+            "INSERT INTO contacts (name, phone, category) VALUES (?, ?, ?)",
+            (name, phone, category)
+        )
+        with self.lock:
+            self.index(contact_id, name, phone)
+        return contact_id
+        
+    def update_contact(self, contact_id, name, phone):
+        """ویرایش نام یا شماره مخاطب"""
+        self.ensure_loaded()
+        self.db.execute(
+            "UPDATE contacts SET name = ?, phone = ? WHERE id = ?",
+            (name, phone, contact_id)
+        )
+        with self.lock:
+            self.index(contact_id, name, phone)
+            
+    def remove_contact(self, contact_id):
+        """حذف مخاطب"""
+        self.ensure_loaded()
+        self.db.execute("DELETE FROM contacts WHERE id = ?", (contact_id,))
+        with self.lock:
+            self.unindex(contact_id)
+            
+    def search(self, query, k=5, min_score=0.3):
+        """k مخاطب نزدیک به نام گفته شده به صورت (امتیاز، id، نام، شماره)"""
+        self.ensure_loaded()
+        normalized = normalize_persian(query)
+        grams = self.trigrams(normalized)
         
-        # تشخیص الگو
-        for pattern, command in patterns.items():
-            if re.match(pattern, 'test'):
-                return command
+        with self.lock:
+            # یک کلمه شناخته شده (معمولا نام کوچک): هر نام شامل آن همه سه‌حرفی‌های عبارت را
+            # دارد و امتیاز فقط با طول نام کم می‌شود؛ کوتاه‌ترین نام‌ها بدون اشتراک مجموعه‌ها
+            if normalized in self.words:
+                names = self.shortest.get(normalized)
+                if names is None or len(names) < k < len(self.words[normalized][1]):
+                    names = self.shortest[normalized] = self.shortest_names(self.words[normalized][1], max(k, 8))
+                names = names[:k]
+                scored = [((2 * len(grams) / (len(grams) + len(self.names[key][0])) + 1) / 2, key)
+                          for key in names]
+            else:
+                # هر کلمه با واژگان کوچک نام‌ها تطبیق فازی داده می‌شود و
+                # نام‌هایی که همه کلمه‌های شناخته شده را دارند کاندیدند
+                matches = []
+                for word in set(normalized.split()):
+                    similar = [word] if word in self.words else \
+                        self.lookup(self.word_postings, self.words, self.trigrams(word), self.max_expansions)
+                    if similar:
+                        matches.append((sum(len(self.words[w][1]) for w in similar), similar))
+                matches.sort()
                 
-        return "دستور نامشخص"
+                candidates = None
+                for size, similar in matches:
+                    if candidates is None:
+                        candidates = set().union(*(self.words[w][1] for w in similar))
+                    else:
+                        # کلمه‌های بعدی فقط کاندیدهای موجود را فیلتر می‌کنند؛ کلمه‌ای
+                        # که همه را حذف کند احتمالا اشتباه شنیده شده و نادیده گرفته می‌شود
+                        similar = set(similar)
+                        narrowed = {key for key in candidates if not similar.isdisjoint(key.split())}
+                        candidates = narrowed or candidates
+                        
+                # هیچ کلمه‌ای شناخته نشد (مثلا «عبدالله» به جای «عبد الله»): تطبیق روی کل نام
+                if not candidates:
+                    candidates = self.lookup(self.postings, self.names, grams)
+                    
+                # میانگین شباهت Dice و پوشش عبارت گفته شده؛ تطابق کامل امتیاز ۱ می‌گیرد
+                scored = []
+                for key in candidates:
+                    name_grams = self.names[key][0]
+                    shared = len(grams & name_grams)
+                    score = (2 * shared / (len(grams) + len(name_grams)) + shared / len(grams)) / 2
+                    if score >= min_score:
+                        scored.append((score, key))
+                        
+            # نام‌های برتر به مخاطبین (شاید چند مخاطب هم‌نام) باز می‌شوند
+            results = []
+            for score, key in heapq.nlargest(k, scored):
+                for contact_id in sorted(self.names[key][1])[:k]:
+                    name, phone, _ = self.contacts[contact_id]
+                    results.append((score, contact_id, name, phone))
+                    
+        return sorted(results, key=lambda r: (-r[0], r[1]))[:k]
+
+class ExpenseTracker:
+    """ثبت هزینه‌ها و گزارش از جدول‌های تجمیعی (بدون جمع زدن همه ردیف‌ها)"""
+    
+    # دسته: (نام فارسی، کلیدواژه‌ها)
+    CATEGORIES = {
+        'food': ('خوراک', ['غذا', 'خوراک', 'ناهار', 'نهار', 'شام', 'صبحانه', 'رستوران', 'نان', 'نون',
+                           'میوه', 'سبزی', 'گوشت', 'سوپرمارکت', 'خوراکی', 'قهوه', 'کافه']),
+        'transport': ('رفت و آمد', ['تاکسی', 'اسنپ', 'بنزین', 'کرایه', 'مترو', 'اتوبوس', 'پارکینگ']),
+        'bills': ('قبض', ['قبض', 'برق', 'آب', 'گاز', 'اینترنت', 'شارژ', 'موبایل', 'تلفن', 'اجاره']),
+        'health': ('درمان', ['درمان', 'دارو', 'دکتر', 'داروخانه', 'بیمارستان', 'دندانپزشک']),
+        'shopping': ('خرید', ['خرید', 'لباس', 'کفش', 'هدیه']),
+        'fun': ('تفریح', ['تفریح', 'سینما', 'سفر', 'بلیت', 'کتاب']),
+        'other': ('متفرقه', ['متفرقه']),
+    }
+    
+    def __init__(self, db):
+        self.db = db
+        self.keywords = {
+            normalize_persian(word): category
+            for category, (label, words) in self.CATEGORIES.items() for word in words
+        }
+        
+    def categorize(self, words):
+        """دسته هزینه از روی کلمه‌های توضیح"""
+        for word in words:
+            category = self.keywords.get(normalize_persian(word))
+            if category:
+                return category
+        return None
+        
+    def add_expense(self, amount, description='', category=None, when=None, wait=False):
+        """ثبت هزینه؛ جدول‌های تجمیعی با تریگر در همان تراکنش به‌روز می‌شوند"""
+        return self.db.execute(
+            "INSERT INTO expenses (amount, description, category, created_at) VALUES (?, ?, ?, ?)",
+            (amount, description, category or 'other', when or datetime.now()),
+            wait=wait
+        )
+        
+    def period(self, text, today=None):
+        """بازه گفته شده در متن: (عنوان، روزها یا None، ماه‌ها یا None)"""
+        text = normalize_persian(text)
+        today = today or datetime.now().date()
+        this_month = today.strftime('%Y-%m')
+        if 'امروز' in text:
+            return 'امروز', [today.isoformat()], None
+        if 'دیروز' in text:
+            return 'دیروز', [(today - timedelta(days=1)).isoformat()], None
+        if 'هفته' in text:
+            return 'هفت روز اخیر', [(today - timedelta(days=i)).isoformat() for i in range(7)], None
+        if any(word in text for word in ('ماه پیش', 'ماه قبل', 'ماه گذشته')):
+            return 'ماه قبل', None, [(today.replace(day=1) - timedelta(days=1)).strftime('%Y-%m')]
+        if 'امسال' in text or 'سال' in text:
+            return 'امسال', None, [f'{today.year}-{m:02d}' for m in range(1, today.month + 1)]
+        return 'این ماه', None, [this_month]
+        
+    def total(self, days=None, months=None, category=None):
+        """جمع و تعداد هزینه‌ها از جدول تجمیعی (هزینه مستقل از تعداد کل ردیف‌ها)"""
+        if days is not None:
+            table, column, keys = 'expense_daily', 'day', days
+        elif months is not None:
+            table, column, keys = 'expense_monthly', 'month', months
+        else:
+            table, column, keys = 'expense_category', None, []
+            
+        where = [f"{column} IN ({', '.join('?' * len(keys))})"] if column else []
+        params = list(keys)
+        if category:
+            where.append("category = ?")
+            params.append(category)
+        sql = f"SELECT COALESCE(SUM(total), 0), COALESCE(SUM(count), 0) FROM {table}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        return self.db.query_one(sql, params)
+        
+    def breakdown(self, days=None, months=None):
+        """جمع هر دسته در بازه، به ترتیب بیشترین هزینه"""
+        table, column, keys = ('expense_daily', 'day', days) if days is not None else \
+            ('expense_monthly', 'month', months)
+        return self.db.query(
+            f"SELECT category, SUM(total) FROM {table} WHERE {column} IN ({', '.join('?' * len(keys))}) "
+            "GROUP BY category HAVING SUM(count) > 0 ORDER BY 2 DESC",
+            keys
+        )
 
 class CommandProcessor:
     """پردازشگر فرمان‌ها"""
     
-    def __init__(self, db):
+    # الگوهای فرمان به ترتیب اولویت
+    COMMAND_PATTERNS = {
+        'call': [
+            r'با (.+) تماس بگیر',
+            r'زنگ بزن به (.+)',
+            r'تماس با (.+)'
+        ],
+        'app': [
+            r'(.+) رو باز کن',
+            r'برنامه (.+) رو اجرا کن',
+            r'اجرای (.+)'
+        ],
+        'music': [
+            r'آهنگ (.+) رو پخش کن',
+            r'موزیک (.+)',
+            r'یه آهنگ از (.+)',
+            r'موسیقی پخش کن'
+        ],
+        'reminder': [
+            r'یادآوری کن (.+)',
+            r'یادت باشه (.+)',
+            r'فردا (.+)',
+            r'ساعت (\d+) (.+)'
+        ],
+        'weather': [
+            r'هوا چطوره',
+            r'هوای امروز',
+            r'دما چند درجه'
+        ],
+        'navigation': [
+            r'راه (.+)',
+            r'مسیر به (.+)',
+            r'چطور برم (.+)'
+        ],
+        'note': [
+            r'یادداشت کن (.+)',
+            r'بنویس (.+)',
+            r'ذخیره کن (.+)'
+        ],
+        'control': [
+            r'ساکت شو',
+            r'خاموش شو',
+            r'سکوت',
+            r'خواب'
+        ],
+        'note_search': [
+            r'جستجو در یادداشت(?:\u200c?ها)?(?:م)? (.+)',
+            r'تو یادداشت(?:\u200c?ها)?(?:م)? دنبال (.+) بگرد',
+            r'یادداشت(?:\u200c?ها)?(?:م)? درباره (.+)',
+            r'یادداشت (.+) رو پیدا کن'
+        ],
+        'expense_report': [
+            r'چقدر (.*)خرج کردم',
+            r'جمع خرج',
+            r'جمع هزینه'
+        ],
+        'expense': [
+            r'ثبت هزینه (.+)',
+            r'ثبت خرج (.+)',
+            r'خرج کردم (.+)',
+            r'^(.+) خرج کردم$'
+        ]
+    }
+    
+    # پاسخ‌های ثابت فرمان‌ها؛ صدای همه هنگام شروع برنامه از پیش در کش TTS ساخته می‌شود
+    RESPONSES = {
+        'music_playing': 'الان برات پخش می‌کنم',
+        'reminder_saved': 'یادآوری ثبت شد',
+        'note_saved': 'یادداشت ثبت شد',
+        'unknown': 'فرمان نامشخص',
+        'no_contact': 'نام مخاطب را مشخص کنید',
+        'no_app': 'نام برنامه را مشخص کنید',
+        'no_music': 'آهنگی در پوشه موسیقی پیدا نشد',
+        'no_destination': 'مقصد را بگویید',
+        'no_map': 'نقشه آفلاین نصب نشده است',
+        'no_note': 'متن یادداشت را بگویید',
+        'no_note_query': 'دنبال چه یادداشتی بگردم؟',
+        'no_amount': 'مبلغ هزینه را متوجه نشدم',
+        'weather_unavailable': 'اطلاعات هوا در دسترس نیست',
+        'muted': 'ساکت شدم',
+        'shutdown': 'خاموش شدم. برای فعال شدن دوباره برنامه را باز کنید',
+        'control_done': 'دستور کنترل اجرا شد'
+    }
+    UNKNOWN_RESPONSES = [
+        'متوجه نشدم، می‌توانید دوباره بگویید؟',
+        'این فرمان را نمی‌شناسم',
+        'لطفا فرمان واضح‌تری بگویید',
+        'فعلا این قابلیت را ندارم'
+    ]
+    
+    def __init__(self, db, reminder_manager=None, weather_service=None, navigation_service=None, music_library=None):
         self.db = db
         self.on_command_executed = None
+        self.weather_service = weather_service
+        self.navigation_service = navigation_service
+        self.music_library = music_library or MusicLibrary(db)
+        self.intent_matcher = IntentMatcher(self.COMMAND_PATTERNS)
+        self.contacts = ContactIndex(db)
+        self.expenses = ExpenseTracker(db)
+        self.reminder_manager = reminder_manager or ReminderManager(db)
+        
+    @classmethod
+    def fixed_responses(cls):
+        """همه پاسخ‌های ثابت (بدون قالب) برای ساخت از پیش صدایشان"""
+        return cls.UNKNOWN_RESPONSES + list(cls.RESPONSES.values())
         
-    def process(self, text):
+    def process(self, text, trace=None):
         """پردازش متن فرمان"""
         text = text.lower().strip()
         
         # تشخیص نوع فرمان
         command_type, params = self.identify_command(text)
-        
+        if trace:
+            trace.add('identify')
+            
         # اجرای فرمان
         result = self.execute_command(command_type, params, text)
-        
+        if trace:
+            trace.add('execute')
+            trace.command = (text, command_type, result['success'])
+            
         # فراخوانی کالبک
         if self.on_command_executed:
-            self.on_command_executed(command_type, result['success'], result)
+            self.on_command_executed(command_type, result['success'], result, command_text=text, trace=trace)
             
         return result
         
     def identify_command(self, text):
         """تشخیص نوع فرمان"""
-        patterns = {
-            'call': [
-                r'با (.+) تماس بگیر',
-                r'زنگ بزن به (.+)',
-                r'تماس با (.+)'
-            ],
-            'app': [
-                r'(.+) رو باز کن',
-                r'برنامه (.+) رو اجرا کن',
-                r'اجرای (.+)'
-            ],
-            'music': [
-                r'آهنگ (.+) رو پخش کن',
-                r'موزیک (.+)',
-                r'یه آهنگ از (.+)',
-                r'موسیقی پخش کن'
-            ],
-            'reminder': [
-                r'یادآوری کن (.+)',
-                r'یادت باشه (.+)',
-                r'فردا (.+)',
-                r'ساعت (\d+) (.+)'
-            ],
-            'weather': [
-                r'هوا چطوره',
-                r'هوای امروز',
-                r'دما چند درجه'
-            ],
-            'navigation': [
-                r'راه (.+)',
-                r'مسیر به (.+)',
-                r'چطور برم (.+)'
-            ],
-            'note': [
-                r'یادداشت کن (.+)',
-                r'بنویس (.+)',
-                r'ذخیره کن (.+)'
-            ],
-            'control': [
-                r'ساکت شو',
-                r'خاموش شو',
-                r'سکوت',
-                r'خواب'
-            ]
-        }
-        
-        for cmd_type, cmd_patterns in patterns.items():
-            for pattern in cmd_patterns:
-                match = re.search(pattern, text)
-                if match:
-                    return cmd_type, match.groups()
-                    
-        return 'unknown', ()
+        return self.intent_matcher.match(text)
         
     def execute_command(self, command_type, params, original_text):
         """اجرای فرمان"""
@@ -692,6 +3222,12 @@ class CommandProcessor:
                 return self.execute_navigation(params)
             elif command_type == 'note':
                 return self.execute_note(params)
+            elif command_type == 'note_search':
+                return self.execute_note_search(params)
+            elif command_type == 'expense':
+                return self.execute_expense(params)
+            elif command_type == 'expense_report':
+                return self.execute_expense_report(original_text)
             elif command_type == 'control':
                 return self.execute_control(params)
             else:
@@ -707,29 +3243,24 @@ class CommandProcessor:
     def execute_call(self, params):
         """اجرای فرمان تماس"""
         if not params:
-            return {'success': False, 'error': 'نام مخاطب را مشخص کنید'}
+            return {'success': False, 'error': self.RESPONSES['no_contact']}
             
         contact_name = params[0]
         
-        # جستجوی مخاطب در دیتابیس
-        cursor = self.db.cursor()
-        cursor.execute(
-            "SELECT phone FROM contacts WHERE name LIKE ?",
-            (f'%{contact_name}%',)
-        )
-        
-        result = cursor.fetchone()
+        # جستجوی فازی در ایندکس مخاطبین (مقاوم به ی/ي، ک/ك و نیم‌فاصله)
+        matches = self.contacts.search(contact_name, k=3)
         
-        if result:
-            phone = result[0]
+        if matches:
+            score, contact_id, name, phone = matches[0]
             
             # شبیه‌سازی تماس
-            Logger.info(f"تماس با {contact_name}: {phone}")
+            Logger.info(f"تماس با {name}: {phone} (امتیاز {score:.2f})")
             
             return {
                 'success': True,
-                'response': f'دارم با {contact_name} تماس می‌گیرم',
-                'phone': phone
+                'response': f'دارم با {name} تماس می‌گیرم',
+                'phone': phone,
+                'candidates': [(name, score) for score, contact_id, name, phone in matches]
             }
         else:
             return {
@@ -740,7 +3271,7 @@ class CommandProcessor:
     def execute_app(self, params):
         """اجرای فرمان باز کردن برنامه"""
         if not params:
-            return {'success': False, 'error': 'نام برنامه را مشخص کنید'}
+            return {'success': False, 'error': self.RESPONSES['no_app']}
             
         app_name = params[0]
         
@@ -777,31 +3308,21 @@ class CommandProcessor:
             
     def execute_music(self, params):
         """اجرای فرمان پخش موسیقی"""
-        artist = params[0] if params else None
-        
-        # لیست آهنگ‌های نمونه
-        music_library = {
-            'شادمهر': ['آهنگ عاشقانه ۱', 'آهنگ شاد ۱'],
-            'بنیامین': ['دل تنگ', 'پرنده'],
-            'محسن': ['بارون', 'بی تو']
-        }
-        
-        if artist and artist in music_library:
-            songs = music_library[artist]
-            song = songs[0]
-            Logger.info(f"پخش آهنگ {song} از {artist}")
-        else:
-            # پخش تصادفی
-            all_songs = []
-            for songs in music_library.values():
-                all_songs.extend(songs)
-            song = all_songs[0] if all_songs else 'آهنگ تصادفی'
-            Logger.info(f"پخش {song}")
+        # بدون نام: یک آهنگ تصادفی
+        tracks = self.music_library.find(params[0] if params else None)
+        if not tracks:
+            if params:
+                return {'success': False, 'error': f'آهنگی از {params[0]} پیدا نشد'}
+            return {'success': False, 'error': self.RESPONSES['no_music']}
             
+        track_id, path, song, artist = tracks[0] if len(tracks) == 1 else random.choice(tracks)
+        Logger.info(f"پخش {song} از {artist}")
         return {
             'success': True,
-            'response': 'الان برات پخش می‌کنم',
-            'song': song
+            'response': self.RESPONSES['music_playing'],
+            'song': song,
+            'artist': artist,
+            'path': self.music_library.path(path)
         }
         
     def execute_reminder(self, params, original_text):
@@ -824,29 +3345,19 @@ class CommandProcessor:
         reminder_text = params[0] if params else "یادآوری"
         
         # ذخیره در دیتابیس
-        cursor = self.db.cursor()
-        
         if hour:
             # تنظیم زمان خاص
             reminder_time = datetime.now().replace(hour=hour, minute=0, second=0)
             if 'فردا' in original_text:
                 reminder_time += timedelta(days=1)
                 
-            cursor.execute(
-                "INSERT INTO reminders (title, reminder_time) VALUES (?, ?)",
-                (reminder_text, reminder_time)
-            )
+            self.reminder_manager.add_reminder(reminder_text, reminder_time)
             response = f'یادآوری برای ساعت {hour} تنظیم شد'
         else:
             # یادآوری ساده
-            cursor.execute(
-                "INSERT INTO reminders (title, reminder_time) VALUES (?, ?)",
-                (reminder_text, datetime.now() + timedelta(minutes=5))
-            )
-            response = 'یادآوری ثبت شد'
+            self.reminder_manager.add_reminder(reminder_text, datetime.now() + timedelta(minutes=5))
+            response = self.RESPONSES['reminder_saved']
             
-        self.db.commit()
-        
         return {
             'success': True,
             'response': response,
@@ -855,64 +3366,123 @@ class CommandProcessor:
         
     def execute_weather(self):
         """اجرای فرمان هواشناسی"""
-        # در نسخه واقعی از API استفاده می‌شود
-        weather_conditions = [
-            "امروز هوا آفتابی است، دمای ۲۵ درجه",
-            "هوا نیمه ابری، احتمال بارندگی کم",
-            "آفتابی با وزش باد ملایم",
-            "هوای صاف و آفتابی"
-        ]
-        
-        import random
-        weather = random.choice(weather_conditions)
-        
+        # سرویس (و requests) در اولین فرمان هوا ساخته می‌شود مگر از بیرون داده شده باشد
+        if self.weather_service is None:
+            self.weather_service = WeatherService()
+        try:
+            weather = self.weather_service.get_current_weather()
+        except Exception as e:
+            Logger.warning(f"دریافت وضعیت هوا ناموفق بود: {e}")
+            return {
+                'success': False,
+                'error': self.RESPONSES['weather_unavailable']
+            }
+            
         return {
             'success': True,
-            'response': weather
+            'response': WeatherService.describe(weather)
         }
         
     def execute_navigation(self, params):
         """اجرای فرمان مسیریابی"""
-        destination = params[0] if params else "مقصد"
-        
-        # شبیه‌سازی مسافت
-        distances = {
-            'آزادی': '۲۰ دقیقه با ماشین',
-            'تجریش': '۴۵ دقیقه با مترو',
-            'ونک': '۳۰ دقیقه',
-            'کارخانه': '۱ ساعت'
-        }
-        
-        time_to_dest = distances.get(destination, '۳۰ دقیقه')
-        
+        if not params:
+            return {'success': False, 'error': self.RESPONSES['no_destination']}
+        if self.navigation_service is None:
+            self.navigation_service = NavigationService()
+            
+        # «از ونک به تجریش» یا فقط مقصد (از موقعیت فعلی)
+        match = re.match(r'از (.+?) (?:به|تا) (.+)', params[0])
+        origin, destination = match.groups() if match else (None, params[0])
+        route = self.navigation_service.get_route(destination, origin)
+        if route is None:
+            return {'success': False, 'error': self.RESPONSES['no_map']}
+        if not route['found']:
+            return {'success': False, 'error': f'مکان {route["missing"]} روی نقشه پیدا نشد'}
+            
+        minutes = max(1, round(route['time'] / 60))
+        km = route['distance'] / 1000
         return {
             'success': True,
-            'response': f'تا {destination} حدود {time_to_dest} راه است',
+            'response': f'تا {destination} حدود {minutes} دقیقه با ماشین راه است ({km:.1f} کیلومتر)',
             'destination': destination,
-            'time': time_to_dest
+            'time': route['time'],
+            'distance': route['distance']
         }
         
     def execute_note(self, params):
         """اجرای فرمان یادداشت"""
         if not params:
-            return {'success': False, 'error': 'متن یادداشت را بگویید'}
+            return {'success': False, 'error': self.RESPONSES['no_note']}
             
         note_text = params[0]
         
         # ذخیره در دیتابیس
-        cursor = self.db.cursor()
-        cursor.execute(
-            "INSERT INTO notes (content) VALUES (?)",
-            (note_text,)
-        )
-        self.db.commit()
+        self.db.add_note(note_text, wait=False)
         
         return {
             'success': True,
-            'response': 'یادداشت ثبت شد',
+            'response': self.RESPONSES['note_saved'],
             'note': note_text
         }
         
+    def execute_note_search(self, params):
+        """اجرای فرمان جستجو در یادداشت‌ها"""
+        if not params:
+            return {'success': False, 'error': self.RESPONSES['no_note_query']}
+            
+        query = params[0]
+        results = self.db.search_notes(query, limit=3)
+        
+        if not results:
+            return {
+                'success': False,
+                'error': f'یادداشتی درباره {query} پیدا نشد'
+            }
+            
+        return {
+            'success': True,
+            'response': f'{len(results)} یادداشت پیدا شد: {results[0][1]}',
+            'notes': results
+        }
+        
+    def execute_expense(self, params):
+        """اجرای فرمان ثبت هزینه"""
+        amount, words = parse_persian_amount(params[0]) if params else (None, [])
+        if not amount:
+            return {'success': False, 'error': self.RESPONSES['no_amount']}
+            
+        # «برای» و «بابت» جزو توضیح نیستند
+        words = [w for w in words if normalize_persian(w) not in ('برای', 'بابت', 'واسه', 'رو', 'را')]
+        category = self.expenses.categorize(words) or 'other'
+        self.expenses.add_expense(amount, ' '.join(words), category)
+        
+        return {
+            'success': True,
+            'response': f'{amount:,.0f} تومان برای {ExpenseTracker.CATEGORIES[category][0]} ثبت شد',
+            'amount': amount,
+            'category': category
+        }
+        
+    def execute_expense_report(self, original_text):
+        """اجرای فرمان گزارش هزینه‌ها"""
+        label, days, months = self.expenses.period(original_text)
+        category = self.expenses.categorize(original_text.split())
+        total, count = self.expenses.total(days, months, category)
+        
+        if category:
+            label = f'{label} برای {ExpenseTracker.CATEGORIES[category][0]}'
+        response = f'{label} {total:,.0f} تومان خرج کردی ({count} مورد)'
+        if not category and count:
+            top, top_total = self.expenses.breakdown(days, months)[0]
+            response += f'؛ بیشترین: {ExpenseTracker.CATEGORIES[top][0]} {top_total:,.0f} تومان'
+            
+        return {
+            'success': True,
+            'response': response,
+            'total': total,
+            'count': count
+        }
+        
     def execute_control(self, params):
         """اجرای فرمان کنترل دستیار"""
         control_type = params[0] if params else ""
@@ -920,76 +3490,403 @@ class CommandProcessor:
         if 'ساکت' in control_type or 'سکوت' in control_type:
             return {
                 'success': True,
-                'response': 'ساکت شدم',
+                'response': self.RESPONSES['muted'],
                 'action': 'mute'
             }
         elif 'خاموش' in control_type or 'خواب' in control_type:
             return {
                 'success': True,
-                'response': 'خاموش شدم. برای فعال شدن دوباره برنامه را باز کنید',
+                'response': self.RESPONSES['shutdown'],
                 'action': 'shutdown'
             }
         else:
             return {
                 'success': True,
-                'response': 'دستور کنترل اجرا شد'
+                'response': self.RESPONSES['control_done']
             }
             
     def execute_unknown(self, text):
         """پردازش فرمان نامشخص"""
         # استفاده از ChatGPT یا API مشابه در نسخه واقعی
-        responses = [
-            "متوجه نشدم، می‌توانید دوباره بگویید؟",
-            "این فرمان را نمی‌شناسم",
-            "لطفا فرمان واضح‌تری بگویید",
-            "فعلا این قابلیت را ندارم"
-        ]
-        
-        import random
-        response = random.choice(responses)
+        response = random.choice(self.UNKNOWN_RESPONSES)
         
         return {
             'success': False,
             'response': response,
-            'error': 'فرمان نامشخص'
+            'error': self.RESPONSES['unknown']
+        }
+
+class TTSCache:
+    """کش صوتی TTS با کلید محتوا، حذف LRU و ایندکس SQLite"""
+    
+    def __init__(self, directory='cache/tts', max_bytes=50 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        # کلید -> زمان آخرین استفاده؛ مسیر برخورد چیزی نمی‌نویسد و این‌ها با put نوشته می‌شوند
+        self.touched = {}
+        
+        os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(directory, 'index.db'), check_same_thread=False)
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS tts_cache (
+                key TEXT PRIMARY KEY,
+                text TEXT,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )
+        ''')
+        self.db.execute("CREATE INDEX IF NOT EXISTS idx_tts_cache_last_used ON tts_cache (last_used)")
+        self.db.commit()
+        self.total_bytes = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM tts_cache").fetchone()[0]
+        
+    @staticmethod
+    def key(text, lang, voice):
+        """کلید محتوا: هش متن، زبان و صدا"""
+        import hashlib
+        return hashlib.sha256(f'{lang}\0{voice}\0{text}'.encode('utf-8')).hexdigest()
+        
+    def path(self, key):
+        return os.path.join(self.directory, f'{key}.mp3')
+        
+    def get(self, text, lang, voice):
+        """مسیر فایل کش شده یا None"""
+        key = self.key(text, lang, voice)
+        path = self.path(key)
+        with self.lock:
+            row = self.db.execute("SELECT size FROM tts_cache WHERE key = ?", (key,)).fetchone()
+            if row and os.path.exists(path):
+                self.hits += 1
+                self.touched[key] = time.time()
+                return path
+            if row:
+                # فایل از بیرون پاک شده است
+                self.touched.pop(key, None)
+                self.db.execute("DELETE FROM tts_cache WHERE key = ?", (key,))
+                self.total_bytes -= row[0]
+                self.db.commit()
+            self.misses += 1
+            return None
+            
+    def put(self, text, lang, voice, synthesize):
+        """ساخت فایل با تابع synthesize(path) و ثبت آن در کش"""
+        key = self.key(text, lang, voice)
+        path = self.path(key)
+        temp_file = f'{path}.{threading.get_ident()}.tmp'
+        try:
+            synthesize(temp_file)
+            os.replace(temp_file, path)
+        except Exception:
+            # فایل نیمه‌کاره (مثلا gTTS بدون اینترنت) در کش نمی‌ماند؛ evict آن را نمی‌شناسد
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+            raise
+        size = os.path.getsize(path)
+        
+        with self.lock:
+            # ترتیب LRU پیش از حذف قدیمی‌ترین‌ها به‌روز می‌شود (در همان تراکنش)
+            self.touched.pop(key, None)
+            self.flush_touched()
+            old = self.db.execute("SELECT size FROM tts_cache WHERE key = ?", (key,)).fetchone()
+            self.total_bytes += size - (old[0] if old else 0)
+            self.db.execute(
+                "INSERT OR REPLACE INTO tts_cache (key, text, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, text, size, time.time())
+            )
+            self.evict(keep=key)
+            self.db.commit()
+        return path
+        
+    def flush_touched(self):
+        """نوشتن زمان‌های استفاده جمع شده در یک دستور (با قفل گرفته شده، بدون commit)"""
+        if self.touched:
+            self.db.executemany("UPDATE tts_cache SET last_used = ? WHERE key = ?",
+                                [(used, key) for key, used in self.touched.items()])
+            self.touched.clear()
+            
+    def flush(self):
+        """ذخیره زمان‌های استفاده باقی‌مانده (هنگام بسته شدن برنامه)"""
+        with self.lock:
+            self.flush_touched()
+            self.db.commit()
+            
+    def evict(self, keep=None):
+        """حذف قدیمی‌ترین فایل‌ها تا وقتی حجم کش از سقف کمتر شود"""
+        if self.total_bytes <= self.max_bytes:
+            return
+        rows = self.db.execute("SELECT key, size FROM tts_cache ORDER BY last_used").fetchall()
+        for key, size in rows:
+            if self.total_bytes <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            try:
+                os.remove(self.path(key))
+            except OSError:
+                pass
+            self.db.execute("DELETE FROM tts_cache WHERE key = ?", (key,))
+            self.total_bytes -= size
+            
+    def stats(self):
+        """آمار کش"""
+        with self.lock:
+            entries = self.db.execute("SELECT COUNT(*) FROM tts_cache").fetchone()[0]
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': entries,
+            'bytes': self.total_bytes
         }
 
 class TTSEngine:
     """موتور تبدیل متن به گفتار"""
     
-    def __init__(self):
+    def __init__(self, lang='fa', voice='com'):
         pygame.mixer.init()
+        self.lang = lang
+        self.voice = voice
+        self.cache = TTSCache()
+        # قفل هر متن در حال ساخت تا پیش‌ساخت و پخش یک جمله را دو بار نسازند
+        self.building = {}
+        self.building_lock = threading.Lock()
         
+    def synthesize(self, text):
+        """مسیر فایل صوتی متن؛ از کش یا با gTTS"""
+        path = self.cache.get(text, self.lang, self.voice)
+        if path:
+            return path
+            
+        with self.building_lock:
+            lock = self.building.setdefault(text, threading.Lock())
+        with lock:
+            # شاید thread دیگری همین حالا ساختش را تمام کرده باشد
+            path = self.cache.get(text, self.lang, self.voice)
+            if path:
+                return path
+            try:
+                # استفاده از gTTS (نیاز به اینترنت)
+                tts = gTTS(text=text, lang=self.lang, tld=self.voice, slow=False)
+                return self.cache.put(text, self.lang, self.voice, tts.save)
+            finally:
+                with self.building_lock:
+                    self.building.pop(text, None)
+                    
     def speak(self, text):
         """تبدیل متن به گفتار و پخش"""
+        # متن می‌تواند چند بخش باشد تا بخش‌های ثابت جدا کش شوند
+        parts = [text] if isinstance(text, str) else list(text)
+        for i, part in enumerate(parts):
+            try:
+                sound = self.play(self.synthesize(part))
+                # صبر تا پایان بخش قبل از پخش بخش بعدی
+                if sound and i < len(parts) - 1 and sound.length > 0:
+                    time.sleep(sound.length)
+                    
+            except Exception as e:
+                Logger.error(f"خطا در TTS: {e}")
+                # Fallback: نمایش متن
+                print(f"دستیار: {part}")
+                
+    def play(self, path):
+        """پخش فایل صوتی؛ برگرداندن Sound برای توقف"""
+        sound = SoundLoader.load(path)
+        if sound:
+            sound.play()
+        return sound
+        
+    def warm_up(self, texts):
+        """ساخت از پیش فایل‌های صوتی جمله‌های ثابت"""
+        for text in texts:
+            try:
+                self.synthesize(text)
+            except Exception as e:
+                Logger.warning(f"گرم کردن کش TTS برای «{text}» ناموفق بود: {e}")
+                return
+        Logger.info(f"کش TTS آماده شد: {self.cache.stats()}")
+
+class SpeechOutputWorker:
+    """صف واحد و مرتب پخش گفتار با پیش‌ساخت و قطع هنگام صحبت کاربر"""
+    
+    PRIORITY_RESPONSE = 0
+    PRIORITY_REMINDER = 1
+    
+    def __init__(self, tts_engine, max_queue=16):
+        self.tts_engine = tts_engine
+        self.queue = queue.PriorityQueue(maxsize=max_queue)
+        self.sequence = 0
+        self.sequence_lock = threading.Lock()
+        self.cancel_event = threading.Event()
+        # جمله‌هایی که تا لحظه قطع در صف بوده‌اند (شماره ترتیب تا این مقدار) کهنه‌اند و پخش نمی‌شوند
+        self.cancelled_seq = 0
+        self.current_sound = None
+        # قطع و ثبت صدای فعلی زیر یک قفل تا قطعی بین play و ثبت صدا گم نشود
+        self.sound_lock = threading.Lock()
+        
+        # معیارها
+        self.spoken = 0
+        self.dropped = 0
+        self.cancelled = 0
+        self.first_audio_times = []
+        
+        # پیش‌ساخت جمله بعدی در thread جدا تا پخش و پایش قطع منتظر شبکه نمانند؛
+        # درخواست‌ها در یک خانه جمع می‌شوند چون هر بار فقط سر صف ساخته می‌شود
+        self.prefetch_requests = queue.Queue(maxsize=1)
+        self.prefetch_thread = threading.Thread(target=self.prefetch_loop, name='tts-prefetch', daemon=True)
+        self.prefetch_thread.start()
+        
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        
+    def say(self, text, priority=None, trace=None, on_done=None):
+        """افزودن جمله به صف پخش؛ on_done پس از پایان پخش، قطع یا حذف جمله صدا زده می‌شود"""
+        if priority is None:
+            priority = self.PRIORITY_RESPONSE
+        with self.sequence_lock:
+            self.sequence += 1
+            item = (priority, self.sequence, time.monotonic(), text, trace, on_done)
         try:
-            # استفاده از gTTS (نیاز به اینترنت)
-            tts = gTTS(text=text, lang='fa', slow=False)
+            self.queue.put_nowait(item)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            Logger.warning(f"صف گفتار پر است، جمله حذف شد: {text}")
+            if trace:
+                trace.finish()
+            if on_done:
+                on_done()
+            return False
             
-            # ذخیره فایل موقت
-            temp_file = "cache/tts_output.mp3"
-            tts.save(temp_file)
-            
-            # پخش فایل
-            sound = SoundLoader.load(temp_file)
-            if sound:
-                sound.play()
-                
-            # حذف فایل بعد از ۱۰ ثانیه
-            Clock.schedule_once(lambda dt: self.cleanup_file(temp_file), 10)
+    def cancel(self):
+        """قطع فوری گفتار فعلی و کنار گذاشتن جمله‌های مانده در صف (barge-in)"""
+        with self.sequence_lock:
+            last = self.sequence
+        with self.sound_lock:
+            self.cancelled_seq = max(self.cancelled_seq, last)
+            self.cancel_event.set()
+            sound = self.current_sound
+        if sound:
+            sound.stop()
             
-        except Exception as e:
-            Logger.error(f"خطا در TTS: {e}")
-            # Fallback: نمایش متن
-            print(f"دستیار: {text}")
+    def peek(self):
+        """متن بعدی صف بدون برداشتن آن (None اگر صف خالی یا سر صف کهنه است)"""
+        with self.queue.mutex:
+            if not self.queue.queue or self.queue.queue[0][1] <= self.cancelled_seq:
+                return None
+            return self.queue.queue[0][3]
             
-    def cleanup_file(self, filename):
-        """پاک کردن فایل موقت"""
+    def request_prefetch(self):
+        """درخواست پیش‌ساخت سر صف (بدون انتظار)"""
         try:
-            if os.path.exists(filename):
-                os.remove(filename)
-        except:
+            self.prefetch_requests.put_nowait(True)
+        except queue.Full:
             pass
+            
+    def prefetch_loop(self):
+        while True:
+            self.prefetch_requests.get()
+            self.prefetch()
+            
+    def prefetch(self):
+        """ساخت صدای جمله بعدی در حین پخش جمله فعلی"""
+        text = self.peek()
+        if text is None:
+            return
+        for part in [text] if isinstance(text, str) else text:
+            try:
+                self.tts_engine.synthesize(part)
+            except Exception as e:
+                Logger.warning(f"پیش‌ساخت گفتار ناموفق بود: {e}")
+                return
+                
+    def run(self):
+        """حلقه پخش: هر بار فقط یک جمله"""
+        while True:
+            priority, seq, enqueued_at, text, trace, on_done = self.queue.get()
+            with self.sound_lock:
+                stale = seq <= self.cancelled_seq
+                if not stale:
+                    self.cancel_event.clear()
+            if stale:
+                # پیش از قطع در صف بوده است؛ صاحبش مثل جمله قطع‌شده خبردار می‌شود
+                self.cancelled += 1
+                if trace:
+                    trace.finish()
+                if on_done:
+                    on_done()
+                self.queue.task_done()
+                continue
+                
+            first_audio = True
+            if trace:
+                trace.add('speech_queue')
+                
+            for part in [text] if isinstance(text, str) else text:
+                if self.cancel_event.is_set():
+                    break
+                try:
+                    path = self.tts_engine.synthesize(part)
+                    if self.cancel_event.is_set():
+                        break
+                    if trace and first_audio:
+                        trace.add('tts')
+                    sound = self.tts_engine.play(path)
+                except Exception as e:
+                    Logger.error(f"خطا در TTS: {e}")
+                    print(f"دستیار: {part}")
+                    continue
+                    
+                if first_audio:
+                    self.first_audio_times.append(time.monotonic() - enqueued_at)
+                    del self.first_audio_times[:-200]
+                    first_audio = False
+                    if trace:
+                        # زمان کل ردیابی تا شروع پخش اولین صدا است
+                        trace.add('play')
+                        trace.finish()
+                        
+                if not sound:
+                    continue
+                with self.sound_lock:
+                    cancelled = self.cancel_event.is_set()
+                    if not cancelled:
+                        self.current_sound = sound
+                if cancelled:
+                    # قطع بین شروع پخش و ثبت صدا رسیده است
+                    sound.stop()
+                    break
+                started = time.monotonic()
+                self.request_prefetch()
+                
+                # صبر تا پایان پخش یا قطع توسط کاربر
+                remaining = sound.length - (time.monotonic() - started) if sound.length > 0 else 0
+                if remaining > 0 and self.cancel_event.wait(remaining):
+                    sound.stop()
+                with self.sound_lock:
+                    self.current_sound = None
+                    
+            if trace:
+                trace.finish()
+            if self.cancel_event.is_set():
+                self.cancelled += 1
+            else:
+                self.spoken += 1
+            if on_done:
+                on_done()
+            self.queue.task_done()
+            
+    def stats(self):
+        """عمق صف و زمان تا اولین صدا"""
+        times = sorted(self.first_audio_times)
+        return {
+            'queue_depth': self.queue.qsize(),
+            'spoken': self.spoken,
+            'cancelled': self.cancelled,
+            'dropped': self.dropped,
+            'first_audio_p50': times[len(times) // 2] if times else None,
+            'first_audio_max': times[-1] if times else None
+        }
 
 class AppLauncher:
     """مدیریت اجرای اپلیکیشن‌ها"""
@@ -1000,70 +3897,1204 @@ class AppLauncher:
         # در نسخه واقعی از Android Intent استفاده می‌شود
         return True
 
+class MusicLibrary:
+    """کتابخانه موسیقی پوشه music: پیمایش افزایشی (mtime/اندازه) در پس‌زمینه، جدول tracks و جستجوی فازی"""
+    
+    EXTENSIONS = {'.mp3', '.flac', '.ogg', '.opus', '.m4a', '.aac', '.wav', '.wma'}
+    # تعداد فایل در هر تراکنش نوشتن؛ جستجوها بین دسته‌ها منتظر نمی‌مانند
+    BATCH_SIZE = 500
+    # پسوند فرمان که جزو نام آهنگ نیست («یه آهنگ از شادمهر پخش کن»)
+    COMMAND_SUFFIX = re.compile(r'\s*(?:(?:رو|را)\s+)?(?:پخش کن|بذار|بزن|پلی کن)$')
+    
+    def __init__(self, db, root='music', min_score=0.5):
+        self.db = db
+        self.root = root
+        self.min_score = min_score
+        # کلید نرمال‌شده نام خواننده یا آهنگ -> (سه‌حرفی‌ها، تعداد آهنگ‌ها)
+        self.keys = {'artist': {}, 'title': {}}
+        self.postings = {'artist': {}, 'title': {}}
+        self.loaded = False
+        self.lock = threading.Lock()
+        self.scan_thread = None
+        self.last_scan = None
+        
+    # ---------- خواندن برچسب‌ها ----------
+    @staticmethod
+    def decode_text(encoding, data):
+        """متن فریم ID3 با بایت کدگذاری"""
+        if encoding == 1:
+            text = data.decode('utf-16', 'replace')
+        elif encoding == 2:
+            text = data.decode('utf-16-be', 'replace')
+        elif encoding == 3:
+            text = data.decode('utf-8', 'replace')
+        else:
+            # بیشتر فایل‌های فارسی قدیمی Windows-1256 را در فیلد latin-1 نوشته‌اند
+            text = data.decode('cp1256', 'replace') if any(b > 0x7f for b in data) else data.decode('latin-1')
+        return text.split('\x00')[0].strip()
+        
+    @classmethod
+    def read_id3(cls, f):
+        """برچسب‌های ID3v2 (۲.۲ تا ۲.۴) و در نبودشان ID3v1"""
+        tags = {}
+        header = f.read(10)
+        if len(header) == 10 and header[:3] == b'ID3':
+            major, flags = header[3], header[5]
+            size = int.from_bytes(bytes(b & 0x7f for b in header[6:10]), 'big')
+            data = f.read(size)
+            pos = 0
+            if flags & 0x40 and major >= 3:
+                # هدر اضافی (در ۲.۴ اندازه شامل خودش است)
+                ext = data[:4]
+                pos = int.from_bytes(bytes(b & 0x7f for b in ext), 'big') if major == 4 else \
+                    4 + int.from_bytes(ext, 'big')
+            frames = {'TIT2': 'title', 'TPE1': 'artist', 'TALB': 'album',
+                      'TT2': 'title', 'TP1': 'artist', 'TAL': 'album'}
+            id_size, header_size = (3, 6) if major == 2 else (4, 10)
+            while pos + header_size <= len(data) and data[pos] != 0:
+                frame_id = data[pos:pos + id_size].decode('latin-1')
+                raw = data[pos + id_size:pos + id_size + (3 if major == 2 else 4)]
+                length = int.from_bytes(bytes(b & 0x7f for b in raw), 'big') if major == 4 else \
+                    int.from_bytes(raw, 'big')
+                body = data[pos + header_size:pos + header_size + length]
+                pos += header_size + length
+                if frame_id in frames and body and frames[frame_id] not in tags:
+                    text = cls.decode_text(body[0], body[1:])
+                    if text:
+                        tags[frames[frame_id]] = text
+        if 'title' not in tags and f.seek(0, os.SEEK_END) >= 128:
+            f.seek(-128, os.SEEK_END)
+            tail = f.read(128)
+            if tail[:3] == b'TAG':
+                for name, start in (('title', 3), ('artist', 33), ('album', 63)):
+                    text = cls.decode_text(0, tail[start:start + 30].rstrip(b'\x00 '))
+                    if text:
+                        tags.setdefault(name, text)
+        return tags
+        
+    @staticmethod
+    def read_flac(f):
+        """برچسب‌های Vorbis comment فایل FLAC"""
+        tags = {}
+        if f.read(4) != b'fLaC':
+            return tags
+        last = False
+        while not last:
+            header = f.read(4)
+            if len(header) < 4:
+                break
+            last, block_type = header[0] & 0x80, header[0] & 0x7f
+            length = int.from_bytes(header[1:], 'big')
+            if block_type != 4:
+                f.seek(length, os.SEEK_CUR)
+                continue
+            data = f.read(length)
+            vendor = int.from_bytes(data[:4], 'little')
+            pos = 4 + vendor
+            count = int.from_bytes(data[pos:pos + 4], 'little')
+            pos += 4
+            for _ in range(count):
+                size = int.from_bytes(data[pos:pos + 4], 'little')
+                key, _, value = data[pos + 4:pos + 4 + size].decode('utf-8', 'replace').partition('=')
+                pos += 4 + size
+                name = {'TITLE': 'title', 'ARTIST': 'artist', 'ALBUM': 'album'}.get(key.upper())
+                if name and value.strip():
+                    tags.setdefault(name, value.strip())
+            break
+        return tags
+        
+    def read_tags(self, path, relative):
+        """عنوان، خواننده و آلبوم؛ در نبود برچسب از نام فایل («خواننده - آهنگ») یا پوشه خواننده"""
+        tags = {}
+        extension = os.path.splitext(path)[1].lower()
+        try:
+            if extension in ('.mp3', '.flac'):
+                with open(path, 'rb') as f:
+                    tags = self.read_id3(f) if extension == '.mp3' else self.read_flac(f)
+        except (OSError, ValueError) as e:
+            Logger.warning(f"خواندن برچسب {relative} ناموفق بود: {e}")
+            
+        stem = os.path.splitext(os.path.basename(relative))[0]
+        artist, separator, title = stem.partition(' - ')
+        if not separator:
+            folder = os.path.dirname(relative)
+            artist, title = (os.path.basename(folder) if folder else ''), stem
+        tags.setdefault('title', title.strip())
+        tags.setdefault('artist', artist.strip())
+        tags.setdefault('album', '')
+        return tags
+        
+    # ---------- پیمایش ----------
+    def walk(self):
+        """(مسیر نسبی، stat) همه فایل‌های صوتی زیر root"""
+        stack = [self.root]
+        while stack:
+            directory = stack.pop()
+            try:
+                entries = list(os.scandir(directory))
+            except OSError as e:
+                Logger.warning(f"خواندن پوشه {directory} ناموفق بود: {e}")
+                continue
+            for entry in entries:
+                try:
+                    if entry.is_dir():
+                        stack.append(entry.path)
+                    elif os.path.splitext(entry.name)[1].lower() in self.EXTENSIONS:
+                        yield os.path.relpath(entry.path, self.root), entry.stat()
+                except OSError:
+                    continue
+                    
+    def scan(self):
+        """به‌روزرسانی جدول tracks؛ فقط فایل‌های جدید یا تغییر کرده (mtime/اندازه) خوانده می‌شوند"""
+        started = time.monotonic()
+        known = {
+            path: (mtime, size, artist_key, title_key)
+            for path, mtime, size, artist_key, title_key in self.db.query(
+                "SELECT path, mtime_ns, size, artist_key, title_key FROM tracks"
+            )
+        }
+        stats = {'files': 0, 'added': 0, 'updated': 0, 'removed': 0}
+        batch = []
+        for relative, st in self.walk():
+            stats['files'] += 1
+            old = known.pop(relative, None)
+            if old and old[:2] == (st.st_mtime_ns, st.st_size):
+                continue
+            stats['updated' if old else 'added'] += 1
+            tags = self.read_tags(os.path.join(self.root, relative), relative)
+            batch.append((relative, st.st_mtime_ns, st.st_size, tags, old))
+            if len(batch) >= self.BATCH_SIZE:
+                self.store(batch)
+                batch = []
+        if batch:
+            self.store(batch)
+            
+        # فایل‌هایی که دیگر وجود ندارند
+        removed = list(known.items())
+        for i in range(0, len(removed), self.BATCH_SIZE):
+            chunk = removed[i:i + self.BATCH_SIZE]
+            with self.lock:
+                self.db.executemany("DELETE FROM tracks WHERE path = ?", [(path,) for path, old in chunk])
+                for path, old in chunk:
+                    self.unindex(old[2], old[3])
+        stats['removed'] = len(removed)
+        stats['seconds'] = round(time.monotonic() - started, 3)
+        self.last_scan = stats
+        return stats
+        
+    def store(self, batch):
+        """نوشتن یک دسته و به‌روزرسانی ایندکس فازی در یک قدم (تا بارگذاری هم‌زمان دوبار نشمارد)"""
+        rows = []
+        for relative, mtime, size, tags, old in batch:
+            rows.append((relative, mtime, size, tags['title'], tags['artist'], tags['album'],
+                         normalize_persian(tags['title']), normalize_persian(tags['artist'])))
+        with self.lock:
+            self.db.executemany('''
+                INSERT INTO tracks (path, mtime_ns, size, title, artist, album, title_key, artist_key)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (path) DO UPDATE SET
+                    mtime_ns = excluded.mtime_ns, size = excluded.size, title = excluded.title,
+                    artist = excluded.artist, album = excluded.album,
+                    title_key = excluded.title_key, artist_key = excluded.artist_key
+            ''', rows)
+            for (relative, mtime, size, tags, old), row in zip(batch, rows):
+                if old:
+                    self.unindex(old[2], old[3])
+                self.index(row[7], row[6])
+                
+    def scan_async(self):
+        """پیمایش در thread پس‌زمینه (اگر پیمایشی در جریان نباشد)؛ راه‌اندازی منتظر آن نمی‌ماند"""
+        if self.scan_thread and self.scan_thread.is_alive():
+            return
+            
+        def run():
+            try:
+                stats = self.scan()
+                Logger.info(f"کتابخانه موسیقی به‌روز شد: {stats}")
+            except Exception as e:
+                Logger.error(f"خطا در پیمایش پوشه موسیقی: {e}")
+                
+        self.scan_thread = threading.Thread(target=run, name='music-scan', daemon=True)
+        self.scan_thread.start()
+        
+    # ---------- ایندکس فازی ----------
+    def load(self):
+        """ساخت ایندکس سه‌حرفی کلیدهای متمایز خواننده و آهنگ از جدول (در اولین جستجوی فازی)"""
+        with self.lock:
+            if self.loaded:
+                return
+            self.loaded = True
+            for artist_key, title_key, count in self.db.query(
+                "SELECT artist_key, title_key, COUNT(*) FROM tracks GROUP BY artist_key, title_key"
+            ):
+                self.index(artist_key, title_key, count)
+                
+    def index(self, artist_key, title_key, count=1):
+        """افزودن کلیدها (با قفل گرفته شده)؛ قبل از بارگذاری کاری نمی‌کند"""
+        if not self.loaded:
+            return
+        for kind, key in (('artist', artist_key), ('title', title_key)):
+            if not key:
+                continue
+            entry = self.keys[kind].get(key)
+            if entry is None:
+                grams = ContactIndex.trigrams(key)
+                self.keys[kind][key] = [grams, count]
+                ContactIndex.add_postings(self.postings[kind], grams, key)
+            else:
+                entry[1] += count
+                
+    def unindex(self, artist_key, title_key):
+        """کم کردن شمارش کلیدها و حذف کلیدهای بدون آهنگ (با قفل گرفته شده)"""
+        if not self.loaded:
+            return
+        for kind, key in (('artist', artist_key), ('title', title_key)):
+            entry = self.keys[kind].get(key)
+            if entry is None:
+                continue
+            entry[1] -= 1
+            if entry[1] <= 0:
+                del self.keys[kind][key]
+                ContactIndex.remove_postings(self.postings[kind], entry[0], key)
+                
+    def fuzzy(self, key):
+        """نزدیک‌ترین کلید خواننده یا آهنگ: (امتیاز، نوع، کلید) یا None"""
+        if not self.loaded:
+            self.load()
+        grams = ContactIndex.trigrams(key)
+        need = max(1, int(len(grams) * self.min_score + 0.5))
+        best = None
+        with self.lock:
+            for kind in ('artist', 'title'):
+                keys, postings = self.keys[kind], self.postings[kind]
+                # هر کلید با need سه‌حرفی مشترک حتما یکی از len - need + 1 سه‌حرفی
+                # کمیاب‌تر را دارد؛ لیست‌های بلند سه‌حرفی‌های رایج پیمایش نمی‌شوند
+                rare = sorted(grams, key=lambda g: len(postings.get(g, ())))[:len(grams) - need + 1]
+                for candidate in set().union(*(postings.get(g, ()) for g in rare)):
+                    candidate_grams = keys[candidate][0]
+                    score = 2 * len(grams & candidate_grams) / (len(grams) + len(candidate_grams))
+                    if score >= self.min_score and (best is None or score > best[0]):
+                        best = (score, kind, candidate)
+        return best
+        
+    # ---------- جستجو ----------
+    def find(self, query, limit=50):
+        """آهنگ‌های منطبق با نام خواننده یا آهنگ: لیست (id، مسیر، عنوان، خواننده)"""
+        columns = "SELECT id, path, title, artist FROM tracks"
+        query = self.COMMAND_SUFFIX.sub('', query or '')
+        key = normalize_persian(query)
+        if not key:
+            # آهنگ تصادفی بدون پیمایش کل جدول
+            return self.db.query(
+                f"{columns} WHERE id >= (SELECT abs(random()) % (MAX(id) + 1) FROM tracks) ORDER BY id LIMIT 1"
+            ) or self.db.query(f"{columns} ORDER BY id LIMIT 1")
+            
+        # تطابق کامل از ایندکس‌های جدول، بعد شبیه‌ترین نام (اشتباه تشخیص گفتار یا املای دیگر)
+        for column in ('artist_key', 'title_key'):
+            rows = self.db.query(f"{columns} WHERE {column} = ? ORDER BY id LIMIT ?", (key, limit))
+            if rows:
+                return rows
+        match = self.fuzzy(key)
+        if match is None:
+            return []
+        score, kind, found = match
+        return self.db.query(f"{columns} WHERE {kind}_key = ? ORDER BY id LIMIT ?", (found, limit))
+        
+    def path(self, relative):
+        return os.path.join(self.root, relative)
+
 class MusicPlayer:
     """مدیریت پخش موسیقی"""
     
     def __init__(self):
         self.current_song = None
+        self.sound = None
         self.is_playing = False
         
     def play(self, song_path):
-        """پخش آهنگ"""
+        """پخش آهنگ (آهنگ قبلی متوقف می‌شود)"""
         Logger.info(f"پخش آهنگ: {song_path}")
+        self.stop()
+        self.sound = SoundLoader.load(song_path)
+        if not self.sound:
+            Logger.warning(f"پخش {song_path} پشتیبانی نمی‌شود")
+            return False
+        self.sound.play()
         self.is_playing = True
         self.current_song = song_path
         return True
         
     def stop(self):
         """توقف پخش"""
+        if self.sound:
+            self.sound.stop()
+            self.sound = None
         self.is_playing = False
         return True
 
 class ReminderManager:
-    """مدیریت یادآوری‌ها"""
+    """مدیریت یادآوری‌ها با زمان‌بند رویدادمحور (min-heap) به جای سرکشی دوره‌ای"""
     
-    def __init__(self, db):
+    def __init__(self, db, horizon=timedelta(hours=6), coalesce=timedelta(seconds=1), max_sleep=30):
         self.db = db
+        self.horizon = horizon
+        self.coalesce = coalesce
+        # سقف خواب برای تشخیص تغییر ساعت سیستم
+        self.max_sleep = max_sleep
+        
+        self.heap = []
+        self.scheduled = set()
+        self.horizon_end = None
+        self.condition = threading.Condition()
+        self.on_due = None
+        self.thread = None
+        self.stopped = False
         
     def add_reminder(self, title, reminder_time):
-        """افزودن یادآوری"""
-        cursor = self.db.cursor()
-        cursor.execute(
+        """افزودن یادآوری؛ پس از ثبت در دیتابیس زمان‌بند بیدار می‌شود"""
+        future = self.db.execute(
             "INSERT INTO reminders (title, reminder_time) VALUES (?, ?)",
-            (title, reminder_time)
+            (title, reminder_time),
+            wait=False
+        )
+        future.add_done_callback(
+            lambda f: f.exception() is None and self.schedule(f.result(), title, reminder_time)
         )
-        self.db.commit()
         return True
+        
+    def schedule(self, rem_id, title, reminder_time):
+        """افزودن یادآوری ثبت شده به heap (اگر در پنجره زمانی فعلی است)"""
+        with self.condition:
+            if rem_id in self.scheduled:
+                return
+            # یادآوری‌های دورتر هنگام جلو رفتن پنجره از دیتابیس خوانده می‌شوند
+            if self.horizon_end is not None and reminder_time > self.horizon_end:
+                return
+            heapq.heappush(self.heap, (reminder_time, rem_id, title))
+            self.scheduled.add(rem_id)
+            self.condition.notify()
+            
+    def load_window(self, now):
+        """خواندن یادآوری‌های انجام نشده تا انتهای پنجره (شامل عقب‌افتاده‌ها پس از راه‌اندازی مجدد)"""
+        end = now + self.horizon
+        with self.condition:
+            self.horizon_end = end
+            
+        rows = self.db.query(
+            "SELECT id, title, reminder_time FROM reminders "
+            "WHERE is_completed = 0 AND reminder_time <= ? ORDER BY reminder_time",
+            (end,)
+        )
+        
+        with self.condition:
+            for rem_id, title, reminder_time in rows:
+                if rem_id not in self.scheduled:
+                    self.heap.append((datetime.fromisoformat(reminder_time), rem_id, title))
+                    self.scheduled.add(rem_id)
+            heapq.heapify(self.heap)
+            self.condition.notify()
+        return len(rows)
+        
+    def pop_due(self, now):
+        """برداشتن یادآوری‌های رسیده به همراه آن‌هایی که تا یک لحظه بعد می‌رسند"""
+        due = []
+        if not self.heap or self.heap[0][0] > now:
+            return due
+        limit = now + self.coalesce
+        while self.heap and self.heap[0][0] <= limit:
+            reminder_time, rem_id, title = heapq.heappop(self.heap)
+            self.scheduled.discard(rem_id)
+            due.append((rem_id, title, reminder_time))
+        return due
+        
+    def start(self, on_due):
+        """شروع thread زمان‌بند"""
+        self.on_due = on_due
+        self.stopped = False
+        self.thread = threading.Thread(target=self.run, name='reminders', daemon=True)
+        self.thread.start()
+        
+    def stop(self):
+        """توقف زمان‌بند"""
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+            
+    def run(self):
+        """خواب تا موعد بعدی؛ با افزودن یادآوری جدید یا پایان پنجره بیدار می‌شود"""
+        self.load_window(datetime.now())
+        while True:
+            reload = False
+            with self.condition:
+                if self.stopped:
+                    return
+                now = datetime.now()
+                due = self.pop_due(now)
+                if not due:
+                    if now >= self.horizon_end:
+                        reload = True
+                    else:
+                        wake = min(self.heap[0][0], self.horizon_end) if self.heap else self.horizon_end
+                        self.condition.wait(min((wake - now).total_seconds(), self.max_sleep))
+                        continue
+                        
+            if due:
+                self.fire(due)
+            if reload:
+                self.load_window(now)
+                
+    def fire(self, due):
+        """علامت‌گذاری و اعلام یک دسته یادآوری هم‌زمان"""
+        try:
+            # قبل از اعلام ثبت می‌شود تا بارگذاری بعدی دوباره آن‌ها را نخواند
+            self.db.executemany(
+                "UPDATE reminders SET is_completed = 1 WHERE id = ?",
+                [(rem_id,) for rem_id, title, reminder_time in due]
+            )
+        except Exception as e:
+            Logger.error(f"خطا در ثبت یادآوری: {e}")
+        if self.on_due:
+            self.on_due(due)
+
+class WeatherProvider:
+    """پایه منبع داده هواشناسی؛ fetch یک dict یکسان (temp، condition، wind) برمی‌گرداند"""
+    
+    name = None
+    
+    def __init__(self, session, config):
+        self.session = session
+        self.config = config
+        
+    def fetch(self, lat, lon):
+        raise NotImplementedError
+
+class OpenMeteoProvider(WeatherProvider):
+    """Open-Meteo (بدون کلید API)"""
+    
+    name = 'open-meteo'
+    URL = 'https://api.open-meteo.com/v1/forecast'
+    
+    # کدهای وضعیت WMO
+    CONDITIONS = [
+        ((0,), 'صاف و آفتابی'),
+        ((1, 2), 'نیمه ابری'),
+        ((3,), 'ابری'),
+        ((45, 48), 'مه‌آلود'),
+        (range(51, 58), 'نم‌نم باران'),
+        (range(61, 68), 'بارانی'),
+        (range(71, 78), 'برفی'),
+        (range(80, 83), 'رگبار باران'),
+        ((85, 86), 'رگبار برف'),
+        (range(95, 100), 'طوفانی و رعد و برق'),
+    ]
+    
+    def fetch(self, lat, lon):
+        response = self.session.get(
+            self.config.get('weather_url') or self.URL,
+            params={'latitude': lat, 'longitude': lon, 'current': 'temperature_2m,weather_code,wind_speed_10m'},
+            timeout=self.config.get('weather_timeout', 3.0)
+        )
+        response.raise_for_status()
+        current = response.json()['current']
+        code = current.get('weather_code')
+        condition = next((label for codes, label in self.CONDITIONS if code in codes), 'نامشخص')
+        return {
+            'temp': current['temperature_2m'],
+            'condition': condition,
+            'wind': current.get('wind_speed_10m')
+        }
+
+WEATHER_PROVIDERS = {
+    'open-meteo': OpenMeteoProvider
+}
 
 class WeatherService:
-    """سرویس هواشناسی"""
+    """سرویس هواشناسی با Session مشترک، کش TTL و پاسخ کهنه هنگام تازه‌سازی در پس‌زمینه"""
     
-    def get_current_weather(self):
+    def __init__(self, config=None, provider=None):
+        self.config = dict(DEFAULT_CONFIG, **(config or {}))
+        # یک Session برای همه درخواست‌ها تا اتصال (و TLS) دوباره استفاده شود
+        self.session = requests.Session()
+        self.provider = provider or WEATHER_PROVIDERS[self.config['weather_provider']](self.session, self.config)
+        self.cache = {}
+        self.refreshing = set()
+        self.failures = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.errors = 0
+        
+    @staticmethod
+    def cache_key(lat, lon):
+        """مکان گرد شده به ۰٫۱ درجه (حدود ۱۰ کیلومتر) تا جابه‌جایی کوچک کش را باطل نکند"""
+        return round(lat, 1), round(lon, 1)
+        
+    def get_current_weather(self, lat=None, lon=None):
         """دریافت وضعیت فعلی هوا"""
-        # در نسخه واقعی از API استفاده می‌شود
+        if lat is None:
+            lat, lon = self.config['weather_location']
+        key = self.cache_key(lat, lon)
+        with self.lock:
+            entry = self.cache.get(key)
+        if entry:
+            age = time.monotonic() - entry[0]
+            if age < self.config['weather_ttl']:
+                self.hits += 1
+                return entry[1]
+            if age < self.config['weather_max_stale']:
+                # پاسخ فوری از کش؛ داده تازه برای درخواست بعدی
+                self.stale_hits += 1
+                self.refresh_async(key)
+                return entry[1]
+        self.misses += 1
+        failed_at, error = self.failures.get(key, (None, None))
+        if failed_at is not None and time.monotonic() - failed_at < self.config['weather_retry_after']:
+            # بدون اینترنت هر فرمان تا timeout منتظر نماند
+            raise error
+        return self.refresh(key)
+        
+    def refresh(self, key):
+        """دریافت از منبع و ذخیره در کش (مختصات گرد شده هم برای درخواست کافی است)"""
+        try:
+            data = self.provider.fetch(*key)
+        except Exception as e:
+            self.errors += 1
+            with self.lock:
+                self.failures[key] = (time.monotonic(), e)
+            raise
+        with self.lock:
+            self.cache[key] = (time.monotonic(), data)
+            self.failures.pop(key, None)
+        return data
+        
+    def refresh_async(self, key):
+        """تازه‌سازی در پس‌زمینه؛ برای هر مکان حداکثر یکی در جریان"""
+        with self.lock:
+            if key in self.refreshing:
+                return
+            self.refreshing.add(key)
+            
+        def run():
+            try:
+                self.refresh(key)
+            except Exception as e:
+                Logger.warning(f"تازه‌سازی وضعیت هوا ناموفق بود: {e}")
+            finally:
+                with self.lock:
+                    self.refreshing.discard(key)
+                    
+        threading.Thread(target=run, name='weather-refresh', daemon=True).start()
+        
+    def prefetch(self):
+        """پر کردن کش مکان پیش‌فرض در شروع برنامه"""
+        self.refresh_async(self.cache_key(*self.config['weather_location']))
+        
+    @staticmethod
+    def describe(weather):
+        """جمله پاسخ"""
+        response = f"هوا {weather['condition']} است، دمای {weather['temp']:.0f} درجه"
+        if weather.get('wind'):
+            response += f"، باد {weather['wind']:.0f} کیلومتر بر ساعت"
+        return response
+        
+    def stats(self):
         return {
-            'temp': 25,
-            'condition': 'آفتابی',
-            'description': 'هوای صاف و آفتابی'
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'errors': self.errors,
+            'cached': len(self.cache)
+        }
+
+# ========== مسیریابی آفلاین ==========
+class RoadGraph:
+    """گراف جاده‌ای فشرده (CSR) روی فایل‌های نگاشت‌شده در حافظه؛ مسیریابی A* با کران نشانه‌ها (ALT)"""
+    
+    # نام فایل: نوع آرایه (coords: عرض و طول هر گره پشت سر هم؛ landmarks_*: نشانه به نشانه)
+    FILES = {
+        'coords': 'f',
+        'offsets': 'I',
+        'targets': 'I',
+        'times': 'f',
+        'lengths': 'f',
+        'landmarks_to': 'f',
+        'landmarks_from': 'f'
+    }
+    # تعداد نشانه‌هایی که برای هر جفت مبدا و مقصد استفاده می‌شوند
+    ACTIVE_LANDMARKS = 4
+    
+    def __init__(self, directory):
+        with open(os.path.join(directory, 'meta.json'), encoding='utf-8') as f:
+            self.meta = json.load(f)
+        if self.meta.get('byteorder', sys.byteorder) != sys.byteorder:
+            raise ValueError("گراف جاده‌ای روی ماشینی با ترتیب بایت دیگر ساخته شده است")
+        self.node_count = self.meta['nodes']
+        self.landmark_count = self.meta['landmarks']
+        self.maps = []
+        self.views = []
+        for name, code in self.FILES.items():
+            with open(os.path.join(directory, f'{name}.bin'), 'rb') as f:
+                # فقط صفحه‌های لازم از دیسک خوانده می‌شوند؛ حافظه پردازه تقریبا ثابت می‌ماند
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b''
+            view = memoryview(mm)
+            typed = view.cast(code)
+            self.maps.append(mm)
+            self.views += [typed, view]
+            setattr(self, name, typed)
+            
+    def close(self):
+        for view in self.views:
+            view.release()
+        for mm in self.maps:
+            if isinstance(mm, mmap.mmap):
+                mm.close()
+        self.views, self.maps = [], []
+        
+    def nearest_node(self, lat, lon):
+        """نزدیک‌ترین گره به مختصات (برداری با numpy روی همان حافظه نگاشت‌شده)"""
+        coords = np.frombuffer(self.coords, dtype=np.float32).reshape(-1, 2)
+        scale = math.cos(math.radians(lat))
+        d = (coords[:, 0] - lat) ** 2 + ((coords[:, 1] - lon) * scale) ** 2
+        return int(d.argmin())
+        
+    def potential(self, source, target):
+        """کران پایین زمان تا target: بیشینه |d(v,L) - d(t,L)| و |d(L,t) - d(L,v)| روی بهترین نشانه‌ها"""
+        n = self.node_count
+        to, frm = self.landmarks_to, self.landmarks_from
+        bounds = []
+        for landmark in range(self.landmark_count):
+            base = landmark * n
+            to_target, from_target = to[base + target], frm[base + target]
+            bound = max(to[base + source] - to_target, from_target - frm[base + source])
+            bounds.append((bound, base, to_target, from_target))
+        active = sorted(bounds, reverse=True)[:self.ACTIVE_LANDMARKS]
+        
+        def h(v):
+            best = 0.0
+            for bound, base, to_target, from_target in active:
+                a = to[base + v] - to_target
+                if a > best:
+                    best = a
+                b = from_target - frm[base + v]
+                if b > best:
+                    best = b
+            return best
+            
+        return h
+        
+    def route(self, source, target):
+        """کوتاه‌ترین زمان سفر: (ثانیه، متر، تعداد گره‌های باز شده) یا None اگر مسیری نباشد"""
+        if source == target:
+            return 0.0, 0.0, 0
+        offsets, targets, times, lengths = self.offsets, self.targets, self.times, self.lengths
+        h = self.potential(source, target) if self.landmark_count else (lambda v: 0.0)
+        heappush, heappop = heapq.heappush, heapq.heappop
+        best = {source: 0.0}
+        distance = {source: 0.0}
+        estimates = {}
+        heap = [(h(source), 0.0, source)]
+        settled = 0
+        while heap:
+            f, g, v = heappop(heap)
+            if g > best[v]:
+                continue
+            if v == target:
+                return g, distance[v], settled
+            settled += 1
+            dv = distance[v]
+            for i in range(offsets[v], offsets[v + 1]):
+                w = targets[i]
+                ng = g + times[i]
+                if ng < best.get(w, math.inf):
+                    best[w] = ng
+                    distance[w] = dv + lengths[i]
+                    hw = estimates.get(w)
+                    if hw is None:
+                        hw = estimates[w] = h(w)
+                    heappush(heap, (ng + hw, ng, w))
+        return None
+        
+    # ---------- ساخت ----------
+    @staticmethod
+    def dijkstra(adjacency, source):
+        """فاصله زمانی همه گره‌ها از source روی لیست مجاورت درون حافظه (فقط هنگام ساخت)"""
+        dist = [math.inf] * len(adjacency)
+        dist[source] = 0.0
+        heap = [(0.0, source)]
+        while heap:
+            d, v = heapq.heappop(heap)
+            if d > dist[v]:
+                continue
+            for w, t in adjacency[v]:
+                nd = d + t
+                if nd < dist[w]:
+                    dist[w] = nd
+                    heapq.heappush(heap, (nd, w))
+        return dist
+        
+    @staticmethod
+    def largest_component(node_count, edges):
+        """گره‌های بزرگ‌ترین مولفه قویا همبند (Kosaraju تکراری) تا همه مسیرها وجود داشته باشند"""
+        forward = [[] for _ in range(node_count)]
+        backward = [[] for _ in range(node_count)]
+        for u, v, seconds, meters in edges:
+            forward[u].append(v)
+            backward[v].append(u)
+        order, seen = [], bytearray(node_count)
+        for root in range(node_count):
+            if seen[root]:
+                continue
+            seen[root] = 1
+            stack = [(root, iter(forward[root]))]
+            while stack:
+                v, children = stack[-1]
+                for w in children:
+                    if not seen[w]:
+                        seen[w] = 1
+                        stack.append((w, iter(forward[w])))
+                        break
+                else:
+                    stack.pop()
+                    order.append(v)
+        component = [-1] * node_count
+        sizes = []
+        for root in reversed(order):
+            if component[root] >= 0:
+                continue
+            label = len(sizes)
+            component[root] = label
+            stack, size = [root], 0
+            while stack:
+                v = stack.pop()
+                size += 1
+                for w in backward[v]:
+                    if component[w] < 0:
+                        component[w] = label
+                        stack.append(w)
+            sizes.append(size)
+        largest = max(range(len(sizes)), key=sizes.__getitem__) if sizes else -1
+        return [label == largest for label in component]
+        
+    @classmethod
+    def build(cls, directory, coords, edges, places=(), landmarks=8):
+        """نوشتن گراف فشرده: coords لیست (عرض، طول)، edges لیست (u، v، ثانیه، متر)، places لیست (نام، گره)"""
+        from array import array
+        keep = cls.largest_component(len(coords), edges)
+        remap, kept_coords = {}, []
+        for node, (lat, lon) in enumerate(coords):
+            if keep[node]:
+                remap[node] = len(kept_coords)
+                kept_coords.append((lat, lon))
+        n = len(kept_coords)
+        edges = sorted((remap[u], remap[v], seconds, meters) for u, v, seconds, meters in edges
+                       if keep[u] and keep[v])
+        offsets = array('I', [0] * (n + 1))
+        for u, v, seconds, meters in edges:
+            offsets[u + 1] += 1
+        for i in range(n):
+            offsets[i + 1] += offsets[i]
+            
+        # نشانه‌ها: هر کدام دورترین گره از نشانه‌های قبلی (انتخاب farthest)
+        forward = [[] for _ in range(n)]
+        backward = [[] for _ in range(n)]
+        for u, v, seconds, meters in edges:
+            forward[u].append((v, seconds))
+            backward[v].append((u, seconds))
+        landmarks_to, landmarks_from = array('f'), array('f')
+        chosen = []
+        nearest = [math.inf] * n
+        candidate = 0
+        for _ in range(min(landmarks, n)):
+            if chosen:
+                candidate = max(range(n), key=nearest.__getitem__)
+            from_landmark = cls.dijkstra(forward, candidate)
+            to_landmark = cls.dijkstra(backward, candidate)
+            if not chosen:
+                # اولین نشانه دورترین گره از یک گره دلخواه است، نه خود آن
+                candidate = max(range(n), key=from_landmark.__getitem__)
+                from_landmark = cls.dijkstra(forward, candidate)
+                to_landmark = cls.dijkstra(backward, candidate)
+            chosen.append(candidate)
+            landmarks_from.extend(from_landmark)
+            landmarks_to.extend(to_landmark)
+            nearest = [min(a, b) for a, b in zip(nearest, from_landmark)]
+            
+        # مکان‌های بیرون از مولفه اصلی به نزدیک‌ترین گره باقی‌مانده منتقل می‌شوند
+        cells = {}
+        for node, (lat, lon) in enumerate(kept_coords):
+            cells.setdefault((int(lat * 100), int(lon * 100)), []).append(node)
+            
+        def snap(lat, lon):
+            cell = (int(lat * 100), int(lon * 100))
+            for radius in range(0, 4):
+                nodes = [node for dy in range(-radius, radius + 1) for dx in range(-radius, radius + 1)
+                         for node in cells.get((cell[0] + dy, cell[1] + dx), ())]
+                if nodes:
+                    return min(nodes, key=lambda node: (kept_coords[node][0] - lat) ** 2 +
+                               (kept_coords[node][1] - lon) ** 2)
+            return None
+            
+        place_nodes = []
+        for name, node in places:
+            lat, lon = node if isinstance(node, tuple) else coords[node]
+            target = remap.get(node) if not isinstance(node, tuple) else None
+            if target is None:
+                target = snap(lat, lon)
+            if target is not None:
+                place_nodes.append([name, target])
+                
+        os.makedirs(directory, exist_ok=True)
+        arrays = {
+            'coords': array('f', [c for pair in kept_coords for c in pair]),
+            'offsets': offsets,
+            'targets': array('I', [v for u, v, seconds, meters in edges]),
+            'times': array('f', [seconds for u, v, seconds, meters in edges]),
+            'lengths': array('f', [meters for u, v, seconds, meters in edges]),
+            'landmarks_to': landmarks_to,
+            'landmarks_from': landmarks_from
+        }
+        for name, values in arrays.items():
+            with open(os.path.join(directory, f'{name}.bin'), 'wb') as f:
+                values.tofile(f)
+        with open(os.path.join(directory, 'places.json'), 'w', encoding='utf-8') as f:
+            json.dump(place_nodes, f, ensure_ascii=False)
+        meta = {
+            'nodes': n,
+            'edges': len(edges),
+            'landmarks': len(chosen),
+            'byteorder': sys.byteorder,
+            'built_at': datetime.now().isoformat(timespec='seconds')
         }
+        with open(os.path.join(directory, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=1)
+        return meta
+
+# سرعت پیش‌فرض هر نوع راه در OSM (کیلومتر بر ساعت) وقتی maxspeed ندارد
+ROAD_SPEEDS = {
+    'motorway': 90, 'trunk': 70, 'primary': 50, 'secondary': 40, 'tertiary': 35,
+    'unclassified': 30, 'residential': 25, 'living_street': 10, 'service': 15,
+    'motorway_link': 45, 'trunk_link': 40, 'primary_link': 35, 'secondary_link': 30, 'tertiary_link': 25
+}
+# نوع مکان‌هایی از OSM که در جستجوی نام وارد می‌شوند (علاوه بر place و نام خیابان‌ها)
+PLACE_TAGS = ('place', 'amenity', 'railway', 'public_transport', 'tourism', 'leisure', 'shop')
+
+def read_osm_roads(path):
+    """خواندن گراف خودرو و نام مکان‌ها از فایل OSM XML (مثلا خروجی Overpass یا osmium cat)"""
+    import xml.etree.ElementTree as ET
+    
+    # گذر اول: راه‌ها و گره‌های لازم (فایل شهر بزرگ است؛ همه گره‌ها در حافظه نگه داشته نمی‌شوند)
+    ways, needed = [], set()
+    for event, elem in ET.iterparse(path):
+        if elem.tag == 'way':
+            tags = {tag.get('k'): tag.get('v') for tag in elem.iter('tag')}
+            highway = tags.get('highway')
+            if highway in ROAD_SPEEDS and tags.get('access') not in ('no', 'private'):
+                refs = [int(nd.get('ref')) for nd in elem.iter('nd')]
+                ways.append((refs, highway, tags))
+                needed.update(refs)
+        if elem.tag in ('node', 'way', 'relation'):
+            elem.clear()
+            
+    # گذر دوم: مختصات گره‌ها و مکان‌های نام‌دار
+    ids, coords, places = {}, [], []
+    for event, elem in ET.iterparse(path):
+        if elem.tag == 'node':
+            osm_id = int(elem.get('id'))
+            lat, lon = float(elem.get('lat')), float(elem.get('lon'))
+            if osm_id in needed:
+                ids[osm_id] = len(coords)
+                coords.append((lat, lon))
+            tags = {tag.get('k'): tag.get('v') for tag in elem.iter('tag')}
+            if any(key in tags for key in PLACE_TAGS):
+                for key in ('name:fa', 'name'):
+                    if tags.get(key):
+                        places.append((tags[key], (lat, lon)))
+            elem.clear()
+        elif elem.tag in ('way', 'relation'):
+            elem.clear()
+            
+    edges, named = [], set()
+    for refs, highway, tags in ways:
+        refs = [ids[ref] for ref in refs if ref in ids]
+        speed = ROAD_SPEEDS[highway]
+        match = re.match(r'\d+', tags.get('maxspeed', ''))
+        if match:
+            speed = int(match.group())
+        oneway = tags.get('oneway', 'yes' if highway == 'motorway' or tags.get('junction') == 'roundabout' else 'no')
+        for a, b in zip(refs, refs[1:]):
+            (lat1, lon1), (lat2, lon2) = coords[a], coords[b]
+            meters = haversine(lat1, lon1, lat2, lon2)
+            seconds = meters / (speed / 3.6)
+            if oneway == '-1':
+                edges.append((b, a, seconds, meters))
+                continue
+            edges.append((a, b, seconds, meters))
+            if oneway not in ('yes', 'true', '1'):
+                edges.append((b, a, seconds, meters))
+        # نام خیابان به گره میانی آن (اولین راه با این نام)
+        for key in ('name:fa', 'name'):
+            name = tags.get(key)
+            if name and refs and name not in named:
+                named.add(name)
+                places.append((name, refs[len(refs) // 2]))
+    return coords, edges, places
+
+def haversine(lat1, lon1, lat2, lon2):
+    """فاصله دو نقطه به متر"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((phi2 - phi1) / 2) ** 2 + \
+        math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    return 2 * 6371000 * math.asin(math.sqrt(a))
+
+class PlaceIndex:
+    """یافتن گره گراف از نام فارسی مکان (مثل آزادی، میدان تجریش، خیابان ونک)"""
+    
+    # کلمه‌های عام اول نام که کاربر معمولا نمی‌گوید
+    GENERIC = {normalize_persian(word) for word in (
+        'میدان', 'میدون', 'خیابان', 'خیابون', 'بزرگراه', 'اتوبان', 'بلوار', 'کوچه', 'پل', 'چهارراه',
+        'ایستگاه', 'مترو', 'پارک', 'برج', 'بازار', 'فلکه', 'سه‌راه'
+    )}
+    
+    def __init__(self, places):
+        self.places = {}
+        for name, node in places:
+            for key in {normalize_persian(name), self.short_key(name)}:
+                if key:
+                    # اولین نام (معمولا میدان یا محله) بر خیابان هم‌نام مقدم است
+                    self.places.setdefault(key, (name, node))
+                    
+    def short_key(self, text):
+        words = normalize_persian(text).split()
+        while len(words) > 1 and words[0] in self.GENERIC:
+            words = words[1:]
+        return ' '.join(words)
+        
+    def lookup(self, text):
+        """(نام، گره) یا None؛ اول تطابق کامل، بعد بدون کلمه عام، بعد بلندترین نامی که در متن آمده"""
+        for key in (normalize_persian(text), self.short_key(text)):
+            if key in self.places:
+                return self.places[key]
+        words = f' {self.short_key(text)} '
+        matches = [key for key in self.places if len(key) > 2 and f' {key} ' in words]
+        return self.places[max(matches, key=len)] if matches else None
 
 class NavigationService:
-    """سرویس مسیریابی"""
+    """سرویس مسیریابی آفلاین روی گراف جاده‌ای محلی (models/roads)؛ بدون هیچ درخواست شبکه"""
     
-    def get_route(self, destination):
+    def __init__(self, config=None):
+        self.config = dict(DEFAULT_CONFIG, **(config or {}))
+        self.directory = self.config['navigation_graph']
+        self.graph = None
+        self.places = None
+        self.origin_node = None
+        self.lock = threading.Lock()
+        
+    def load(self):
+        """باز کردن گراف (mmap) و نام مکان‌ها در اولین درخواست؛ False اگر نقشه‌ای نصب نشده باشد"""
+        with self.lock:
+            if self.graph is None:
+                if not os.path.exists(os.path.join(self.directory, 'meta.json')):
+                    return False
+                self.graph = RoadGraph(self.directory)
+                with open(os.path.join(self.directory, 'places.json'), encoding='utf-8') as f:
+                    self.places = PlaceIndex(json.load(f))
+        return True
+        
+    def locate(self, text):
+        """گره مکان با نام یا None"""
+        found = self.places.lookup(text)
+        return found[1] if found else None
+        
+    def get_route(self, destination, origin=None):
         """دریافت مسیر"""
-        # در نسخه واقعی از Google Maps API استفاده می‌شود
-        return {
-            'distance': '۱۰ کیلومتر',
-            'time': '۲۰ دقیقه',
-            'route': 'مسیر پیشنهادی'
-        }
+        if not self.load():
+            return None
+        if origin:
+            source = self.locate(origin)
+        else:
+            # موقعیت فعلی؛ نزدیک‌ترین گره یک بار محاسبه می‌شود
+            if self.origin_node is None:
+                lat, lon = self.config.get('navigation_origin') or self.config['weather_location']
+                self.origin_node = self.graph.nearest_node(lat, lon)
+            source = self.origin_node
+        target = self.locate(destination)
+        if source is None or target is None:
+            return {'found': False, 'missing': origin if source is None else destination}
+        result = self.graph.route(source, target)
+        if result is None:
+            return {'found': False, 'missing': destination}
+        seconds, meters, settled = result
+        return {'found': True, 'time': seconds, 'distance': meters, 'settled': settled}
+
+def build_roads_main(argv=None):
+    """ساخت گراف جاده‌ای آفلاین از فایل OSM XML"""
+    import argparse
+    parser = argparse.ArgumentParser(
+        prog='persian_assistant_complete.py build-roads',
+        description='ساخت گراف فشرده مسیریابی و فهرست نام مکان‌ها از یک فایل OSM XML شهر'
+    )
+    parser.add_argument('osm', help='فایل .osm (XML)')
+    parser.add_argument('-o', '--output', default='models/roads', help='پوشه خروجی')
+    parser.add_argument('--landmarks', type=int, default=8, help='تعداد نشانه‌های ALT')
+    args = parser.parse_args(argv)
+    
+    started = time.monotonic()
+    coords, edges, places = read_osm_roads(args.osm)
+    meta = RoadGraph.build(args.output, coords, edges, places, landmarks=args.landmarks)
+    print(f"{meta['nodes']} گره، {meta['edges']} یال، {meta['landmarks']} نشانه "
+          f"در {time.monotonic() - started:.1f} ثانیه → {args.output}", file=sys.stderr)
+
+# ========== پردازش دسته‌ای (بدون رابط کاربری) ==========
+# وضعیت هر worker فرایند: پایگاه داده، پردازشگر فرمان و تشخیص گفتار خودش
+BATCH_STATE = {}
+
+def batch_inputs(paths):
+    """خواندن جریانی ورودی‌ها: (شناسه، متن، مسیر WAV)"""
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith('.wav'):
+                        wav_path = os.path.join(root, name)
+                        yield wav_path, None, wav_path
+        elif path.lower().endswith('.wav'):
+            yield path, None, path
+        else:
+            # فایل متنی: هر خط یک جمله؛ JSONL: هر خط شیئی با کلید text (و id اختیاری)
+            with (sys.stdin if path == '-' else open(path, encoding='utf-8')) as f:
+                for number, line in enumerate(f, 1):
+                    line = line.strip()
+                    if not line or line.startswith('#'):
+                        continue
+                    if line.startswith('{'):
+                        record = json.loads(line)
+                        yield record.get('id', f'{path}:{number}'), record['text'], None
+                    else:
+                        yield f'{path}:{number}', line, None
+
+def batch_init(db_path, dry_run, config):
+    """آماده‌سازی worker: اتصال پایگاه داده جدا (یا کپی موقت در حالت آزمایشی)"""
+    import tempfile
+    from multiprocessing.util import Finalize
+    
+    if dry_run:
+        # نوشتن‌ها روی کپی خصوصی worker انجام و در پایان دور ریخته می‌شوند
+        fd, path = tempfile.mkstemp(prefix='assistant-batch-', suffix='.db')
+        os.close(fd)
+        if os.path.exists(db_path):
+            source, target = sqlite3.connect(db_path), sqlite3.connect(path)
+            source.backup(target)
+            source.close()
+            target.close()
+        Finalize(None, os.remove, args=(path,), exitpriority=5)
+    else:
+        path = db_path
+        
+    db = Database(path)
+    db.init_tables()
+    # منتظر ماندن برای نوشتن‌های ناهمگام قبل از خروج worker
+    Finalize(None, db.close, exitpriority=10)
+    processor = CommandProcessor(db, navigation_service=NavigationService(config))
+    BATCH_STATE.update(db=db, processor=processor, tracer=Tracer(), config=config)
+
+def batch_process(item):
+    """پردازش یک ورودی در worker؛ خروجی یک سطر JSON"""
+    item_id, text, wav_path = item
+    trace = BATCH_STATE['tracer'].start()
+    record = {'id': item_id}
+    
+    if wav_path:
+        # موتور تشخیص فقط وقتی ورودی صوتی هست ساخته می‌شود (بارگذاری مدل سنگین است)
+        recognizer = BATCH_STATE.get('recognizer')
+        if recognizer is None:
+            recognizer = BATCH_STATE['recognizer'] = SpeechRecognizer(BATCH_STATE['config'])
+            if recognizer.mode != 'online':
+                recognizer.offline.loaded.wait()
+            trace = BATCH_STATE['tracer'].start()
+        text = recognizer.recognize_file(wav_path)
+        trace.add('asr')
+    record['text'] = text
+    
+    if text:
+        result = BATCH_STATE['processor'].process(text, trace)
+        record.update(
+            command_type=trace.command[1],
+            success=result['success'],
+            response=result.get('response'),
+            error=result.get('error')
+        )
+    else:
+        record.update(command_type=None, success=False, response=None, error='گفتاری تشخیص داده نشد')
+        
+    trace.finish()
+    record['ms'] = {stage: round(1000 * (end - start), 3) for stage, start, end in trace.spans}
+    return record['command_type'], record['success'], json.dumps(record, ensure_ascii=False, default=str)
+
+def batch_main(argv=None):
+    """اجرای فرمان‌های یک مجموعه متن یا WAV بدون رابط کاربری با چند فرایند"""
+    import argparse
+    import multiprocessing
+    
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+    parser = argparse.ArgumentParser(
+        prog='persian_assistant_complete.py batch',
+        description='پردازش دسته‌ای جمله‌ها و فایل‌های WAV با همان زنجیره تشخیص و اجرای فرمان؛ خروجی JSONL'
+    )
+    parser.add_argument('inputs', nargs='+',
+                        help='فایل متنی (هر خط یک جمله)، فایل .jsonl با کلید text، فایل یا پوشه WAV، یا - برای stdin')
+    parser.add_argument('-o', '--output', default='-', help='فایل خروجی JSONL (پیش‌فرض stdout)')
+    parser.add_argument('--db', default='data/assistant.db', help='پایگاه داده مقصد')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='هر worker روی کپی موقت پایگاه داده کار می‌کند و چیزی ذخیره نمی‌شود')
+    parser.add_argument('--workers', type=int, default=cores, help=f'تعداد فرایندها (پیش‌فرض {cores})')
+    parser.add_argument('--chunksize', type=int, default=32, help='تعداد ورودی که هر بار به یک worker داده می‌شود')
+    parser.add_argument('--asr-mode', choices=['auto', 'online', 'offline', 'hedged'])
+    args = parser.parse_args(argv)
+    
+    config = load_config()
+    if args.asr_mode:
+        config['asr_mode'] = args.asr_mode
+    if not args.dry_run:
+        # ساخت جدول‌ها یک بار قبل از شروع workerها
+        os.makedirs(os.path.dirname(args.db) or '.', exist_ok=True)
+        db = Database(args.db)
+        db.init_tables()
+        db.close()
+        
+    out = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    started = time.monotonic()
+    counts = Counter()
+    succeeded = 0
+    pool = multiprocessing.Pool(args.workers, initializer=batch_init, initargs=(args.db, args.dry_run, config))
+    try:
+        for command_type, success, line in pool.imap(batch_process, batch_inputs(args.inputs), args.chunksize):
+            out.write(line + '\n')
+            counts[command_type] += 1
+            succeeded += bool(success)
+        # close و join (نه terminate) تا نوشتن‌های باقیمانده workerها انجام شود
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+        if out is not sys.stdout:
+            out.close()
+            
+    total = sum(counts.values())
+    elapsed = time.monotonic() - started
+    print(f"{total} ورودی در {elapsed:.1f} ثانیه ({total / max(elapsed, 1e-9):.0f} در ثانیه، "
+          f"{args.workers} فرایند)، موفق: {succeeded}", file=sys.stderr)
+    print('، '.join(f'{command_type}: {n}' for command_type, n in counts.most_common()), file=sys.stderr)
 
 # ========== راه‌اندازی برنامه ==========
 def main():
     """تابع اصلی اجرای برنامه"""
     
     if not HAS_LIBS:
+        print(f"کتابخانه‌های مورد نیاز نصب نیستند: {'; '.join(MISSING_LIBS)}")
         print("""
         📦 نیاز به نصب کتابخانه‌ها:
         
@@ -1103,4 +5134,9 @@ def main():
         traceback.print_exc()
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    if sys.argv[1:2] == ['batch']:
+        batch_main(sys.argv[2:])
+    elif sys.argv[1:2] == ['build-roads']:
+        build_roads_main(sys.argv[2:])
+    else:
+        main()
\ No newline at end of file
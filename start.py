@@ -3,36 +3,107 @@
 اسکریپت راه‌اندازی سریع دستیار
 """
 
-import subprocess
+import os
 import sys
+import json
+import importlib.util
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+CACHE_PATH = os.path.join(ROOT, 'data', 'preflight.json')
+
+# (نام بسته در pip، نام import) - این دو برای SpeechRecognition و gTTS یکی نیستند
+CORE_PACKAGES = [
+    ('numpy', 'numpy'),
+    ('scipy', 'scipy'),
+    ('SpeechRecognition', 'speech_recognition'),
+    ('requests', 'requests'),
+]
+UI_PACKAGES = [
+    ('kivy[full]', 'kivy'),
+    ('sounddevice', 'sounddevice'),
+    ('gTTS', 'gtts'),
+    ('pygame', 'pygame'),
+    ('plyer', 'plyer'),
+]
+
+
+def is_headless():
+    """حالت batch، build-roads و ASSISTANT_HEADLESS به رابط کاربری و سخت‌افزار صدا نیاز ندارند"""
+    return os.environ.get('ASSISTANT_HEADLESS') == '1' or sys.argv[1:2] in (['batch'], ['build-roads'])
+
+
+def environment_key(packages):
+    """کلید کش: مفسر، نسخه و زمان تغییر پوشه‌های sys.path (نصب یا حذف بسته آن را عوض می‌کند)"""
+    paths = []
+    for path in sys.path[1:]:
+        try:
+            paths.append([path, os.stat(path or '.').st_mtime_ns])
+        except OSError:
+            pass
+    return [sys.executable, sys.version, [name for _, name in packages], paths]
+
+
+def find_missing(packages):
+    """بسته‌های نصب نشده؛ find_spec فقط مسیر ماژول را پیدا می‌کند و آن را import نمی‌کند"""
+    return [pip_name for pip_name, name in packages if importlib.util.find_spec(name) is None]
+
+
+def load_cache():
+    try:
+        with open(CACHE_PATH, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_cache(key):
+    try:
+        os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+        with open(CACHE_PATH, 'w', encoding='utf-8') as f:
+            json.dump({'key': key}, f)
+    except OSError:
+        pass
+
 
 def check_dependencies():
     """بررسی و نصب وابستگی‌ها"""
-    required = [
-        'kivy',
-        'sounddevice',
-        'numpy',
-        'SpeechRecognition',
-        'gtts',
-        'plyer'
-    ]
-    
-    missing = []
-    for lib in required:
-        try:
-            __import__(lib)
-        except ImportError:
-            missing.append(lib)
-    
+    packages = CORE_PACKAGES if is_headless() else CORE_PACKAGES + UI_PACKAGES
+    key = environment_key(packages)
+    cache = load_cache()
+    if cache and cache.get('key') == key:
+        return True
+
+    missing = find_missing(packages)
     if missing:
+        import subprocess
         print(f"📦 نصب کتابخانه‌های مورد نیاز: {', '.join(missing)}")
-        subprocess.check_call([sys.executable, "-m", "pip", "install"] + missing)
-    
-    print("✅ تمام وابستگی‌ها نصب شدند")
+        try:
+            subprocess.check_call([sys.executable, "-m", "pip", "install"] + missing)
+        except (OSError, subprocess.CalledProcessError) as e:
+            print(f"❌ نصب ناموفق بود: {e}")
+            return False
+        importlib.invalidate_caches()
+        missing = find_missing(packages)
+        if missing:
+            print(f"❌ هنوز نصب نیستند: {', '.join(missing)}")
+            return False
+        print("✅ تمام وابستگی‌ها نصب شدند")
+        # نصب، sys.path را تغییر داده است
+        key = environment_key(packages)
+
+    save_cache(key)
+    return True
+
 
 if __name__ == "__main__":
-    check_dependencies()
-    
+    if not check_dependencies():
+        sys.exit(1)
+
     # اجرای دستیار
-    from persian_assistant import main
-    main()
\ No newline at end of file
+    from persian_assistant_complete import batch_main, build_roads_main, main
+    if sys.argv[1:2] == ['batch']:
+        batch_main(sys.argv[2:])
+    elif sys.argv[1:2] == ['build-roads']:
+        build_roads_main(sys.argv[2:])
+    else:
+        main()